@@ -7,21 +7,36 @@ from werkzeug.utils import secure_filename
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
-from docx.oxml.ns import qn
+from docx.oxml.ns import qn, nsdecls
 from docx.oxml import parse_xml
-from openpyxl import Workbook, load_workbook
+from docx.text.paragraph import Paragraph
+from docx.table import Table
+from lxml import etree
+from xml.sax.saxutils import escape
+from openpyxl import Workbook
+from workbook_parsing import parse_workbook_sheets, parse_workbook_or_error
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import dropbox
-from docx.enum.table import WD_TABLE_ALIGNMENT, WD_CELL_VERTICAL_ALIGNMENT
+from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT
 from docx.shared import RGBColor
 # Add these imports
 import time
-from threading import Semaphore, Thread
+from threading import Thread, Lock, local, get_ident
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from collections import deque, Counter
+from itertools import chain, islice
 import uuid
 import traceback
+import sqlite3
+from contextlib import closing, contextmanager
 from flask import jsonify
 
+import numpy as np
+
 # Matplotlib for charts
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
@@ -32,29 +47,156 @@ import matplotlib.patches as patches
 
 
 # ============== GEMINI RATE LIMITER ==============
+GEMINI_REQUESTS_PER_MINUTE = 8  # Conservative: 8 requests per minute
+GEMINI_TOKENS_PER_MINUTE = 250000  # Input + output tokens per minute
+GEMINI_BURST_REQUESTS = 3  # Requests allowed back-to-back after an idle spell
+RATE_LIMIT_DB = "gemini_rate_limit.db"  # Shared by every worker process on this host
+
+
 class GeminiRateLimiter:
-    def __init__(self, requests_per_minute=8):  # Conservative: 8 requests per minute
+    """Token-bucket limiter with separate requests-per-minute and tokens-per-minute budgets.
+
+    Bucket levels live in a small SQLite file (WAL mode, BEGIN IMMEDIATE) so every
+    gunicorn/gevent worker and every report job on the host draws from one quota.
+    Falls back to process-local buckets if the file cannot be opened.
+    """
+
+    def __init__(self, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, tokens_per_minute=GEMINI_TOKENS_PER_MINUTE,
+                 burst=GEMINI_BURST_REQUESTS, db_path=RATE_LIMIT_DB):
         self.requests_per_minute = requests_per_minute
-        self.min_interval = 60.0 / requests_per_minute  # seconds between requests
-        self.last_call_time = 0
-        self.semaphore = Semaphore(1)  # Only one request at a time
+        self.tokens_per_minute = tokens_per_minute
+        self.burst = max(1, burst)
+        self.db_path = db_path
+        self.local_state = {}
+        self.local_lock = Lock()
+        self.shared = self.init_store()
+
+    def init_store(self):
+        """Create the bucket table; returns False if the shared store is unusable"""
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                             "(name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared rate limit store unavailable ({e}), using process-local buckets")
+            return False
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def bucket_specs(self, tokens):
+        """(capacity, refill per second, cost) for each bucket this call draws from"""
+        specs = {"requests": (self.burst, self.requests_per_minute / 60.0, 1)}
+        if self.tokens_per_minute and tokens:
+            specs["tokens"] = (self.tokens_per_minute, self.tokens_per_minute / 60.0,
+                               min(tokens, self.tokens_per_minute))
+        return specs
+
+    def take(self, state, tokens, now, reserve=0):
+        """Refill the buckets in state and try to take from all of them.
 
-    def wait_if_needed(self):
-        """Ensure we don't exceed rate limits"""
-        with self.semaphore:
-            current_time = time.time()
-            time_since_last = current_time - self.last_call_time
+        Returns 0 when acquired, otherwise the seconds until enough capacity refills.
+        Nothing is deducted unless every bucket can pay. With reserve > 0 the request
+        bucket must keep that many requests spare afterwards (used by background work).
+        """
+        specs = self.bucket_specs(tokens)
+        levels = {}
+        wait = 0.0
+
+        for name, (capacity, rate, cost) in specs.items():
+            level, updated = state.get(name, (capacity, now))
+            level = min(capacity, level + max(0.0, now - updated) * rate)
+            levels[name] = level
+            needed = cost + (reserve if name == "requests" else 0)
+            if level < needed:
+                wait = max(wait, (needed - level) / rate)
+
+        for name, (capacity, rate, cost) in specs.items():
+            state[name] = (levels[name] - cost if wait == 0 else levels[name], now)
+
+        return wait
+
+    def try_acquire(self, tokens=0, reserve=0):
+        """Single non-blocking attempt against the shared (or local) buckets"""
+        if self.shared:
+            try:
+                with closing(self.connect()) as conn:
+                    conn.execute("BEGIN IMMEDIATE")  # Serialises all processes on this file
+                    try:
+                        state = {name: (level, updated) for name, level, updated in
+                                 conn.execute("SELECT name, level, updated FROM buckets")}
+                        wait = self.take(state, tokens, time.time(), reserve)
+                        conn.executemany("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                                         [(name, level, updated) for name, (level, updated) in state.items()])
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                return wait
+            except sqlite3.Error as e:
+                print(f"⚠️ Shared rate limit store error ({e}), using process-local buckets")
+                self.shared = False
+
+        with self.local_lock:
+            return self.take(self.local_state, tokens, time.time(), reserve)
+
+    def wait_if_needed(self, tokens=0):
+        """Block until one request (and `tokens` estimated tokens) fits in the budget"""
+        while True:
+            wait_time = self.try_acquire(tokens)
+            if wait_time <= 0:
+                return
+            print(f"⏳ Rate limiting: waiting {wait_time:.1f} seconds...")
+            time.sleep(wait_time)
 
-            if time_since_last < self.min_interval:
-                wait_time = self.min_interval - time_since_last
-                print(f"⏳ Rate limiting: waiting {wait_time:.1f} seconds...")
-                time.sleep(wait_time)
 
-            self.last_call_time = time.time()
+def estimate_gemini_tokens(prompt, max_output_tokens=2000):
+    """Rough token estimate (~4 chars per token) plus the output allowance, for the TPM bucket"""
+    return len(prompt or "") // 4 + max_output_tokens
 
 
 # Initialize rate limiter globally
-gemini_rate_limiter = GeminiRateLimiter(requests_per_minute=8)
+gemini_rate_limiter = GeminiRateLimiter()
+
+# Narrative generation concurrency - all workers share gemini_rate_limiter
+NARRATIVE_CONCURRENCY_ENABLED = True
+NARRATIVE_MAX_WORKERS = 4
+
+# Narrative batching - several exact_prompts entries per structured-output (JSON) request
+NARRATIVE_BATCHING_ENABLED = True
+NARRATIVE_BATCH_SIZE = 7  # 14 narratives -> 2 requests
+NARRATIVE_BATCH_MAX_OUTPUT_TOKENS = 8192
+NARRATIVE_BATCH_RETRIES = 2  # Re-issue rounds for failed keys; unparseable batches are halved each round
+NARRATIVE_BATCH_TIMEOUT = 180  # seconds per batch call (7 narratives of output)
+
+# Narrative time budget - once spent, remaining narratives go straight to template/fallback
+NARRATIVE_REPORT_BUDGET = 300  # seconds of Gemini time (calls + back-off) per report
+GEMINI_CALL_DEADLINE = 45  # seconds for any single Gemini call
+
+
+class GenerationBudget:
+    """Wall-clock budget shared by every narrative of one report"""
+
+    def __init__(self, seconds=NARRATIVE_REPORT_BUDGET):
+        self.seconds = seconds
+        self.deadline = time.time() + seconds
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.time())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def call_timeout(self, limit=GEMINI_CALL_DEADLINE):
+        """Per-call deadline, never past the end of the report budget"""
+        return max(1, min(limit, self.remaining()))
+
+    def sleep(self, seconds):
+        """Back-off that never outlives the budget; False if nothing is left afterwards"""
+        time.sleep(min(seconds, self.remaining()))
+        return not self.expired()
 # ==============================================
 
 # Load environment variables - DO THIS FIRST
@@ -176,92 +318,980 @@ def inject_config():
 import hashlib
 import pickle
 import os
-from datetime import datetime, timedelta
-
-CACHE_FILE = "ai_content_cache.pkl"
+import random
+import struct
+import zlib
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no host-wide lock, every process runs its own cache refresher
+    fcntl = None
+
+CACHE_FILE = "ai_content_cache.pkl"  # Legacy pickle cache, imported once into CACHE_DB
+CACHE_LEGACY_PROMPT_CHARS = 200  # The pickle cache only kept this much of each prompt
+CACHE_DB = "ai_content_cache.db"  # SQLite (WAL) store shared by every worker process on this host
 CACHE_EXPIRY_DAYS = 30  # Cache content for 30 days
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # Disk budget for stored (compressed) entries
+CACHE_EVICT_TO = 0.9  # Evict down to this fraction of CACHE_MAX_BYTES once over budget
+CACHE_MEMORY_KB = 2048  # SQLite page cache per connection; entries are not held in Python memory
+CACHE_SOURCE_WEIGHTS = {"gemini": 8, "template": 2, "fallback": 1}  # Eviction priority multiplier
+CACHE_REFRESH_ENABLED = True  # Upgrade template/fallback entries to Gemini content in the background
+CACHE_REFRESH_INTERVAL = 120  # seconds between refresh cycles
+CACHE_REFRESH_PER_CYCLE = 2  # entries upgraded per cycle at most
+CACHE_REFRESH_RESERVE_REQUESTS = 1  # requests left in the bucket for interactive reports
+CACHE_REFRESH_LOCK = "ai_content_cache.db.refresh.lock"  # Held by the one process per host running the refresher
+CACHE_SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard over prompt shingles for a "similar" hit
+CACHE_SHINGLE_WORDS = 3  # Word n-grams hashed into each prompt's MinHash signature
+CACHE_MINHASH_PERMUTATIONS = 64
+CACHE_LSH_BANDS = 16  # 16 bands x 4 rows: ~99.9% recall at 0.8 similarity, ~2% at 0.3
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed: signatures stored in the cache must stay comparable across restarts
+MINHASH_RNG = random.Random(14090)
+MINHASH_PARAMS = [(MINHASH_RNG.randrange(1, MERSENNE_PRIME), MINHASH_RNG.randrange(MERSENNE_PRIME))
+                  for _ in range(CACHE_MINHASH_PERMUTATIONS)]
+
+
+def compress_text(text):
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_text(value):
+    """Stored content/prompt back to text (rows written before compression are plain text)"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def prompt_shingles(prompt):
+    """64-bit hashes of the word n-grams in the full prompt"""
+    words = prompt.lower().split()
+    if len(words) < CACHE_SHINGLE_WORDS:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + CACHE_SHINGLE_WORDS]) for i in range(len(words) - CACHE_SHINGLE_WORDS + 1)]
+    return {int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "big") for gram in grams}
 
 
-def load_cache():
-    """Load cache from disk"""
-    try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'rb') as f:
-                cache = pickle.load(f)
-                # Clean expired entries
-                cleaned_cache = {}
-                for key, entry in cache.items():
-                    if datetime.now() - entry.get('timestamp', datetime.now()) < timedelta(days=CACHE_EXPIRY_DAYS):
-                        cleaned_cache[key] = entry
-                return cleaned_cache
-    except Exception as e:
-        print(f"⚠️ Error loading cache: {e}")
-    return {}
+def minhash_signature(prompt):
+    """MinHash signature (CACHE_MINHASH_PERMUTATIONS values), or None for an empty prompt"""
+    shingles = prompt_shingles(prompt)
+    if not shingles:
+        return None
+    return [min((a * x + b) % MERSENNE_PRIME for x in shingles) for a, b in MINHASH_PARAMS]
 
 
-def save_cache(cache):
-    """Save cache to disk"""
-    try:
-        with open(CACHE_FILE, 'wb') as f:
-            pickle.dump(cache, f)
-    except Exception as e:
-        print(f"⚠️ Error saving cache: {e}")
+def minhash_similarity(signature1, signature2):
+    """Estimated Jaccard similarity of the two prompts' shingle sets"""
+    return sum(1 for x, y in zip(signature1, signature2) if x == y) / len(signature1)
+
+
+def lsh_buckets(signature):
+    """One bucket id per band; prompts sharing any bucket are similarity candidates"""
+    rows = CACHE_MINHASH_PERMUTATIONS // CACHE_LSH_BANDS
+    buckets = []
+    for band in range(CACHE_LSH_BANDS):
+        band_values = struct.pack(f"<{rows}Q", *signature[band * rows:(band + 1) * rows])
+        buckets.append(f"{band}:{hashlib.md5(band_values).hexdigest()[:16]}")
+    return buckets
+
+
+class ContentCacheStore:
+    """AI narrative cache in SQLite, keyed by (narrative_key, prompt hash).
+
+    Every put is a single-row upsert and every read filters on the TTL, so there is no
+    whole-file rewrite or startup expiry scan. WAL mode lets report threads and worker
+    processes read while one of them writes. Each entry also stores the MinHash signature
+    of its full prompt plus one LSH bucket row per band (cache_lsh), so near-duplicate
+    lookup only compares against prompts that share a bucket.
+
+    Content and prompt are zlib-compressed. When the stored size passes max_bytes, the
+    entries with the lowest CACHE_SOURCE_WEIGHTS[source] * (hits + 1) are evicted first,
+    least recently used first among equals, so Gemini results outlive fallbacks.
+    """
+
+    def __init__(self, db_path=CACHE_DB, expiry_days=CACHE_EXPIRY_DAYS, legacy_file=CACHE_FILE,
+                 max_bytes=CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.ttl = expiry_days * 86400
+        self.max_bytes = max_bytes
+        self.available = self.init_store()
+        if self.available and legacy_file:
+            self.import_legacy_pickle(legacy_file)
+
+    def init_store(self):
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS cache_entries ("
+                             "narrative_key TEXT NOT NULL, prompt_hash TEXT NOT NULL, prompt TEXT NOT NULL, "
+                             "content TEXT NOT NULL, source TEXT NOT NULL, created REAL NOT NULL, "
+                             "PRIMARY KEY (narrative_key, prompt_hash))")
+                conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_created ON cache_entries (created)")
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_entries)")}
+                for column, definition in (("signature", "BLOB"),
+                                           ("size", "INTEGER NOT NULL DEFAULT 0"),
+                                           ("hits", "INTEGER NOT NULL DEFAULT 0"),
+                                           ("last_access", "REAL NOT NULL DEFAULT 0"),
+                                           ("prompt_truncated", "INTEGER NOT NULL DEFAULT 0")):
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE cache_entries ADD COLUMN {column} {definition}")
+                if "prompt_truncated" not in columns:
+                    self.flag_truncated_prompts(conn)
+                # Rows written before sizes were tracked (incl. legacy imports) count like put() would
+                conn.execute("UPDATE cache_entries SET size = length(CAST(prompt AS BLOB)) + "
+                             "length(CAST(content AS BLOB)) + COALESCE(length(signature), 0) WHERE size = 0")
+                conn.execute("CREATE TABLE IF NOT EXISTS cache_lsh (narrative_key TEXT NOT NULL, "
+                             "bucket TEXT NOT NULL, prompt_hash TEXT NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS cache_lsh_bucket ON cache_lsh (narrative_key, bucket)")
+                conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value TEXT)")
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Content cache store unavailable ({e}), caching disabled")
+            return False
+
+    @staticmethod
+    def legacy_prompt_truncated(prompt):
+        """True if prompt may be the pickle cache's 200-character cut rather than the whole prompt"""
+        return len(prompt) >= CACHE_LEGACY_PROMPT_CHARS
+
+    @staticmethod
+    def flag_truncated_prompts(conn):
+        """Mark existing non-Gemini rows whose prompt is the legacy 200-character cut"""
+        rows = conn.execute("SELECT narrative_key, prompt_hash, prompt FROM cache_entries "
+                            "WHERE source != 'gemini'").fetchall()
+        truncated = [(narrative_key, prompt_hash) for narrative_key, prompt_hash, prompt in rows
+                     if ContentCacheStore.legacy_prompt_truncated(decompress_text(prompt))]
+        conn.executemany("UPDATE cache_entries SET prompt_truncated = 1 "
+                         "WHERE narrative_key = ? AND prompt_hash = ?", truncated)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute(f"PRAGMA cache_size=-{CACHE_MEMORY_KB}")
+        return conn
+
+    def import_legacy_pickle(self, legacy_file):
+        """One-time import of unexpired entries from the old pickle cache"""
+        if not os.path.exists(legacy_file) or self.get_meta("legacy_imported"):
+            return
+        try:
+            with open(legacy_file, 'rb') as f:
+                legacy = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ Error loading legacy cache: {e}")
+            return
+        self.set_meta("legacy_imported", datetime.now().isoformat())
+
+        imported = 0
+        for key, entry in legacy.items():
+            timestamp = entry.get('timestamp')
+            if not isinstance(timestamp, datetime) or 'narrative_key' not in entry:
+                continue
+            # Legacy keys are "<narrative_key>_<prompt hash>"
+            prompt_hash = key.rsplit('_', 1)[-1]
+            prompt = entry.get('prompt', '')
+            if self.put(entry['narrative_key'], prompt_hash, prompt, entry['content'],
+                        entry.get('source', 'gemini'), timestamp.timestamp(),
+                        prompt_truncated=self.legacy_prompt_truncated(prompt)):
+                imported += 1
+        print(f"💾 Imported {imported}/{len(legacy)} entries from {legacy_file}")
+
+    def get_meta(self, name):
+        rows = self.query("SELECT value FROM cache_meta WHERE name = ?", (name,))
+        return rows[0]['value'] if rows else None
+
+    def set_meta(self, name, value):
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("INSERT OR REPLACE INTO cache_meta (name, value) VALUES (?, ?)", (name, value))
+        except sqlite3.Error as e:
+            print(f"⚠️ Error saving cache metadata: {e}")
+
+    def put(self, narrative_key, prompt_hash, prompt, content, source, created=None, prompt_truncated=False):
+        if not self.available:
+            return False
+        signature = minhash_signature(prompt)
+        signature_blob = struct.pack(f"<{len(signature)}Q", *signature) if signature else None
+        stored_prompt = compress_text(prompt)
+        stored_content = compress_text(content)
+        size = len(stored_prompt) + len(stored_content) + len(signature_blob or b"")
+        created = created or time.time()
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("INSERT OR REPLACE INTO cache_entries "
+                                 "(narrative_key, prompt_hash, prompt, content, source, created, signature, "
+                                 "size, hits, last_access, prompt_truncated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                                 (narrative_key, prompt_hash, stored_prompt, stored_content, source, created,
+                                  signature_blob, size, created, int(prompt_truncated)))
+                    conn.execute("DELETE FROM cache_lsh WHERE narrative_key = ? AND prompt_hash = ?",
+                                 (narrative_key, prompt_hash))
+                    if signature:
+                        conn.executemany("INSERT INTO cache_lsh (narrative_key, bucket, prompt_hash) VALUES (?, ?, ?)",
+                                         [(narrative_key, bucket, prompt_hash) for bucket in lsh_buckets(signature)])
+                    self.enforce_budget(conn, (narrative_key, prompt_hash))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Error saving cache entry: {e}")
+            return False
+
+    def enforce_budget(self, conn, keep=None):
+        """Inside a write transaction: evict lowest-priority rows until under the byte budget"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        target = self.max_bytes * CACHE_EVICT_TO
+        weight_sql = "CASE source " + " ".join(
+            f"WHEN '{source}' THEN {weight}" for source, weight in CACHE_SOURCE_WEIGHTS.items()) + " ELSE 1 END"
+        # Expired rows first (created >= cutoff is 0 for them), then weighted LFU, then LRU
+        candidates = conn.execute(
+            "SELECT narrative_key, prompt_hash, size FROM cache_entries "
+            f"ORDER BY created >= ?, {weight_sql} * (hits + 1), last_access",
+            (time.time() - self.ttl,)).fetchall()
+
+        evicted = []
+        for narrative_key, prompt_hash, size in candidates:
+            if total <= target:
+                break
+            if (narrative_key, prompt_hash) == keep:
+                continue
+            evicted.append((narrative_key, prompt_hash))
+            total -= size
+
+        conn.executemany("DELETE FROM cache_entries WHERE narrative_key = ? AND prompt_hash = ?", evicted)
+        conn.executemany("DELETE FROM cache_lsh WHERE narrative_key = ? AND prompt_hash = ?", evicted)
+        conn.execute("INSERT INTO cache_meta (name, value) VALUES ('evictions', ?) "
+                     "ON CONFLICT(name) DO UPDATE SET value = CAST(value AS INTEGER) + ?",
+                     (len(evicted), len(evicted)))
+        print(f"🧹 Cache over budget: evicted {len(evicted)} entries")
+        return len(evicted)
+
+    def touch(self, narrative_key, prompt_hash):
+        """Record a hit for eviction priority"""
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("UPDATE cache_entries SET hits = hits + 1, last_access = ? "
+                             "WHERE narrative_key = ? AND prompt_hash = ?", (time.time(), narrative_key, prompt_hash))
+        except sqlite3.Error as e:
+            print(f"⚠️ Error updating cache entry: {e}")
+
+    def decode(self, entry):
+        for field in ("prompt", "content"):
+            if field in entry:
+                entry[field] = decompress_text(entry[field])
+        return entry
+
+    def get(self, narrative_key, prompt_hash):
+        """Unexpired entry as a dict, or None"""
+        rows = self.query("SELECT narrative_key, prompt_hash, prompt, content, source, created FROM cache_entries "
+                          "WHERE narrative_key = ? AND prompt_hash = ? AND created >= ?",
+                          (narrative_key, prompt_hash, time.time() - self.ttl))
+        if not rows:
+            return None
+        self.touch(narrative_key, prompt_hash)
+        return self.decode(rows[0])
+
+    def find_similar(self, narrative_key, prompt, threshold=CACHE_SIMILARITY_THRESHOLD):
+        """Most similar unexpired entry for narrative_key among its LSH candidates, or None"""
+        signature = minhash_signature(prompt)
+        if not signature:
+            return None
+
+        buckets = lsh_buckets(signature)
+        candidates = self.query(
+            "SELECT e.content, e.source, e.prompt_hash, e.signature FROM cache_entries e "
+            "WHERE e.narrative_key = ? AND e.created >= ? AND e.signature IS NOT NULL AND e.prompt_hash IN ("
+            "SELECT prompt_hash FROM cache_lsh WHERE narrative_key = ? AND bucket IN "
+            f"({', '.join('?' * len(buckets))}))",
+            (narrative_key, time.time() - self.ttl, narrative_key, *buckets))
+
+        best, best_similarity = None, threshold
+        for entry in candidates:
+            stored = entry['signature']
+            if len(stored) != 8 * len(signature):
+                continue  # Signature from a different CACHE_MINHASH_PERMUTATIONS setting
+            similarity = minhash_similarity(signature, struct.unpack(f"<{len(signature)}Q", stored))
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+
+        if best is None:
+            return None
+        self.touch(narrative_key, best['prompt_hash'])
+        return self.decode(best)
+
+    def query(self, sql, params):
+        if not self.available:
+            return []
+        try:
+            with closing(self.connect()) as conn:
+                conn.row_factory = sqlite3.Row
+                return [dict(row) for row in conn.execute(sql, params)]
+        except sqlite3.Error as e:
+            print(f"⚠️ Error reading cache: {e}")
+            return []
+
+    def upgrade_candidates(self, limit):
+        """Unexpired non-Gemini entries, most used first
+
+        Legacy imports whose prompt was cut to 200 characters are left alone: regenerating from
+        that fragment would store the wrong content under the full prompt's key.
+        """
+        rows = self.query("SELECT narrative_key, prompt_hash, prompt, source, created FROM cache_entries "
+                          "WHERE source != 'gemini' AND prompt_truncated = 0 AND created >= ? "
+                          "ORDER BY hits DESC, last_access DESC LIMIT ?",
+                          (time.time() - self.ttl, limit))
+        return [self.decode(row) for row in rows]
+
+    def replace_if_unchanged(self, entry, content, source="gemini"):
+        """Swap in upgraded content only if the entry was not rewritten meanwhile (compare-and-swap)"""
+        if not self.available:
+            return False
+        stored_content = compress_text(content)
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    swapped = conn.execute(
+                        "UPDATE cache_entries SET content = ?, source = ?, created = ?, "
+                        "size = size - length(content) + ? "
+                        "WHERE narrative_key = ? AND prompt_hash = ? AND source = ? AND created = ?",
+                        (stored_content, source, time.time(), len(stored_content), entry['narrative_key'],
+                         entry['prompt_hash'], entry['source'], entry['created'])).rowcount
+                    if swapped:
+                        self.enforce_budget(conn, (entry['narrative_key'], entry['prompt_hash']))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            return bool(swapped)
+        except sqlite3.Error as e:
+            print(f"⚠️ Error upgrading cache entry: {e}")
+            return False
+
+    def stats(self):
+        """Entry count, stored size against the budget, evictions and per-source counts"""
+        rows = self.query("SELECT source, COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes, "
+                          "COALESCE(SUM(hits), 0) AS hits FROM cache_entries WHERE created >= ? GROUP BY source",
+                          (time.time() - self.ttl,))
+        return {
+            "entries": sum(row['entries'] for row in rows),
+            "bytes": sum(row['bytes'] for row in rows),
+            "max_bytes": self.max_bytes,
+            "evictions": int(self.get_meta("evictions") or 0),
+            "by_source": {row['source']: {"entries": row['entries'], "bytes": row['bytes'], "hits": row['hits']}
+                          for row in rows},
+        }
+
+    def count(self, include_expired=False):
+        cutoff = 0 if include_expired else time.time() - self.ttl
+        rows = self.query("SELECT COUNT(*) AS n FROM cache_entries WHERE created >= ?", (cutoff,))
+        return rows[0]['n'] if rows else 0
+
+    def purge_expired(self):
+        """Delete expired rows (reads already ignore them); returns the number removed"""
+        if not self.available:
+            return 0
+        try:
+            with closing(self.connect()) as conn:
+                removed = conn.execute("DELETE FROM cache_entries WHERE created < ?",
+                                       (time.time() - self.ttl,)).rowcount
+                conn.execute("DELETE FROM cache_lsh WHERE NOT EXISTS (SELECT 1 FROM cache_entries e "
+                             "WHERE e.narrative_key = cache_lsh.narrative_key AND e.prompt_hash = cache_lsh.prompt_hash)")
+                return removed
+        except sqlite3.Error as e:
+            print(f"⚠️ Error purging cache: {e}")
+            return 0
+
+
+def get_prompt_hash(prompt):
+    return hashlib.md5(prompt.encode()).hexdigest()[:16]
 
 
 def get_cache_key(narrative_key, prompt):
     """Generate cache key from narrative key and prompt"""
-    prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:16]
-    return f"{narrative_key}_{prompt_hash}"
+    return f"{narrative_key}_{get_prompt_hash(prompt)}"
+
+
+class SingleFlight:
+    """Coalesces identical in-flight work: one leader runs it, concurrent callers share its Future.
+
+    Keys are get_cache_key(narrative_key, prompt), so two reports generating the same
+    narrative from the same prompt spend one Gemini call between them.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.in_flight = {}
+        self.coalesced = 0
+
+    def claim(self, key):
+        """(future, is_leader); the leader must call resolve() exactly once"""
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self.in_flight[key] = future
+            return future, True
+
+    def resolve(self, key, future, result=None, error=None):
+        with self.lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def wait(self, future, timeout=None):
+        """Leader's result, or None if it failed or did not finish within timeout"""
+        try:
+            with gemini_wait_for_job():
+                return future.result(timeout=timeout)
+        except Exception:  # Timeout, or the leader's own error (it reports that itself)
+            return None
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() as leader, or wait for the current leader's result"""
+        future, leader = self.claim(key)
+        if not leader:
+            print(f"🔗 Waiting on in-flight request for {key}")
+            return self.wait(future, timeout)
+        try:
+            result = fn()
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+
+narrative_flights = SingleFlight()
 
 
 def cache_result(narrative_key, prompt, content, source="gemini"):
     """Cache successful generation"""
-    cache_key = get_cache_key(narrative_key, prompt)
-    CONTENT_CACHE[cache_key] = {
-        'content': content,
-        'narrative_key': narrative_key,
-        'prompt': prompt[:200],  # Store first 200 chars
-        'source': source,
-        'timestamp': datetime.now()
-    }
-    save_cache(CONTENT_CACHE)
+    CONTENT_CACHE.put(narrative_key, get_prompt_hash(prompt), prompt, content, source)
     print(f"💾 Cached {narrative_key} from {source}")
 
 
-def get_cached_similar_content(narrative_key, prompt, similarity_threshold=0.8):
+def get_cached_similar_content(narrative_key, prompt, similarity_threshold=CACHE_SIMILARITY_THRESHOLD):
     """Find similar cached content"""
-    cache_key = get_cache_key(narrative_key, prompt)
-
     # 1. Exact match
-    if cache_key in CONTENT_CACHE:
-        return CONTENT_CACHE[cache_key]['content']
+    entry = CONTENT_CACHE.get(narrative_key, get_prompt_hash(prompt))
+    if entry:
+        return entry['content']
 
-    # 2. Similar narrative key match
-    for key, entry in CONTENT_CACHE.items():
-        if entry['narrative_key'] == narrative_key:
-            # Check if prompts are similar enough
-            if is_prompt_similar(prompt, entry['prompt'], similarity_threshold):
-                print(f"📄 Using similar cached content for {narrative_key}")
-                return entry['content']
+    # 2. Near-duplicate prompt for the same narrative key (MinHash/LSH over the full prompt)
+    entry = CONTENT_CACHE.find_similar(narrative_key, prompt, similarity_threshold)
+    if entry:
+        print(f"📄 Using similar cached content for {narrative_key}")
+        return entry['content']
 
     return None
 
 
-def is_prompt_similar(prompt1, prompt2, threshold=0.8):
-    """Simple similarity check (you can improve this)"""
-    words1 = set(prompt1.lower().split()[:50])  # First 50 words
-    words2 = set(prompt2.lower().split()[:50])
+# Initialize global cache
+CONTENT_CACHE = ContentCacheStore()
+cache_stats = CONTENT_CACHE.stats()
+print(f"💾 Loaded {cache_stats['entries']} cached AI responses "
+      f"({cache_stats['bytes'] // 1024} KB of {cache_stats['max_bytes'] // (1024 * 1024)} MB, "
+      f"{cache_stats['evictions']} evictions)")
 
-    if not words1 or not words2:
-        return False
 
-    similarity = len(words1.intersection(words2)) / len(words1.union(words2))
-    return similarity >= threshold
+# ---------------- DOCUMENT INDEX ----------------
+PLACEHOLDER_PATTERN = re.compile(r"\[\[[^\[\]]+\]\]")
 
 
-# Initialize global cache
-CONTENT_CACHE = load_cache()
-print(f"💾 Loaded {len(CONTENT_CACHE)} cached AI responses")
+class DocumentIndex:
+    """Body paragraph list, heading levels and placeholder positions for one Document.
+
+    doc.paragraphs builds a fresh proxy list on every access, so loops that call
+    doc.paragraphs[j] or len(doc.paragraphs) are O(n²). Helpers take the list from here
+    once instead. insert_paragraph_before / add_paragraph / remove_paragraph keep the
+    index in step; any other structural edit is detected by is_current() and the index
+    is rebuilt on the next get_document_index() call.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.rebuild()
+
+    def rebuild(self):
+        self.paragraphs = self.doc.paragraphs
+        self.elements = [paragraph._p for paragraph in self.paragraphs]
+
+    def is_current(self):
+        return self.doc.element.body.p_lst == self.elements
+
+    def __len__(self):
+        return len(self.paragraphs)
+
+    def __getitem__(self, i):
+        return self.paragraphs[i]
+
+    def __iter__(self):
+        # Snapshot, like doc.paragraphs: inserting while iterating must not shift the loop
+        return iter(list(self.paragraphs))
+
+    def text(self, i):
+        return self.paragraphs[i].text
+
+    def heading_level(self, i):
+        """Heading level of paragraph i, 0 for a heading style without a number, None otherwise"""
+        style_name = self.paragraphs[i].style.name
+        if not style_name.startswith('Heading'):
+            return None
+        try:
+            return int(style_name.replace('Heading ', ''))
+        except ValueError:
+            return 0
+
+    def headings(self):
+        """[(index, level, text)] for every heading-styled paragraph"""
+        headings = []
+        for i, paragraph in enumerate(self.paragraphs):
+            level = self.heading_level(i)
+            if level is not None:
+                headings.append((i, level, paragraph.text))
+        return headings
+
+    def find(self, needle, start=0, end=None, case_sensitive=False, predicate=None):
+        """Index of the first paragraph in [start, end) containing needle (and passing predicate), or -1"""
+        needle = needle if case_sensitive else needle.lower()
+        for i in range(start, len(self.paragraphs) if end is None else min(end, len(self.paragraphs))):
+            text = self.paragraphs[i].text
+            if needle in (text if case_sensitive else text.lower()) and (predicate is None or predicate(i, text)):
+                return i
+        return -1
+
+    def placeholders(self):
+        """{"[[Name]]": [paragraph indexes]} for body paragraphs"""
+        locations = {}
+        for i, paragraph in enumerate(self.paragraphs):
+            text = paragraph.text
+            if "[[" in text:
+                for placeholder in PLACEHOLDER_PATTERN.findall(text):
+                    locations.setdefault(placeholder, []).append(i)
+        return locations
+
+    def insert_paragraph_before(self, i, text="", style=None):
+        paragraph = self.paragraphs[i].insert_paragraph_before(text, style)
+        self.paragraphs.insert(i, paragraph)
+        self.elements.insert(i, paragraph._p)
+        return paragraph
+
+    def add_paragraph(self, text="", style=None):
+        paragraph = self.doc.add_paragraph(text, style)
+        self.paragraphs.append(paragraph)
+        self.elements.append(paragraph._p)
+        return paragraph
+
+    def remove_paragraph(self, i):
+        element = self.elements.pop(i)
+        self.paragraphs.pop(i)
+        element.getparent().remove(element)
+
+
+def get_document_index(doc):
+    """Shared DocumentIndex for doc, rebuilt only if the body changed behind its back"""
+    index = getattr(doc, "document_index", None)
+    if index is None or not index.is_current():
+        index = DocumentIndex(doc)
+        doc.document_index = index
+    return index
+
+
+# Compiled queries for the scan layer. Candidates are picked on the first character of the
+# marker appearing in any w:t (placeholders are often split across runs), then confirmed
+# against paragraph.text, so Paragraph proxies are only built for the few hits.
+W_NAMESPACES = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
+SCAN_BODY_CANDIDATES = etree.XPath("w:p[.//w:t[contains(., $first)]]", namespaces=W_NAMESPACES)
+SCAN_TABLE_CANDIDATES = etree.XPath("w:tbl//w:p[.//w:t[contains(., $first)]]", namespaces=W_NAMESPACES)
+SCAN_PART_CANDIDATES = etree.XPath(".//w:p[.//w:t[contains(., $first)]]", namespaces=W_NAMESPACES)
+
+
+def sibling_index(element):
+    """Position of element among its siblings with the same tag"""
+    return sum(1 for _ in element.itersiblings(element.tag, preceding=True))
+
+
+def scan_location(p):
+    """Table/row/cell/paragraph label for a table paragraph element"""
+    table = row = cell = None
+    for ancestor in p.iterancestors(qn("w:tc"), qn("w:tr"), qn("w:tbl")):
+        if ancestor.tag == qn("w:tc"):
+            cell = cell if cell is not None else ancestor
+        elif ancestor.tag == qn("w:tr"):
+            row = row if row is not None else ancestor
+        else:
+            table = ancestor  # outermost wins, matching the doc.tables index
+    return (f"Table{sibling_index(table)}-R{sibling_index(row)}"
+            f"-C{sibling_index(cell)}-P{sibling_index(p)}")
+
+
+def scan_paragraphs(doc, marker="[[", tables=True, headers=True):
+    """Yield (location, Paragraph) for paragraphs whose text contains marker.
+
+    location is the doc.paragraphs index for body paragraphs and a label such as
+    "Table0-R1-C2-P0" or "Header1-P0" otherwise. Tables and headers/footers are
+    scanned after the body, in document order.
+    """
+    body = doc.element.body
+    for p in SCAN_BODY_CANDIDATES(body, first=marker[0]):
+        paragraph = Paragraph(p, doc._body)
+        if marker in paragraph.text:
+            yield sibling_index(p), paragraph
+
+    if tables:
+        for p in SCAN_TABLE_CANDIDATES(body, first=marker[0]):
+            paragraph = Paragraph(p, doc._body)
+            if marker in paragraph.text:
+                yield scan_location(p), paragraph
+
+    if headers:
+        for section_idx, section in enumerate(doc.sections):
+            for name, part in (("Header", section.header), ("Footer", section.footer)):
+                # A linked header/footer is either the previous section's part or absent;
+                # touching it would add a definition to the document
+                if part.is_linked_to_previous:
+                    continue
+                for p in SCAN_PART_CANDIDATES(part._element, first=marker[0]):
+                    paragraph = Paragraph(p, part)
+                    if marker in paragraph.text:
+                        yield f"{name}{section_idx}-P{sibling_index(p)}", paragraph
+
+
+# ---------------- TEMPLATE REGISTRY ----------------
+import copy
+import io
+
+TEMPLATE_CACHE_SIZE = 4  # distinct template contents kept parsed in memory
+
+
+class TemplateRegistry:
+    """Parsed, pre-processed templates keyed by SHA-256 of the file contents.
+
+    A template is unzipped, parsed and run through the client-independent load-time
+    pass once; each job then gets a deep copy of the prepared package. Keying on
+    content rather than path means re-uploads of the same Template.docx share an
+    entry. update_template_for_v4_structure and update_toc_section_titles read json_data
+    and stay per job. ensure_placeholders_in_doc takes only the document but also stays
+    per job: it runs after the v4 restructuring and fills in whatever that left missing.
+    """
+
+    def __init__(self, max_templates=TEMPLATE_CACHE_SIZE):
+        self.max_templates = max_templates
+        self.templates = {}
+        self.lock = Lock()
+
+    def prepare(self, blob):
+        doc = Document(io.BytesIO(blob))
+        fix_executive_summary_headings(doc)
+        return doc
+
+    def load(self, template_path):
+        """Fresh Document for one job, equivalent to Document(path) plus the load-time fixes"""
+        with open(template_path, "rb") as f:
+            blob = f.read()
+        digest = hashlib.sha256(blob).hexdigest()
+
+        with self.lock:
+            prepared = self.templates.pop(digest, None)
+            if prepared is not None:
+                self.templates[digest] = prepared  # most recently used last
+
+        if prepared is None:
+            print(f"📄 Parsing template {os.path.basename(template_path)} ({digest[:12]})...")
+            prepared = self.prepare(blob)
+            with self.lock:
+                self.templates[digest] = prepared
+                while len(self.templates) > self.max_templates:
+                    del self.templates[next(iter(self.templates))]
+
+        return copy.deepcopy(prepared)
+
+
+template_registry = TemplateRegistry()
+
+
+# ---------------- PASS MANAGER ----------------
+# What a report pass can look at or change. "text" is body text in general; passes that can
+# introduce or remove [[...]] tokens must also declare "placeholders".
+DOCUMENT_ASPECTS = ("text", "placeholders", "headings", "tables", "toc", "images")
+
+
+class ReportPass:
+    """Declaration of one document pass: what it reads, what it writes.
+
+    REPORT_PASSES is built at the end of app.py, so it registers the definition that is
+    live at import time. settles lists passes the function already finishes with when it
+    succeeds (e.g. insert_excel_table_data returns True right after
+    remove_specific_placeholders).
+    """
+
+    def __init__(self, function, reads=(), writes=(), settles=()):
+        self.function = function
+        self.name = function.__name__
+        self.reads = tuple(reads)
+        self.writes = tuple(writes)
+        self.settles = tuple(settles)
+
+
+class PassManager:
+    """Runs declared passes over one document, skipping repeats whose inputs are unchanged.
+
+    Every aspect carries a generation counter that a pass bumps for each aspect it writes.
+    A pass called with only the document is skipped when the generations of everything it
+    reads are the same as when it last finished. Passes with extra arguments depend on more
+    than the document and always run. Code that edits the document outside a pass must call
+    invalidate().
+    """
+
+    def __init__(self, doc, passes):
+        self.doc = doc
+        self.passes = passes
+        self.generation = dict.fromkeys(DOCUMENT_ASPECTS, 0)
+        self.seen = {}
+        self.timings = []
+
+    def invalidate(self, *aspects):
+        for aspect in aspects or DOCUMENT_ASPECTS:
+            self.generation[aspect] += 1
+
+    def snapshot(self, report_pass):
+        return tuple(self.generation[aspect] for aspect in report_pass.reads)
+
+    def run(self, name, *args, **kwargs):
+        report_pass = self.passes[name]
+        if not args and not kwargs and self.seen.get(name) == self.snapshot(report_pass):
+            print(f"⏭️ Skipping {name}: inputs unchanged since last run")
+            self.timings.append((name, 0.0, True))
+            return None
+
+        start = time.perf_counter()
+        try:
+            result = report_pass.function(self.doc, *args, **kwargs)
+        finally:
+            self.timings.append((name, time.perf_counter() - start, False))
+            # Even a pass that raised may have changed what it writes
+            if report_pass.writes:
+                self.invalidate(*report_pass.writes)
+
+        # Only a pass that finished counts as up to date
+        self.seen[name] = self.snapshot(report_pass)
+        for settled in report_pass.settles if result else ():
+            self.seen[settled] = self.snapshot(self.passes[settled])
+        return result
+
+    def report(self, top=10):
+        total = sum(seconds for _, seconds, _ in self.timings)
+        skipped = sum(1 for _, _, was_skipped in self.timings if was_skipped)
+        print(f"⏱️ {len(self.timings)} passes in {total:.2f}s ({skipped} skipped)")
+        for name, seconds, was_skipped in sorted(self.timings, key=lambda t: -t[1])[:top]:
+            if not was_skipped:
+                print(f"   • {name}: {seconds:.3f}s")
+
+
+# ---------------- JOB METRICS ----------------
+try:
+    import resource
+except ImportError:  # Windows: RSS figures are reported as 0
+    resource = None
+
+# The report job running on this thread (and on the narrative workers it starts)
+job_context = local()
+# task_id -> JobMetrics for jobs still running, so /progress can show the open stage live
+active_job_metrics = {}
+
+
+def read_rss_kb():
+    """Current resident set size of the process in KB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        return read_peak_rss_kb()
+
+
+def read_peak_rss_kb():
+    """Peak resident set size of the process so far in KB (ru_maxrss is KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+
+
+def thread_cpu_clock():
+    """CPU-time clock id of the calling thread, readable from other threads (None where unsupported)"""
+    try:
+        return time.pthread_getcpuclockid(get_ident())
+    except (AttributeError, OSError):
+        return None
+
+
+class JobMetrics:
+    """Per-stage wall, CPU, Gemini-wait and memory figures for one report job.
+
+    Stages run one after another: begin() closes the open stage and starts the next.
+    CPU is the job thread's CPU clock, so narrative worker threads are not in it; /progress
+    reads it from its own thread through pthread_getcpuclockid and reports None for the open
+    stage where that is unavailable. Gemini wait is wall time with at least one Gemini call (or a wait on another
+    job's identical call) in flight for this job, rate-limiter queueing included; parallel
+    calls are not double counted. Memory is process RSS, shared with any concurrent job.
+    """
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.lock = Lock()
+        self.stages = []
+        self.current = None
+        self.in_flight = 0
+        self.busy_since = None
+        self.gemini_wait = 0.0
+        self.gemini_calls = 0
+        self.started = time.perf_counter()
+
+    def gemini_started(self):
+        with self.lock:
+            self.gemini_calls += 1
+            if self.in_flight == 0:
+                self.busy_since = time.perf_counter()
+            self.in_flight += 1
+
+    def gemini_finished(self):
+        with self.lock:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.gemini_wait += time.perf_counter() - self.busy_since
+
+    def gemini_totals(self):
+        with self.lock:
+            busy = time.perf_counter() - self.busy_since if self.in_flight else 0.0
+            return self.gemini_wait + busy, self.gemini_calls
+
+    def begin(self, name):
+        self.end()
+        gemini_wait, gemini_calls = self.gemini_totals()
+        cpu_clock = thread_cpu_clock()
+        self.current = {
+            "stage": name,
+            "wall": time.perf_counter(),
+            "cpu": time.clock_gettime(cpu_clock) if cpu_clock is not None else time.thread_time(),
+            "cpu_clock": cpu_clock,
+            "thread": get_ident(),
+            "gemini_wait": gemini_wait,
+            "gemini_calls": gemini_calls,
+            "rss_kb": read_rss_kb(),
+            "peak_rss_kb": read_peak_rss_kb(),
+        }
+
+    @staticmethod
+    def stage_cpu(start):
+        """CPU seconds of the thread that began start so far, or None if this thread cannot read it"""
+        if start["cpu_clock"] is not None:
+            try:
+                return time.clock_gettime(start["cpu_clock"])
+            except OSError:  # the job thread has exited
+                return None
+        return time.thread_time() if get_ident() == start["thread"] else None
+
+    def measure(self, start):
+        gemini_wait, gemini_calls = self.gemini_totals()
+        cpu = self.stage_cpu(start)
+        return {
+            "stage": start["stage"],
+            "wall": round(time.perf_counter() - start["wall"], 3),
+            "cpu": round(cpu - start["cpu"], 3) if cpu is not None else None,
+            "gemini_wait": round(gemini_wait - start["gemini_wait"], 3),
+            "gemini_calls": gemini_calls - start["gemini_calls"],
+            "rss_delta_kb": read_rss_kb() - start["rss_kb"],
+            "peak_rss_delta_kb": read_peak_rss_kb() - start["peak_rss_kb"],
+        }
+
+    def end(self):
+        if self.current is not None:
+            self.stages.append(self.measure(self.current))
+            self.current = None
+
+    def snapshot(self):
+        """Closed stages plus the open one measured so far, for /progress"""
+        current = self.current  # read once: the job thread may end() it meanwhile
+        return {
+            "stages": list(self.stages),
+            "current_stage": self.measure(current) if current else None,
+        }
+
+    def summary(self):
+        gemini_wait, gemini_calls = self.gemini_totals()
+        return {
+            "wall": round(time.perf_counter() - self.started, 3),
+            "cpu": round(sum(stage["cpu"] for stage in self.stages), 3),
+            "gemini_wait": round(gemini_wait, 3),
+            "gemini_calls": gemini_calls,
+            "peak_rss_kb": read_peak_rss_kb(),
+            "slowest_stages": [stage["stage"] for stage in
+                               sorted(self.stages, key=lambda stage: -stage["wall"])[:3]],
+        }
+
+    def finish(self):
+        """Close the last stage, store stages and summary on the task and stop tracking"""
+        self.end()
+        summary = self.summary()
+        if self.task_id in processing_tasks:
+            processing_tasks[self.task_id]["stages"] = list(self.stages)
+            processing_tasks[self.task_id]["timing"] = summary
+        active_job_metrics.pop(self.task_id, None)
+        if getattr(job_context, "metrics", None) is self:
+            job_context.metrics = None
+
+        print(f"⏱️ Job {self.task_id}: {summary['wall']}s wall, {summary['cpu']}s CPU, "
+              f"{summary['gemini_wait']}s waiting on Gemini ({summary['gemini_calls']} calls)")
+        for stage in sorted(self.stages, key=lambda stage: -stage["wall"])[:5]:
+            print(f"   • {stage['stage']}: {stage['wall']}s wall, {stage['cpu']}s CPU, "
+                  f"{stage['gemini_wait']}s Gemini, {stage['rss_delta_kb']:+d} KB RSS")
+        return summary
+
+
+def start_job_metrics(task_id):
+    """JobMetrics for task_id, bound to the calling thread"""
+    metrics = JobMetrics(task_id)
+    active_job_metrics[task_id] = metrics
+    job_context.metrics = metrics
+    return metrics
+
+
+def bind_job_metrics(fn):
+    """Wrap fn so a worker thread running it charges Gemini time to the caller's job"""
+    metrics = getattr(job_context, "metrics", None)
+    if metrics is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        job_context.metrics = metrics
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            job_context.metrics = None
+
+    return bound
+
+
+@contextmanager
+def gemini_wait_for_job():
+    """Count the enclosed block as Gemini wait for the job bound to this thread, if any"""
+    metrics = getattr(job_context, "metrics", None)
+    if metrics is not None:
+        metrics.gemini_started()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.gemini_finished()
 
 
 # ===================================================
@@ -547,62 +1577,11 @@ def handle_industry_placeholders(doc, json_data):
 def remove_unwanted_ai_analysis(doc):
     """Remove unwanted AI analysis sections from the document"""
     print("🗑️ Removing unwanted AI analysis sections...")
-
-    # Patterns to look for (partial matches)
-    # Load patterns from settings if available
-    unwanted_patterns = []
-    if REPORT_SETTINGS and "unwanted_ai_patterns" in REPORT_SETTINGS:
-        unwanted_patterns = REPORT_SETTINGS["unwanted_ai_patterns"]
-    
-    # Fallback to defaults
-    if not unwanted_patterns:
-        unwanted_patterns = [
-            "AI-Powered Analysis",
-            "Based on the provided file names",
-            "Climate Risk Assessment: Eastern",
-            "Eastern Country/Firm",
-            "Main Climate Risks and Vulnerabilities:"
-        ]
-
-    removed_count = 0
-
-    # Check paragraphs
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text
-        for pattern in unwanted_patterns:
-            if pattern in text:
-                print(f"⚠️ Found unwanted pattern '{pattern}' in paragraph {i}")
-
-                # Check if this is the start of an AI analysis section
-                if "AI-Powered Analysis" in text:
-                    # Remove this paragraph and potentially the next few
-                    paragraphs_to_check = min(i + 10, len(doc.paragraphs))
-                    for j in range(i, paragraphs_to_check):
-                        if j < len(doc.paragraphs):
-                            # Check if this is part of the AI analysis
-                            current_text = doc.paragraphs[j].text
-                            if any(pattern in current_text for pattern in unwanted_patterns):
-                                # Clear the paragraph
-                                doc.paragraphs[j].clear()
-                                removed_count += 1
-                                print(f"✅ Cleared paragraph {j} containing AI analysis")
-                    break
-
-    # Also check tables
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    text = paragraph.text
-                    for pattern in unwanted_patterns:
-                        if pattern in text:
-                            paragraph.clear()
-                            removed_count += 1
-                            print("✅ Cleared AI analysis from table cell")
-
+    removed_count = run_cleanup(doc, ["unwanted_ai_analysis"])["unwanted_ai_analysis"]
     print(f"✅ Removed {removed_count} AI analysis sections")
     return removed_count
 
+
 def find_remaining_industry_placeholders(doc):
     """Find any industry placeholders that weren't replaced"""
     industry_patterns = [
@@ -613,31 +1592,12 @@ def find_remaining_industry_placeholders(doc):
 
     remaining = []
 
-    # Check paragraphs
-    for i, paragraph in enumerate(doc.paragraphs):
+    # Check paragraphs, tables, headers and footers
+    for location, paragraph in scan_paragraphs(doc, "[["):
+        text = paragraph.text
         for pattern in industry_patterns:
-            if pattern in paragraph.text:
-                remaining.append((f"Paragraph {i}", pattern))
-
-    # Check tables
-    for table_idx, table in enumerate(doc.tables):
-        for row_idx, row in enumerate(table.rows):
-            for cell_idx, cell in enumerate(row.cells):
-                for para_idx, paragraph in enumerate(cell.paragraphs):
-                    for pattern in industry_patterns:
-                        if pattern in paragraph.text:
-                            remaining.append((f"Table {table_idx}, Cell {cell_idx}, Para {para_idx}", pattern))
-
-    return remaining
-
-    # Check tables
-    for table_idx, table in enumerate(doc.tables):
-        for row_idx, row in enumerate(table.rows):
-            for cell_idx, cell in enumerate(row.cells):
-                for para_idx, paragraph in enumerate(cell.paragraphs):
-                    for pattern in industry_patterns:
-                        if pattern in paragraph.text:
-                            remaining.append((f"Table {table_idx}, Cell {cell_idx}, Para {para_idx}", pattern))
+            if pattern in text:
+                remaining.append((f"Paragraph {location}" if isinstance(location, int) else location, pattern))
 
     return remaining
 
@@ -688,8 +1648,7 @@ def generate_report_thread(task_id, config):
         # Create report - Step 1
         update_progress(task_id, 20, "Loading template...")
         try:
-            doc = Document(template_path)
-            fix_executive_summary_headings(doc)
+            doc = template_registry.load(template_path)
         except Exception as e:
             doc = Document()
             doc.add_heading("Climate Risk Assessment Report", 0)
@@ -735,7 +1694,10 @@ def generate_report_thread(task_id, config):
         # Step 6-8: Formatting & AI Content
         update_progress(task_id, 60, "Generating AI narrative...")
         fix_adaptation_plan_section(doc)
-        integrate_bespoke_content_with_prompts(doc, json_data, form_prompts)
+        integrate_bespoke_content_with_prompts(
+            doc, json_data, form_prompts,
+            progress_callback=lambda done, total, message: update_progress(
+                task_id, 60 + 9 * done // max(total, 1), message))
         clean_executive_summary(doc)
         clean_executive_summary_duplicates(doc)
         quick_fix_executive_summary(doc)
@@ -818,8 +1780,17 @@ def get_progress(task_id):
     task = processing_tasks.get(task_id)
     if not task:
         return jsonify({'error': 'Task not found'}), 404
+    metrics = active_job_metrics.get(task_id)
+    if metrics:
+        task = dict(task, **metrics.snapshot())
     return jsonify(task)
 
+
+@app.route('/cache-stats')
+def get_cache_stats():
+    """Size, budget, evictions and per-source counts of the AI content cache"""
+    return jsonify(CONTENT_CACHE.stats())
+
 def allowed_file(filename):
 
     return "." in filename and filename.rsplit(".", 1)[1].lower() in {"json", "docx", "pdf", "png", "jpg", "jpeg",
@@ -875,12 +1846,13 @@ def process_prompt_images(request):
 
 def find_end_of_section_for_prompt_image(doc, heading_text):
     """Find where to insert image at the end of a section (right before next heading)"""
+    paragraphs = get_document_index(doc)
     print(f"🔍 Looking for end of section: '{heading_text}'")
 
     found_section = False
     start_index = -1
 
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         text = paragraph.text.strip()
 
         # Look for the heading
@@ -916,8 +1888,8 @@ def find_end_of_section_for_prompt_image(doc, heading_text):
 
     # If we reach the end of document, insert near the end
     if found_section:
-        print(f"📌 Reached end of document, inserting at {len(doc.paragraphs) - 1}")
-        return len(doc.paragraphs) - 1
+        print(f"📌 Reached end of document, inserting at {len(paragraphs) - 1}")
+        return len(paragraphs) - 1
 
     print(f"⚠️ Could not find section '{heading_text}'")
     return None
@@ -925,6 +1897,7 @@ def find_end_of_section_for_prompt_image(doc, heading_text):
 
 def insert_prompt_images_at_sections(doc, prompt_images, json_data):
     """Insert uploaded prompt images at the end of their respective sections"""
+    paragraphs = get_document_index(doc)
     if not prompt_images:
         print("ℹ️ No prompt images to insert")
         return 0
@@ -942,7 +1915,7 @@ def insert_prompt_images_at_sections(doc, prompt_images, json_data):
         for heading_text in possible_headings:
             # Look for paragraph with this text
             target_idx = -1
-            for idx, para in enumerate(doc.paragraphs):
+            for idx, para in enumerate(paragraphs):
                 if heading_text.lower() in para.text.lower():
                     target_idx = idx
                     break
@@ -964,7 +1937,7 @@ def insert_prompt_images_at_sections(doc, prompt_images, json_data):
         # Find the section in the document
         section_end_index = find_end_of_section_for_prompt_image(doc, heading_text)
 
-        if section_end_index is not None and section_end_index < len(doc.paragraphs):
+        if section_end_index is not None and section_end_index < len(paragraphs):
             try:
                 # Check if image file exists
                 image_path = image_data['path']
@@ -975,14 +1948,14 @@ def insert_prompt_images_at_sections(doc, prompt_images, json_data):
                 print(f"📌 Inserting image at paragraph {section_end_index}")
 
                 # Add spacing before image
-                spacing_para = doc.paragraphs[section_end_index].insert_paragraph_before()
+                spacing_para = paragraphs.insert_paragraph_before(section_end_index)
                 spacing_para.paragraph_format.space_before = Pt(12)
 
                 # Add image caption
                 client_name = json_data.get("client_name", "Client")
                 caption_text = f"Figure: Supporting visualization for {heading_text}"
 
-                caption_para = doc.paragraphs[section_end_index].insert_paragraph_before(caption_text)
+                caption_para = paragraphs.insert_paragraph_before(section_end_index, caption_text)
                 caption_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 caption_para.style = "Caption"
                 if caption_para.runs:
@@ -990,7 +1963,7 @@ def insert_prompt_images_at_sections(doc, prompt_images, json_data):
                     caption_para.runs[0].font.size = Pt(9)
 
                 # Insert the image
-                image_para = doc.paragraphs[section_end_index].insert_paragraph_before()
+                image_para = paragraphs.insert_paragraph_before(section_end_index)
                 image_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
                 run = image_para.add_run()
@@ -1005,7 +1978,7 @@ def insert_prompt_images_at_sections(doc, prompt_images, json_data):
                     image_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
                 # Add spacing after image
-                spacing_after = doc.paragraphs[section_end_index].insert_paragraph_before()
+                spacing_after = paragraphs.insert_paragraph_before(section_end_index)
                 spacing_after.paragraph_format.space_after = Pt(12)
 
                 images_placed += 1
@@ -1053,8 +2026,9 @@ def find_end_of_toc_section(doc):
 
 def find_section_in_content(doc, heading_text, start_index):
     """Find a section heading in the actual content (not TOC)"""
-    for i in range(start_index, len(doc.paragraphs)):
-        paragraph = doc.paragraphs[i]
+    paragraphs = get_document_index(doc)
+    for i in range(start_index, len(paragraphs)):
+        paragraph = paragraphs[i]
         text = paragraph.text.strip()
 
         # Check for exact or close match
@@ -1069,8 +2043,8 @@ def find_section_in_content(doc, heading_text, start_index):
                 # Verify this is not in TOC by checking context
                 # Look at nearby paragraphs for TOC indicators
                 is_toc = False
-                for j in range(max(0, i - 3), min(len(doc.paragraphs), i + 3)):
-                    if any(keyword in doc.paragraphs[j].text for keyword in
+                for j in range(max(0, i - 3), min(len(paragraphs), i + 3)):
+                    if any(keyword in paragraphs[j].text for keyword in
                            ["Table of Contents", "List of Figures", "List of Tables", "Page", "..."]):
                         is_toc = True
                         break
@@ -1085,6 +2059,7 @@ def find_section_in_content(doc, heading_text, start_index):
 
 def insert_image_at_section_end(doc, section_index, image_data, json_data):
     """Insert an image at the end of a content section"""
+    paragraphs = get_document_index(doc)
     try:
         image_path = image_data['path']
         if not os.path.exists(image_path):
@@ -1101,13 +2076,13 @@ def insert_image_at_section_end(doc, section_index, image_data, json_data):
         print(f"📌 Inserting image at end of section (paragraph {section_end_index})")
 
         # Add spacing before image
-        spacing_para = doc.paragraphs[section_end_index].insert_paragraph_before()
+        spacing_para = paragraphs.insert_paragraph_before(section_end_index)
         spacing_para.paragraph_format.space_before = Pt(12)
 
         # Add image caption
         caption_text = f"Figure: Supporting visualization for this section"
 
-        caption_para = doc.paragraphs[section_end_index].insert_paragraph_before(caption_text)
+        caption_para = paragraphs.insert_paragraph_before(section_end_index, caption_text)
         caption_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
         caption_para.style = "Caption"
         if caption_para.runs:
@@ -1115,7 +2090,7 @@ def insert_image_at_section_end(doc, section_index, image_data, json_data):
             caption_para.runs[0].font.size = Pt(9)
 
         # Insert the image
-        image_para = doc.paragraphs[section_end_index].insert_paragraph_before()
+        image_para = paragraphs.insert_paragraph_before(section_end_index)
         image_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
         run = image_para.add_run()
@@ -1130,7 +2105,7 @@ def insert_image_at_section_end(doc, section_index, image_data, json_data):
             image_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
         # Add spacing after image
-        spacing_after = doc.paragraphs[section_end_index].insert_paragraph_before()
+        spacing_after = paragraphs.insert_paragraph_before(section_end_index)
         spacing_after.paragraph_format.space_after = Pt(12)
 
         return True
@@ -1144,38 +2119,31 @@ def insert_image_at_section_end(doc, section_index, image_data, json_data):
 
 def find_end_of_section_from_index(doc, start_index):
     """Find where a section ends starting from a specific index"""
-    if start_index >= len(doc.paragraphs) - 1:
-        return len(doc.paragraphs) - 1
+    index = get_document_index(doc)
+    if start_index >= len(index) - 1:
+        return len(index) - 1
 
     # Get the heading level if possible
-    heading_level = 1
-    heading_paragraph = doc.paragraphs[start_index]
-    if heading_paragraph.style.name.startswith('Heading'):
-        try:
-            heading_level = int(heading_paragraph.style.name.replace('Heading ', ''))
-        except:
-            heading_level = 1
+    heading_level = index.heading_level(start_index) or 1
 
     # Start searching from after the heading
-    for i in range(start_index + 1, len(doc.paragraphs)):
-        current_para = doc.paragraphs[i]
-        current_text = current_para.text.strip()
+    for i in range(start_index + 1, len(index)):
+        current_text = index.text(i).strip()
 
         # Skip empty paragraphs
         if not current_text:
             continue
 
         # Check if we've reached another heading
-        if current_para.style.name.startswith('Heading'):
-            try:
-                current_level = int(current_para.style.name.replace('Heading ', ''))
-                # If this is a heading of same or higher level, we've reached end of section
-                if current_level <= heading_level:
-                    return i
-            except:
-                # If can't determine level, check if it looks like a new section
-                if len(current_text.split()) <= 8 and current_text[0].isupper():
-                    return i
+        current_level = index.heading_level(i)
+        if current_level:
+            # If this is a heading of same or higher level, we've reached end of section
+            if current_level <= heading_level:
+                return i
+        elif current_level == 0:
+            # If can't determine level, check if it looks like a new section
+            if len(current_text.split()) <= 8 and current_text[0].isupper():
+                return i
 
         # Check for obvious section boundaries
         section_boundaries = [
@@ -1188,11 +2156,12 @@ def find_end_of_section_from_index(doc, start_index):
                 return i
 
     # If we reach the end of document
-    return len(doc.paragraphs) - 1
+    return len(index) - 1
 
 
 def insert_prompt_images_at_sections_skip_toc(doc, prompt_images, json_data):
     """Fallback method for inserting prompt images that skips TOC sections"""
+    paragraphs = get_document_index(doc)
     print("🔄 Using fallback method to insert prompt images (skipping TOC)...")
 
     # Updated section headings that should be in content
@@ -1208,7 +2177,7 @@ def insert_prompt_images_at_sections_skip_toc(doc, prompt_images, json_data):
             # (Note: keeping the rest of the original logic for insertion)
             # Find the heading index
             target_idx = -1
-            for idx, para in enumerate(doc.paragraphs):
+            for idx, para in enumerate(paragraphs):
                 if heading_text.lower() in para.text.lower():
                     target_idx = idx
                     break
@@ -1219,7 +2188,7 @@ def insert_prompt_images_at_sections_skip_toc(doc, prompt_images, json_data):
                     images_placed += 1
                     break # Move to next image
                 except: pass
-        for i, paragraph in enumerate(doc.paragraphs):
+        for i, paragraph in enumerate(paragraphs):
             text = paragraph.text.strip()
 
             if heading_text.lower() in text.lower():
@@ -1227,8 +2196,8 @@ def insert_prompt_images_at_sections_skip_toc(doc, prompt_images, json_data):
                 is_in_toc = False
 
                 # Check nearby paragraphs for TOC indicators
-                for j in range(max(0, i - 5), min(len(doc.paragraphs), i + 5)):
-                    nearby_text = doc.paragraphs[j].text
+                for j in range(max(0, i - 5), min(len(paragraphs), i + 5)):
+                    nearby_text = paragraphs[j].text
                     if any(indicator in nearby_text for indicator in
                            ["Table of Contents", "List of Figures", "List of Tables", "...", "Page"]):
                         is_in_toc = True
@@ -1252,12 +2221,13 @@ def insert_prompt_images_at_sections_skip_toc(doc, prompt_images, json_data):
 
 def fix_adaptation_plan_section(doc):
     """Fix the 9.1.1 Itemised adaptation plan section with proper table formatting"""
+    paragraphs = get_document_index(doc)
     print("🔧 Fixing adaptation plan section formatting...")
 
     # Look for the specific section
     target_phrase = "Figure 7 below summarises the Adaptation Plan's activities and phased implementation"
 
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         if target_phrase in paragraph.text:
             print(f"✅ Found adaptation plan section at paragraph {i}")
 
@@ -1266,8 +2236,8 @@ def fix_adaptation_plan_section(doc):
             current_idx = i
 
             # Collect all paragraphs until we find the end of this section
-            while current_idx < len(doc.paragraphs):
-                current_para = doc.paragraphs[current_idx]
+            while current_idx < len(paragraphs):
+                current_para = paragraphs[current_idx]
                 text = current_para.text.strip()
 
                 if "followed by a more detailed breakdown of the activities in Table 3 below" in text:
@@ -1282,19 +2252,19 @@ def fix_adaptation_plan_section(doc):
             if len(full_content) >= 2:
                 # Clear the original paragraphs
                 for j in range(i, current_idx + 1):
-                    if j < len(doc.paragraphs):
-                        doc.paragraphs[j].clear()
+                    if j < len(paragraphs):
+                        paragraphs[j].clear()
 
                 # Add the main text paragraph
                 main_text = "Figure 7 below summarises the Adaptation Plan's activities and phased implementation, drawing on the expertise of the East Hill Farm team and its specialist advisors. It is followed by a more detailed breakdown of the activities in Table 3 below."
-                main_para = doc.paragraphs[i]
+                main_para = paragraphs[i]
                 main_para.text = main_text
 
                 # Add spacing
-                doc.paragraphs[i].insert_paragraph_before()
+                paragraphs.insert_paragraph_before(i)
 
                 # Add the Key table heading
-                key_heading = doc.paragraphs[i + 1].insert_paragraph_before("Key")
+                key_heading = paragraphs.insert_paragraph_before(i + 1, "Key")
                 key_heading.runs[0].bold = True
 
                 # Create the proper 2-column table
@@ -1330,11 +2300,11 @@ def fix_adaptation_plan_section(doc):
                             paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
 
                 # Add spacing after table
-                doc.paragraphs[i + 2].insert_paragraph_before()
-                doc.paragraphs[i + 2].insert_paragraph_before()
+                paragraphs.insert_paragraph_before(i + 2)
+                paragraphs.insert_paragraph_before(i + 2)
 
                 # Add RAPA heading
-                rapa_heading = doc.paragraphs[i + 3].insert_paragraph_before(
+                rapa_heading = paragraphs.insert_paragraph_before(i + 3,
                     "Rapid Adaptation Pathways Assessment (RAPA)")
                 rapa_heading.runs[0].bold = True
                 rapa_heading.runs[0].font.size = Pt(12)
@@ -1787,14 +2757,20 @@ def find_figure_placeholders_in_doc(doc):
         "[[Figure 7]]"
     ]
 
-    found_placeholders = {}
+    found_at = {}
+
+    # One scan of the candidate paragraphs, first occurrence of each placeholder wins
+    for i, paragraph in scan_paragraphs(doc, "[[Figure", tables=False, headers=False):
+        text = paragraph.text
+        for placeholder in possible_placeholders:
+            if placeholder not in found_at and placeholder in text:
+                found_at[placeholder] = i
 
+    found_placeholders = {}
     for placeholder in possible_placeholders:
-        for i, paragraph in enumerate(doc.paragraphs):
-            if placeholder in paragraph.text:
-                found_placeholders[placeholder] = i
-                print(f"✅ Found: '{placeholder}' at paragraph {i}")
-                break
+        if placeholder in found_at:
+            found_placeholders[placeholder] = found_at[placeholder]
+            print(f"✅ Found: '{placeholder}' at paragraph {found_at[placeholder]}")
 
     print(f"📋 ACTUAL FIGURE PLACEHOLDERS FOUND: {list(found_placeholders.keys())}")
     return found_placeholders
@@ -2043,34 +3019,26 @@ def fix_executive_summary_headings(doc):
 
     return True
 
+UNUSED_FIGURE_PLACEHOLDERS = [
+    "[[Figure-1_Change-in-Hot-Summer-Days.png]]",
+    "[[Figure-1]]",
+    "[[Table 5: East Higher Dairy maritime development Climate Adaptive Capacity Development Actions by Implementation Phase]]",
+    'Figure 2: Change in "tropical nights" (over 20ºC) for Republic of Fiji (Source Met Office Local Authority Climate Service 2025)',
+    "[[Figure-2_Change-in-tropical-nights.png]]",
+    "[[Figure-2_Climate-Records-Nov-2025_Met-Fiji]]",
+    "[[Figure-3_Changing-flood-risk.png]]",
+    "[[Figure-4_Changing-drought-wind-and-subsidence-risks.png]]",
+    "[[Figure-5_Components-of-climate-change-vulnerability.png]]",
+    "[[Figure-6_Current-and-target-capabilities.png]]",
+    "[[Figure-7_Adaptation-Plan-activities-and-phased-implementation-pathways.png]]"
+]
+
+
 def remove_figure_placeholders_only_after_processing(doc):
     """Remove ONLY figure placeholders that weren't replaced (run this after all processing)"""
     print("🗑️ Cleaning up unused figure placeholders...")
 
-    figure_placeholders = [
-        "[[Figure-1_Change-in-Hot-Summer-Days.png]]",
-        "[[Figure-1]]",
-        "[[Table 5: East Higher Dairy maritime development Climate Adaptive Capacity Development Actions by Implementation Phase]]",
-        'Figure 2: Change in "tropical nights" (over 20ºC) for Republic of Fiji (Source Met Office Local Authority Climate Service 2025)',
-        "[[Figure-2_Change-in-tropical-nights.png]]",
-        "[[Figure-2_Climate-Records-Nov-2025_Met-Fiji]]",
-        "[[Figure-3_Changing-flood-risk.png]]",
-        "[[Figure-4_Changing-drought-wind-and-subsidence-risks.png]]",
-        "[[Figure-5_Components-of-climate-change-vulnerability.png]]",
-        "[[Figure-6_Current-and-target-capabilities.png]]",
-        "[[Figure-7_Adaptation-Plan-activities-and-phased-implementation-pathways.png]]"
-    ]
-
-    removed_count = 0
-
-    for paragraph in doc.paragraphs:
-        for placeholder in figure_placeholders:
-            if placeholder in paragraph.text:
-                # Only remove if it's a standalone placeholder (not part of actual content)
-                if paragraph.text.strip() == placeholder:
-                    paragraph.text = ""
-                    removed_count += 1
-                    print(f"✅ Removed unused figure placeholder: {placeholder}")
+    removed_count = run_cleanup(doc, ["unused_figure_placeholders"])["unused_figure_placeholders"]
 
     print(f"🗑️ Removed {removed_count} unused figure placeholders")
     return removed_count
@@ -2162,6 +3130,7 @@ def verify_custom_sections_placement(doc):
 
 def insert_custom_sections(doc, custom_sections, json_data):
     """Insert custom sections into the document AFTER Conclusion and Next Steps (Section 11)"""
+    paragraphs = get_document_index(doc)
     if not custom_sections:
         print("ℹ️ No custom sections to insert")
         return False
@@ -2171,7 +3140,7 @@ def insert_custom_sections(doc, custom_sections, json_data):
     target_heading = "Conclusion and Next Steps"
     conclusion_index = -1
 
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         text = paragraph.text.strip()
 
         # Look for the exact heading "Conclusion and Next Steps"
@@ -2190,7 +3159,7 @@ def insert_custom_sections(doc, custom_sections, json_data):
 
     if conclusion_index == -1:
         # Try to find any conclusion-like text
-        for i, paragraph in enumerate(doc.paragraphs):
+        for i, paragraph in enumerate(paragraphs):
             text = paragraph.text.strip()
             if "Conclusion" in text and "Next Steps" in text and len(text) < 100:
                 conclusion_index = i
@@ -2205,7 +3174,7 @@ def insert_custom_sections(doc, custom_sections, json_data):
     conclusion_end_index = find_end_of_section_from_index(doc, conclusion_index)
 
     if conclusion_end_index is None or conclusion_end_index <= conclusion_index:
-        conclusion_end_index = min(conclusion_index + 20, len(doc.paragraphs) - 1)
+        conclusion_end_index = min(conclusion_index + 20, len(paragraphs) - 1)
 
     print(f"📍 Conclusion section ends at paragraph {conclusion_end_index}")
 
@@ -2214,14 +3183,14 @@ def insert_custom_sections(doc, custom_sections, json_data):
     clean_insertion_point = conclusion_end_index
 
     # If the paragraph at insertion point has content, insert an empty paragraph first
-    if clean_insertion_point < len(doc.paragraphs) and doc.paragraphs[clean_insertion_point].text.strip():
+    if clean_insertion_point < len(paragraphs) and paragraphs[clean_insertion_point].text.strip():
         # Insert an empty paragraph to create clean insertion point
-        doc.paragraphs[clean_insertion_point].insert_paragraph_before("")
+        paragraphs.insert_paragraph_before(clean_insertion_point, "")
         clean_insertion_point += 1  # Adjust insertion point
 
     # Now insert page break before this clean paragraph
-    if clean_insertion_point < len(doc.paragraphs):
-        page_break_para = doc.paragraphs[clean_insertion_point].insert_paragraph_before()
+    if clean_insertion_point < len(paragraphs):
+        page_break_para = paragraphs.insert_paragraph_before(clean_insertion_point)
         page_break_run = page_break_para.add_run()
         page_break_run.add_break(WD_BREAK.PAGE)
         print("📄 Added page break before custom sections")
@@ -2247,19 +3216,20 @@ def insert_custom_sections(doc, custom_sections, json_data):
 
             print(f"📝 Adding custom section {heading_number}: {section['title'][:30]}...")
 
-            # Get the current insertion point
+            # Get the current insertion point (the previous section was written through proxies)
             current_insertion = clean_insertion_point + (section_idx * 10)
+            paragraphs = get_document_index(doc)
 
             # Make sure we have a valid insertion point
-            if current_insertion >= len(doc.paragraphs):
+            if current_insertion >= len(paragraphs):
                 # Add paragraphs at the end
-                while len(doc.paragraphs) <= current_insertion:
-                    doc.add_paragraph("")
-                current_insertion = len(doc.paragraphs) - 1
+                while len(paragraphs) <= current_insertion:
+                    paragraphs.add_paragraph("")
+                current_insertion = len(paragraphs) - 1
 
             # ===== STEP 1: CREATE AN EMPTY PARAGRAPH AS ANCHOR =====
             # First create an empty paragraph at the insertion point
-            anchor_para = doc.paragraphs[current_insertion].insert_paragraph_before("")
+            anchor_para = paragraphs.insert_paragraph_before(current_insertion, "")
 
             # ===== STEP 2: ADD HEADING (FIRST) =====
             # Add spacing before heading (24pt for first section, 18pt for others)
@@ -2781,75 +3751,98 @@ def save_uploaded_file(storage, dest_folder):
     return path
 
 
-def replace_placeholders(doc, replacements):
-    """Replace text placeholders in the document while preserving formatting"""
-    print(f"🔄 Starting placeholder replacement for {len(replacements)} placeholders...")
+class PlaceholderMatcher:
+    """All replacement keys compiled into one alternation, longest key first.
 
-    # Track which placeholders were found and replaced
-    found_placeholders = set()
+    Each text is scanned once and every key is substituted in the same pass, so
+    cost no longer grows with the number of keys. Substituted values are not
+    rescanned. hits counts occurrences per key across every text handed to sub().
+    """
 
-    # Method 1: Direct paragraph text replacement
-    for paragraph in doc.paragraphs:
-        original_text = paragraph.text
-        if original_text:
-            new_text = original_text
-            for key, value in replacements.items():
-                if key in original_text:
-                    found_placeholders.add(key)
-                    print(f"📝 Replacing '{key}' with '{value[:50]}...'")
-                    new_text = new_text.replace(key, str(value))
-            if new_text != original_text:
-                paragraph.text = new_text
+    def __init__(self, replacements, skip_empty=False):
+        self.replacements = {}
+        for key, value in replacements.items():
+            if not key or (skip_empty and not value):
+                continue
+            self.replacements[key] = str(value)
+        keys = sorted(self.replacements, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(key) for key in keys)) if keys else None
+        self.hits = Counter()
+
+    def replace_match(self, match):
+        key = match.group(0)
+        self.hits[key] += 1
+        return self.replacements[key]
+
+    def sub(self, text):
+        if not text or self.pattern is None:
+            return text
+        return self.pattern.sub(self.replace_match, text)
+
+    def missing(self):
+        return set(self.replacements) - set(self.hits)
 
-    # Method 2: Table replacement
+
+def iter_text_paragraphs(doc):
+    """Yield every body, table cell, header and footer paragraph exactly once.
+
+    Merged cells repeat in row.cells and linked headers/footers resolve to the
+    previous section's part, so containers are de-duplicated by element.
+    """
+    for paragraph in get_document_index(doc):
+        yield paragraph
+
+    seen = set()
     for table in doc.tables:
         for row in table.rows:
             for cell in row.cells:
+                if cell._tc in seen:
+                    continue
+                seen.add(cell._tc)
                 for paragraph in cell.paragraphs:
-                    original_text = paragraph.text
-                    if original_text:
-                        new_text = original_text
-                        for key, value in replacements.items():
-                            if key in original_text:
-                                found_placeholders.add(key)
-                                new_text = new_text.replace(key, str(value))
-                        if new_text != original_text:
-                            paragraph.text = new_text
+                    yield paragraph
 
-    # Method 3: Header and footer replacement
     for section in doc.sections:
-        # Header
-        if section.header:
-            for paragraph in section.header.paragraphs:
-                original_text = paragraph.text
-                if original_text:
-                    new_text = original_text
-                    for key, value in replacements.items():
-                        if key in original_text:
-                            found_placeholders.add(key)
-                            new_text = new_text.replace(key, str(value))
-                    if new_text != original_text:
-                        paragraph.text = new_text
-
-        # Footer
-        if section.footer:
-            for paragraph in section.footer.paragraphs:
-                original_text = paragraph.text
-                if original_text:
-                    new_text = original_text
-                    for key, value in replacements.items():
-                        if key in original_text:
-                            found_placeholders.add(key)
-                            new_text = new_text.replace(key, str(value))
-                    if new_text != original_text:
-                        paragraph.text = new_text
+        for part in (section.header, section.footer):
+            if not part or part._element in seen:
+                continue
+            seen.add(part._element)
+            for paragraph in part.paragraphs:
+                yield paragraph
+
+
+def replace_placeholders_in_document(doc, replacements, skip_empty=False):
+    """Single pass over every text container; returns the matcher with its hit report"""
+    matcher = PlaceholderMatcher(replacements, skip_empty=skip_empty)
+    if matcher.pattern is None:
+        return matcher
+
+    for paragraph in iter_text_paragraphs(doc):
+        original_text = paragraph.text
+        if original_text:
+            new_text = matcher.sub(original_text)
+            if new_text != original_text:
+                paragraph.text = new_text
+
+    return matcher
+
+
+def replace_placeholders(doc, replacements):
+    """Replace text placeholders in the document while preserving formatting"""
+    print(f"🔄 Starting placeholder replacement for {len(replacements)} placeholders...")
+
+    matcher = replace_placeholders_in_document(doc, replacements)
+    for key, count in matcher.hits.items():
+        print(f"📝 Replaced '{key}' x{count} with '{matcher.replacements[key][:50]}...'")
 
     # Log which placeholders weren't found
-    missing_placeholders = set(replacements.keys()) - found_placeholders
+    missing_placeholders = matcher.missing()
     if missing_placeholders:
         print(f"⚠️ These placeholders were NOT found in document: {missing_placeholders}")
 
-    print(f"✅ Placeholder replacement completed. Found and replaced {len(found_placeholders)} placeholders")
+    print(f"✅ Placeholder replacement completed. Found and replaced {len(matcher.hits)} placeholders")
+    return matcher.hits
+
 
 def remove_specific_placeholders(doc):
     """Remove ALL placeholders with EXACT matching"""
@@ -3248,6 +4241,15 @@ def insert_mural_content_into_document(doc):
     return table1_placed or table2_placed
 
 
+def mural_table_1_cell_format(row_idx, col_idx, row):
+    """Mural Table 1: merged bold title row, bold column headers, spaced content cells"""
+    if row_idx == 0:
+        return {"span": 3, "bold": True, "size": 11, "align": "center"}
+    if row_idx == 1:
+        return {"bold": True, "align": "center"}
+    return {"space_after": Pt(6)}
+
+
 def create_mural_table_1_at_paragraph(doc, paragraph_index, table1_data):
     """Create Table 1 at a specific paragraph location"""
     print("📊 Creating Table 1 at paragraph location")
@@ -3264,64 +4266,15 @@ def create_mural_table_1_at_paragraph(doc, paragraph_index, table1_data):
     columns = table1_data['columns']
     max_rows = max(len(col['content']) for col in columns)
 
-    # Create table: +2 for header row and title row
-    table = doc.add_table(rows=max_rows + 2, cols=3)
-
-    # Set table alignment
-    table.alignment = WD_TABLE_ALIGNMENT.CENTER
-
-    # Set column widths (equal width for 3 columns)
-    for col in table.columns:
-        col.width = Inches(2.5)
-
-    # Add main header (merged across all columns)
-    main_header = table.cell(0, 0)
-    main_header.merge(table.cell(0, 2))
-    main_header.text = table1_data.get('title', 'Risks from climate change')
-
-    # Format main header
-    for paragraph in main_header.paragraphs:
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        for run in paragraph.runs:
-            run.bold = True
-            run.font.size = Pt(11)
-
-    # Add column headers
-    for col_idx, column in enumerate(columns):
-        cell = table.cell(1, col_idx)
-        cell.text = column['header']
-
-        # Format column header
-        for paragraph in cell.paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            for run in paragraph.runs:
-                run.bold = True
-                run.font.size = Pt(10)
-
-
-
-    # Add content rows
+    # Rows: main header (merged across all columns), column headers, then numbered content
+    rows = [[table1_data.get('title', 'Risks from climate change'), "", ""],
+            [column['header'] for column in columns]]
     for row_idx in range(max_rows):
-        for col_idx, column in enumerate(columns):
-            cell = table.cell(row_idx + 2, col_idx)
-            if row_idx < len(column['content']):
-                content = column['content'][row_idx]
-                cell.text = f"{row_idx + 1}. {content}"
-
-            # Format cell
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                paragraph.paragraph_format.space_after = Pt(6)
-                for run in paragraph.runs:
-                    run.font.size = Pt(10)
-
-    # Apply table borders
-    apply_table_borders(table)
+        rows.append([f"{row_idx + 1}. {column['content'][row_idx]}" if row_idx < len(column['content']) else ""
+                     for column in columns])
 
-    # Position the table after the title
-    table_element = table._element
-    title_element = title_para._element
-    title_element.addnext(table_element)
+    # Build the table (centred, equal width for 3 columns) and position it after the title
+    splice_table(title_para, rows, MURAL_TABLE_1_STYLE)
 
     # Remove the original placeholder paragraph
     target_para._element.getparent().remove(target_para._element)
@@ -3438,16 +4391,17 @@ def read_structured_mural_content(filename="mural_content_for_report.json"):
 
 def find_or_create_appendix_3(doc):
     """Find or create Appendix 3 section in document"""
+    paragraphs = get_document_index(doc)
     # First, try to find Appendix 3
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         text = paragraph.text.lower()
         if 'appendix 3' in text or 'client inputs' in text:
             print(f"✅ Found Appendix 3 at paragraph {i}")
             return i
 
     # If not found, look for a good place to insert it (usually after other appendices or before references)
-    insert_point = len(doc.paragraphs) - 1
-    for i, paragraph in enumerate(doc.paragraphs):
+    insert_point = len(paragraphs) - 1
+    for i, paragraph in enumerate(paragraphs):
         text = paragraph.text.lower()
         if 'appendix' in text or 'reference' in text or 'bibliography' in text:
             insert_point = i
@@ -3456,10 +4410,10 @@ def find_or_create_appendix_3(doc):
     print(f"📌 Creating new Appendix 3 at paragraph {insert_point}")
 
     # Add page break
-    doc.paragraphs[insert_point].insert_paragraph_before().add_run().add_break(WD_BREAK.PAGE)
+    paragraphs.insert_paragraph_before(insert_point).add_run().add_break(WD_BREAK.PAGE)
 
     # Add Appendix 3 heading
-    heading = doc.paragraphs[insert_point].insert_paragraph_before("Appendix 3: Client Inputs from Mural Workshop")
+    heading = paragraphs.insert_paragraph_before(insert_point, "Appendix 3: Client Inputs from Mural Workshop")
     heading.style = "Heading 2"
 
     return insert_point + 1
@@ -3477,6 +4431,265 @@ def get_color_rgb(color_name):
     return colors.get(color_name, RGBColor(0, 0, 0))  # Default to black
 
 
+# ---------------- TABLE BUILDER ----------------
+# Tables are emitted as one w:tbl XML string and parsed once, instead of add_table() followed by
+# table.cell(r, c) / paragraph.clear() / add_run() for every cell. Borders, cell padding and the
+# header row look live in a named table style registered once in styles.xml; cells only carry
+# what differs from it.
+INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+RUN_CONTROL_CHARS = re.compile(r"(\t|\r\n|\n|\r)")
+TABLE_ALIGNMENTS = {"left": "left", "center": "center", "right": "right", "justify": "both"}
+TABLE_STREAM_CHUNK_ROWS = 200  # Rows turned into XML and parsed per step by stream_table
+SHEET_TABLE_SPLIT_ROWS = 1000  # Long sheet tables continue in a new table (header repeated) after this many rows
+
+
+class TableStyle:
+    """Layout and formatting for build_table_xml, registered in styles.xml as the table style name.
+
+    widths holds one python-docx Length per column and fixes the column count; rows are padded
+    or cut to fit. Row 0 takes the header_* settings when header=True. align may be one value or
+    one per column. cell_format(row_idx, col_idx, row) may return a dict overriding bold, size,
+    color, fill, align, indent, space_after, span (columns merged to the right) or lines
+    ([(text, bold), ...] joined by line breaks) for a single cell.
+
+    Font, size, bold, color and alignment stay on every run / paragraph: a template's Normal
+    paragraph style outranks table style formatting for them. Borders, cell margins and shading
+    live only in the table style.
+    """
+
+    def __init__(self, name, widths, border_size=2, margin=40, font="Calibri", size=10, bold=False,
+                 color=None, fill=None, align="left", space_after=None, header=True, header_size=None,
+                 header_bold=True, header_color=None, header_fill=None, header_align=None,
+                 alignment=None, cell_format=None):
+        self.name = name
+        self.style_id = re.sub(r"[^A-Za-z0-9]", "", name)
+        self.widths = [length_twips(width) for width in widths]
+        self.border_size = border_size
+        self.margin = margin
+        self.font = font
+        self.header = header
+        self.alignment = alignment
+        self.cell_format = cell_format
+        self.body = {"bold": bold, "size": size, "color": color, "fill": fill, "align": align,
+                     "indent": None, "space_after": space_after}
+        self.head = dict(self.body, bold=header_bold, size=header_size or size,
+                         color=header_color or color, fill=header_fill or fill,
+                         align=header_align or align)
+
+
+def length_twips(length):
+    """A python-docx Length (EMU) in twentieths of a point"""
+    return round(int(length) / 635)
+
+
+def even_table_widths(num_cols, total=Inches(6.0)):
+    """num_cols equal column widths filling total"""
+    return [total // num_cols] * num_cols
+
+
+def hex_color(value):
+    """Color as ST_HexColor (no leading #)"""
+    return value.lstrip("#")
+
+
+def style_props_xml(props):
+    """(w:rPr, w:tcPr) for the bold, color and fill a table style (or one of its rows) sets.
+
+    They are returned apart because CT_Style and CT_TblStylePr both need w:tblPr / w:trPr
+    between them.
+    """
+    rpr = ("<w:b/>" if props["bold"] else "") + \
+          (f'<w:color w:val="{hex_color(props["color"])}"/>' if props["color"] else "")
+    tcpr = f'<w:shd w:val="clear" w:color="auto" w:fill="{hex_color(props["fill"])}"/>' if props["fill"] else ""
+    return (f"<w:rPr>{rpr}</w:rPr>" if rpr else ""), (f"<w:tcPr>{tcpr}</w:tcPr>" if tcpr else "")
+
+
+def table_style_xml(style):
+    """w:style element for style: borders, cell padding, body and conditional header-row formatting"""
+    border = style.border_size
+    borders = "".join(f'<w:{edge} w:val="single" w:sz="{border}" w:space="0" w:color="000000"/>'
+                      for edge in ("top", "left", "bottom", "right", "insideH", "insideV"))
+    margin = style.margin
+    cell_margins = "" if margin is None else (
+        f'<w:tblCellMar><w:top w:w="{margin}" w:type="dxa"/><w:left w:w="{margin}" w:type="dxa"/>'
+        f'<w:bottom w:w="{margin}" w:type="dxa"/><w:right w:w="{margin}" w:type="dxa"/></w:tblCellMar>')
+    header = ""
+    if style.header:
+        head_rpr, head_tcpr = style_props_xml(style.head)
+        header = f'<w:tblStylePr w:type="firstRow">{head_rpr}{head_tcpr}</w:tblStylePr>'
+    # CT_Style child order: pPr, rPr, tblPr, trPr, tcPr, tblStylePr
+    body_rpr, body_tcpr = style_props_xml(style.body)
+    return (f'<w:style {nsdecls("w")} w:type="table" w:customStyle="1" w:styleId="{style.style_id}">'
+            f'<w:name w:val="{style.name}"/><w:basedOn w:val="TableNormal"/><w:uiPriority w:val="99"/>'
+            f'{body_rpr}<w:tblPr><w:tblBorders>{borders}</w:tblBorders>{cell_margins}</w:tblPr>'
+            f'{body_tcpr}{header}</w:style>')
+
+
+def register_table_style(part, style):
+    """Add style to the styles.xml of the document owning part, once"""
+    styles = part.styles.element
+    if not styles.xpath(f'w:style[@w:styleId="{style.style_id}"]'):
+        styles.append(parse_xml(table_style_xml(style)))
+
+
+def table_run_xml(text, rpr):
+    """w:r for text, with tabs and line breaks as w:tab / w:br like Run.text does"""
+    parts = []
+    for piece in RUN_CONTROL_CHARS.split(INVALID_XML_CHARS.sub("", text)):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\n", "\r", "\r\n"):
+            parts.append("<w:br/>")
+        elif piece:
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+    return f"<w:r>{rpr}{''.join(parts)}</w:r>"
+
+
+def table_cell_xml(text, props, inherited, width, font):
+    """w:tc for one cell; fill is only written where it differs from inherited (the table style's)"""
+    tc_pr = [f'<w:tcW w:w="{width}" w:type="dxa"/>']
+    if props.get("span", 1) > 1:
+        tc_pr.append(f'<w:gridSpan w:val="{props["span"]}"/>')
+    if props["fill"] and props["fill"] != inherited["fill"]:
+        tc_pr.append(f'<w:shd w:val="clear" w:color="auto" w:fill="{hex_color(props["fill"])}"/>')
+
+    p_pr = []
+    if props["space_after"] is not None:
+        p_pr.append(f'<w:spacing w:after="{length_twips(props["space_after"])}"/>')
+    if props["indent"] is not None:
+        p_pr.append(f'<w:ind w:left="{length_twips(props["indent"])}"/>')
+    if props["align"]:
+        p_pr.append(f'<w:jc w:val="{TABLE_ALIGNMENTS[props["align"]]}"/>')
+
+    def rpr(bold):
+        fonts = f'<w:rFonts w:ascii="{font}" w:hAnsi="{font}"/>' if font else ""
+        weight = ""
+        if bold:
+            weight = "<w:b/>"
+        elif bold is not None and inherited["bold"]:
+            weight = '<w:b w:val="0"/>'
+        color = f'<w:color w:val="{hex_color(props["color"])}"/>' if props["color"] else ""
+        size = f'<w:sz w:val="{props["size"] * 2}"/>' if props["size"] else ""
+        return f"<w:rPr>{fonts}{weight}{color}{size}</w:rPr>"
+
+    lines = props.get("lines") or ([(text, props["bold"])] if text else [])
+    runs = "<w:r><w:br/></w:r>".join(table_run_xml(line, rpr(bold)) for line, bold in lines)
+    return f"<w:tc><w:tcPr>{''.join(tc_pr)}</w:tcPr><w:p><w:pPr>{''.join(p_pr)}</w:pPr>{runs}</w:p></w:tc>"
+
+
+def table_open_xml(style):
+    """Opening w:tbl tag, table properties and column grid for style (no rows, not closed)"""
+    jc = f'<w:jc w:val="{style.alignment}"/>' if style.alignment else ""
+    first_row = "1" if style.header else "0"
+    grid = "".join(f'<w:gridCol w:w="{width}"/>' for width in style.widths)
+    return (f'<w:tbl {nsdecls("w")}><w:tblPr><w:tblStyle w:val="{style.style_id}"/>'
+            f'<w:tblW w:w="0" w:type="auto"/>{jc}<w:tblLayout w:type="fixed"/>'
+            f'<w:tblLook w:val="04A0" w:firstRow="{first_row}" w:lastRow="0" w:firstColumn="0" w:lastColumn="0"'
+            f' w:noHBand="1" w:noVBand="1"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>')
+
+
+def table_row_xml(row_idx, row, style, repeat_header=False):
+    """w:tr for one row; None becomes "" and other values are shown as str().
+
+    With repeat_header the header row is marked to repeat at the top of every page.
+    """
+    widths = style.widths
+    num_cols = len(widths)
+    row = (["" if value is None else str(value) for value in row] + [""] * num_cols)[:num_cols]
+    is_header = row_idx == 0 and style.header
+    base = style.head if is_header else style.body
+    xml = ["<w:tr><w:trPr><w:tblHeader/></w:trPr>" if is_header and repeat_header else "<w:tr>"]
+    col_idx = 0
+    while col_idx < num_cols:
+        props = dict(base)
+        if isinstance(props["align"], (list, tuple)):
+            props["align"] = props["align"][col_idx]
+        if style.cell_format:
+            props.update(style.cell_format(row_idx, col_idx, row) or {})
+        span = min(props.get("span", 1), num_cols - col_idx)
+        props["span"] = span
+        width = sum(widths[col_idx:col_idx + span])
+        xml.append(table_cell_xml(row[col_idx], props, base, width, style.font))
+        col_idx += span
+    xml.append("</w:tr>")
+    return "".join(xml)
+
+
+def build_table_xml(rows, style):
+    """The complete w:tbl element for a list-of-rows matrix, built as one string and parsed once.
+
+    The table refers to style by its styleId; register_table_style() must have added it.
+    """
+    xml = [table_open_xml(style)]
+    xml.extend(table_row_xml(row_idx, row, style) for row_idx, row in enumerate(rows))
+    xml.append("</w:tbl>")
+    return parse_xml("".join(xml))
+
+
+def splice_table(paragraph, rows, style):
+    """Build the table for rows and place it straight after paragraph; returns the docx Table"""
+    register_table_style(paragraph.part, style)
+    tbl = build_table_xml(rows, style)
+    paragraph._element.addnext(tbl)
+    return Table(tbl, paragraph._parent)
+
+
+def table_rows_element(rows_xml):
+    """w:tr elements parsed from their XML strings (via a throwaway w:tbl)"""
+    return list(parse_xml(f'<w:tbl {nsdecls("w")}>{"".join(rows_xml)}</w:tbl>'))
+
+
+def stream_table(paragraph, rows, style, chunk_rows=TABLE_STREAM_CHUNK_ROWS, split_rows=None,
+                 continued_text="(continued)"):
+    """Write rows from any iterable (e.g. ws.iter_rows(values_only=True)) as a table after paragraph.
+
+    Rows are pulled chunk_rows at a time, turned into w:tr XML and appended to the table, so
+    only one chunk is ever held as strings whatever the sheet length. The header row (first row,
+    when style.header) repeats at the top of each page. With split_rows a table is closed after
+    that many body rows and continued in a new one, after a continued_text paragraph, starting
+    with the same header row. Returns the docx Tables written (none if rows is empty).
+    """
+    register_table_style(paragraph.part, style)
+    rows = iter(rows)
+    header = next(rows, None) if style.header else None
+    next_row = next(rows, None)
+    if header is None and next_row is None:
+        return []
+
+    header_xml = None if header is None else table_row_xml(0, header, style, repeat_header=True)
+    row_idx = 0 if header is None else 1
+    anchor = paragraph._element
+    tables = []
+    while True:
+        tbl = parse_xml(table_open_xml(style) + "</w:tbl>")
+        if header_xml:
+            tbl.extend(table_rows_element([header_xml]))
+        anchor.addnext(tbl)
+        tables.append(Table(tbl, paragraph._parent))
+
+        body_rows = 0
+        while next_row is not None and not (split_rows and body_rows >= split_rows):
+            limit = chunk_rows if not split_rows else min(chunk_rows, split_rows - body_rows)
+            chunk = [next_row] + list(islice(rows, limit - 1))
+            tbl.extend(table_rows_element(table_row_xml(row_idx + offset, row, style)
+                                          for offset, row in enumerate(chunk)))
+            row_idx += len(chunk)
+            body_rows += len(chunk)
+            next_row = next(rows, None)
+        if next_row is None:
+            return tables
+
+        # More rows than split_rows: carry on in a new table below a "(continued)" note
+        note = table_run_xml(continued_text, "<w:rPr><w:i/></w:rPr>") if continued_text else ""
+        anchor = parse_xml(f'<w:p {nsdecls("w")}>{note}</w:p>')
+        tbl.addnext(anchor)
+
+
+MURAL_TABLE_1_STYLE = TableStyle("Mural Table 1", [Inches(2.5)] * 3, border_size=4, margin=None, font=None,
+                                 size=10, bold=None, align="left", header=False, alignment="center",
+                                 cell_format=mural_table_1_cell_format)
+
+
 def apply_table_borders(table):
     """Apply consistent borders to a table"""
     border_style = {
@@ -3558,135 +4771,29 @@ def insert_fallback_mural_content(doc):
             paragraph.text = paragraph.text.replace("[[Decision-systems-2]]",
                                                     "[Table 2: RAPA - Run Mural extraction script to populate]")
 
-def clean_up_bullet_formatting(doc):
-    """Clean up bullet formatting issues in the document"""
-    print("🔧 Cleaning up bullet formatting...")
-
-    try:
-        fixed_count = 0
-
-        for paragraph in doc.paragraphs:
-            original_text = paragraph.text
-
-            if original_text:
-                new_text = original_text
-
-                # Fix markdown-style bullet formatting
-                if "*   **Value:**" in new_text or "*   **Urgency:**" in new_text or "*   **Actions:**" in new_text:
-                    # Replace with properly formatted bullets
-                    proper_format = """• Value: Proactive adaptation builds resilience, protects critical assets, and secures long-term sustainability against escalating climate impacts.
-• Urgency: Immediate action is paramount; delaying adaptation will drastically increase costs, risks, and the severity of future disruptions.
-• Strategic Actions: Implement integrated adaptation strategies aligned with farm operations and stakeholder requirements.
-• Implementation Actions: Develop detailed implementation plans with clear responsibilities, timelines, and resources.
-• Monitoring Actions: Establish robust monitoring, evaluation, and learning frameworks for continuous improvement."""
-                    paragraph.text = proper_format
-                    fixed_count += 1
-                    continue
-
-                # Fix other markdown formatting
-                new_text = new_text.replace("*   **Value:**", "• Value:")
-                new_text = new_text.replace("*   **Urgency:**", "• Urgency:")
-                new_text = new_text.replace("*   **Actions:**", "• Actions:")
-                new_text = new_text.replace("**Value:**", "Value:")
-                new_text = new_text.replace("**Urgency:**", "Urgency:")
-                new_text = new_text.replace("**Actions:**", "Actions:")
-
-                # Fix incomplete bullet points
-                if ("• Value:" in new_text or "• Urgency:" in new_text or "• Actions:" in new_text) and len(
-                        new_text) < 200:
-                    # Check if this is in Executive Summary
-                    is_exec_summary = False
-                    for i, p in enumerate(doc.paragraphs):
-                        if p == paragraph:
-                            # Check nearby paragraphs for Executive Summary heading
-                            for j in range(max(0, i - 3), min(len(doc.paragraphs), i + 3)):
-                                if "Executive Summary" in doc.paragraphs[j].text:
-                                    is_exec_summary = True
-                                    break
-                            break
-
-                    if is_exec_summary and len(new_text.split('\n')) < 3:
-                        # Replace with complete key messages
-                        proper_key_messages = """• Value: Proactive adaptation builds resilience, protects critical assets, and secures long-term sustainability against escalating climate impacts.
-• Urgency: Immediate action is paramount; delaying adaptation will drastically increase costs, risks, and the severity of future disruptions.
-• Strategic Actions: Implement integrated adaptation strategies aligned with farm operations and stakeholder requirements.
-• Implementation Actions: Develop detailed implementation plans with clear responsibilities, timelines, and resources.
-• Monitoring Actions: Establish robust monitoring, evaluation, and learning frameworks for continuous improvement."""
-                        paragraph.text = proper_key_messages
-                        fixed_count += 1
-
-                if new_text != original_text:
-                    paragraph.text = new_text
-                    fixed_count += 1
-
-        print(f"🔧 Fixed {fixed_count} bullet formatting issues")
-        return fixed_count  # Always returns an integer
-
-    except Exception as e:
-        print(f"⚠️ Error in bullet formatting: {e}")
-        return 0  # Return 0 instead of None
-
-
 def clean_up_toc_formatting(doc):
     """Clean up TOC formatting to ensure custom sections appear in correct order"""
     print("🧹 Cleaning up TOC formatting...")
+    visit = CleanupVisitor(doc, ["toc_bounds"]).walk()
+    return "toc_start" in visit.state
 
-    # Find TOC section
-    toc_start = -1
-    in_toc = False
 
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
+MISSED_FIGURE_PLACEHOLDERS = [
+    "[[Figure-1_Change-in-Hot-Summer-Days]]",
+    "[[Figure-1_Change-in-Hot-Summer-Days.png]]",
+    "[[Figure-2_Change-in-tropical-nights]]",
+    "[[Figure-3_Changing-flood-risk]]",
+    "[[Figure-4_Changing-drought-wind-and-subsidence-risks]]",
+    "[[Figure-5_Components-of-climate-change-vulnerability]]",
+    "[[Figure-6_Current-and-target-capabilities]]",
+    "[[Figure-7_Adaptation-Plan-activities-and-phased-implementation-pathways]]"
+]
 
-        if "Table of Contents" in text and not in_toc:
-            toc_start = i
-            in_toc = True
-            print(f"✅ Found TOC start at paragraph {i}")
-            continue
-
-        if in_toc and ("List of Figures" in text or "List of Tables" in text):
-            # End of TOC section
-            print(f"✅ Found end of TOC at paragraph {i}")
-            break
-
-    if toc_start == -1:
-        print("⚠️ TOC not found in document")
-        return False
-
-    return True
 
 def remove_figure_placeholders(doc):
     """Specifically remove figure placeholders that might have been missed"""
     print("🗑️ Removing figure placeholders specifically...")
-
-    figure_placeholders = [
-        "[[Figure-1_Change-in-Hot-Summer-Days]]",
-        "[[Figure-1_Change-in-Hot-Summer-Days.png]]",
-        "[[Figure-2_Change-in-tropical-nights]]",
-        "[[Figure-3_Changing-flood-risk]]",
-        "[[Figure-4_Changing-drought-wind-and-subsidence-risks]]",
-        "[[Figure-5_Components-of-climate-change-vulnerability]]",
-        "[[Figure-6_Current-and-target-capabilities]]",
-        "[[Figure-7_Adaptation-Plan-activities-and-phased-implementation-pathways]]"
-    ]
-
-    removed_count = 0
-
-    for paragraph in doc.paragraphs:
-        for placeholder in figure_placeholders:
-            if placeholder in paragraph.text:
-                # Check if this is a standalone placeholder (not part of actual figure caption)
-                if paragraph.text.strip() == placeholder:
-                    paragraph.text = ""
-                    removed_count += 1
-                    print(f"✅ Removed figure placeholder: {placeholder}")
-
-    return removed_count
-
-
-def clean_up_bullet_formatting(doc):
-    """Clean up bullet formatting issues in the document"""
-    # ... your existing function code ...
+    return run_cleanup(doc, ["missed_figure_placeholders"])["missed_figure_placeholders"]
 
 
 def fix_title_page_placeholders(doc, json_data):
@@ -3789,6 +4896,290 @@ def ensure_placeholders_in_doc(doc):
     return any(existing_placeholders.values())
 
 
+# ---------------- WORKBOOK MODEL ----------------
+SHEET_CACHE_DB = "sheet_cache.db"  # SQLite (WAL) store of parsed workbooks, shared by worker processes
+SHEET_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Disk budget for stored (compressed) workbooks
+SHEET_CACHE_VERSION = 1  # Bump when the cached row format changes so old entries are never read
+EXCEL_PARSE_MAX_WORKERS = min(4, os.cpu_count() or 1)  # Processes parsing uploaded workbooks at once
+# Parse workers run workbook_parsing (openpyxl only). They are never forked from this process,
+# whose Flask, refresher and narrative threads may hold locks at the moment of the fork
+EXCEL_PARSE_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SheetCacheStore:
+    """Parsed workbook sheets in SQLite, keyed by the SHA-256 of the uploaded file.
+
+    The same hazard and monitoring workbooks are re-uploaded for many report iterations; a hit
+    skips openpyxl entirely. Each row holds the zlib-compressed JSON of [sheet name, text rows]
+    pairs. Once the stored size passes max_bytes the least recently used workbooks are dropped.
+    """
+
+    def __init__(self, db_path=SHEET_CACHE_DB, max_bytes=SHEET_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.available = self.init_store()
+
+    def init_store(self):
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS workbooks (digest TEXT PRIMARY KEY, sheets BLOB NOT NULL, "
+                             "size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)")
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Sheet cache store unavailable ({e}), workbooks will always be parsed")
+            return False
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def key(digest):
+        return f"{SHEET_CACHE_VERSION}:{digest}"
+
+    def get(self, digest):
+        """{sheet name: text rows} stored for digest, or None"""
+        if not self.available:
+            return None
+        try:
+            with closing(self.connect()) as conn:
+                row = conn.execute("SELECT sheets FROM workbooks WHERE digest = ?", (self.key(digest),)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE workbooks SET last_access = ? WHERE digest = ?", (time.time(), self.key(digest)))
+            return dict(json.loads(decompress_text(row[0])))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"⚠️ Error reading sheet cache: {e}")
+            return None
+
+    def put(self, digest, sheets):
+        if not self.available:
+            return False
+        stored = compress_text(json.dumps(list(sheets.items()), ensure_ascii=False))
+        now = time.time()
+        try:
+            with closing(self.connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("INSERT OR REPLACE INTO workbooks (digest, sheets, size, created, last_access) "
+                                 "VALUES (?, ?, ?, ?, ?)", (self.key(digest), stored, len(stored), now, now))
+                    self.enforce_budget(conn, self.key(digest))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Error saving sheet cache entry: {e}")
+            return False
+
+    def enforce_budget(self, conn, keep):
+        """Inside a write transaction: drop least recently used workbooks until under the byte budget"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM workbooks").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        evicted = []
+        for digest, size in conn.execute("SELECT digest, size FROM workbooks ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            if digest != keep:
+                evicted.append((digest,))
+                total -= size
+        conn.executemany("DELETE FROM workbooks WHERE digest = ?", evicted)
+        print(f"🧹 Sheet cache over budget: evicted {len(evicted)} workbooks")
+        return len(evicted)
+
+
+sheet_cache = SheetCacheStore()
+
+
+# ---------------- ROW CLEANING ----------------
+
+strip_cells = np.frompyfunc(str.strip, 1, 1)
+
+
+def cell_matrix(rows, blank=()):
+    """rows of strings as a 2-D object array of stripped cells, plus the mask of cells with data.
+
+    Short rows are padded with "". Only non-empty cells go through str.strip, so the padding of
+    wide or long sheets costs nothing; values in blank (e.g. "None") count as empty.
+    """
+    width = max((len(row) for row in rows), default=0)
+    if any(len(row) != width for row in rows):
+        rows = [list(row) + [""] * (width - len(row)) for row in rows]
+    cells = np.empty((len(rows), width), dtype=object)
+    if not cells.size:
+        return cells, np.zeros(cells.shape, dtype=bool)
+    cells[:] = rows
+    filled = cells != ""
+    stripped = strip_cells(cells[filled])
+    cells[filled] = stripped
+    filled[filled] = stripped != ""
+    for value in blank:
+        filled &= cells != value
+    return cells, filled
+
+
+def trim_cells(cells, filled):
+    """Rows with data, with empty columns removed from BOTH ends (see cell_matrix)"""
+    used_cols = np.flatnonzero(filled.any(axis=0))
+    if not used_cols.size:
+        return []
+    return cells[filled.any(axis=1), used_cols[0]:used_cols[-1] + 1].tolist()
+
+
+def pack_cells(cells, filled, width=None):
+    """Each row's cells with data shifted left, rows without any dropped (see cell_matrix).
+
+    With width every row is cut or padded with "" to exactly width cells; without it rows keep
+    their own length.
+    """
+    # Masked cells come out row by row in their original order; each row takes its own count
+    values = iter(cells[filled].tolist())
+    packed = [list(islice(values, count)) for count in filled.sum(axis=1).tolist() if count]
+    if width is None:
+        return packed
+    return [(row + [""] * width)[:width] for row in packed]
+
+
+def clean_table_rows(rows, blank=()):
+    """Stripped rows with data, with empty columns removed from BOTH ends.
+
+    One mask over the whole sheet gives the row filter and the column bounding box at once,
+    instead of scanning every cell again in Python for each.
+    """
+    return trim_cells(*cell_matrix(rows, blank))
+
+
+class WorkbookModel:
+    """An uploaded Excel file parsed once and shared by every table processor.
+
+    sheets maps sheet name to text rows (see parse_workbook_sheets); trimmed_rows() derives and
+    remembers the column-trimmed matrices. from_file() goes through the sheet cache, so an
+    upload identical to an earlier one is never opened with openpyxl.
+    """
+
+    def __init__(self, path, sheets):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.sheets = sheets
+        self.matrices = {}
+        self.trimmed = {}
+
+    @classmethod
+    def from_file(cls, path):
+        digest = file_sha256(path)
+        sheets = sheet_cache.get(digest)
+        if sheets is None:
+            sheets = parse_workbook_sheets(path)
+            sheet_cache.put(digest, sheets)
+        else:
+            print(f"♻️ Reusing parsed sheets for {os.path.basename(path)} ({digest[:12]})")
+        return cls(path, sheets)
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def text_rows(self, sheet_name):
+        """Rows as strings ("" for empty cells), keeping only rows with some non-blank cell"""
+        return self.sheets[sheet_name]
+
+    def cell_matrix(self, sheet_name):
+        """cell_matrix() of the sheet, built once and shared by trimmed_rows() and packed_rows()"""
+        if sheet_name not in self.matrices:
+            self.matrices[sheet_name] = cell_matrix(self.text_rows(sheet_name))
+        return self.matrices[sheet_name]
+
+    def trimmed_rows(self, sheet_name):
+        """Stripped rows with data, with empty columns removed from BOTH ends"""
+        if sheet_name not in self.trimmed:
+            self.trimmed[sheet_name] = trim_cells(*self.cell_matrix(sheet_name))
+        return self.trimmed[sheet_name]
+
+    def packed_rows(self, sheet_name, width=None):
+        """Stripped non-empty cells of each row shifted left (see pack_cells)"""
+        return pack_cells(*self.cell_matrix(sheet_name), width)
+
+
+def parse_workbooks(paths):
+    """parse_workbook_sheets() for each path, with the exception in place of any that failed.
+
+    Two or more workbooks are parsed in a process pool, one workbook per worker, since openpyxl
+    is CPU-bound and holds the GIL. A single workbook is parsed here; a pool would only add
+    start-up time.
+    """
+    if len(paths) < 2 or EXCEL_PARSE_MAX_WORKERS < 2:
+        return [parse_workbook_or_error(path) for path in paths]
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(EXCEL_PARSE_MAX_WORKERS, len(paths)),
+                                 mp_context=EXCEL_PARSE_CONTEXT) as pool:
+            return list(pool.map(parse_workbook_or_error, paths))
+    except (BrokenProcessPool, OSError) as e:
+        print(f"⚠️ Excel parse pool unavailable ({e}), parsing workbooks in-process")
+        return [parse_workbook_or_error(path) for path in paths]
+
+
+def load_workbook_models(excel_paths):
+    """WorkbookModel for each uploaded file, in order (None where missing or unreadable).
+
+    Workbooks seen before come from the sheet cache; the rest are parsed together by
+    parse_workbooks() and cached. Only plain row matrices come back from the workers - the
+    docx work stays with the caller.
+    """
+    models = [None] * len(excel_paths)
+    pending = []  # (index, path, digest) still to parse
+
+    for i, path in enumerate(excel_paths):
+        if not path or not os.path.exists(path):
+            print(f"⚠️ Excel file not found: {path}")
+            continue
+        try:
+            digest = file_sha256(path)
+        except OSError as e:
+            print(f"❌ Could not read Excel file {os.path.basename(path)}: {e}")
+            continue
+        sheets = sheet_cache.get(digest)
+        if sheets is None:
+            pending.append((i, path, digest))
+        else:
+            print(f"♻️ Reusing parsed sheets for {os.path.basename(path)} ({digest[:12]})")
+            models[i] = WorkbookModel(path, sheets)
+
+    if pending:
+        start = time.perf_counter()
+        results = parse_workbooks([path for _, path, _ in pending])
+        print(f"📊 Parsed {len(pending)} workbook(s) in {time.perf_counter() - start:.2f}s")
+        for (i, path, digest), sheets in zip(pending, results):
+            if isinstance(sheets, Exception):
+                print(f"❌ Could not read Excel file {os.path.basename(path)}: {sheets}")
+                continue
+            sheet_cache.put(digest, sheets)
+            models[i] = WorkbookModel(path, sheets)
+
+    return models
+
+
+def load_workbook_model(excel_file_path):
+    """WorkbookModel for one uploaded file, or None if it is missing or cannot be read"""
+    return load_workbook_models([excel_file_path])[0]
+
+
+def workbook_model(workbook):
+    """workbook as a WorkbookModel, parsing it first if it is still a file path"""
+    return workbook if isinstance(workbook, WorkbookModel) else WorkbookModel.from_file(workbook)
+
+
 def create_table_title(doc, title_text, level=2):
     """Create table titles that match PDF style"""
     title_para = doc.add_paragraph()
@@ -3804,144 +5195,45 @@ def create_table_title(doc, title_text, level=2):
     return title_para
 
 
-def format_table_exact_pdf(table, sheet_name):
-    """Format table to be EXACTLY like the PDF tables"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
-
-        # EXACT PDF BORDERS - thin, black, all around
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # EXACT PDF COLUMN WIDTHS based on table type
-        if sheet_name == "table-3_a":  # Main action table
-            widths = [Inches(2.0), Inches(2.5), Inches(0.8), Inches(0.7)]
-        elif sheet_name == "table-1_identified-impacts":  # Impacts table
-            widths = [Inches(1.5), Inches(4.5)]
-        elif sheet_name == "table-5_development_actions":  # Capacity actions
-            widths = [Inches(2.5), Inches(1.2), Inches(1.3), Inches(0.8)]
-        elif sheet_name == "table-4_current_strengths":  # Single column table
-            widths = [Inches(6.0)]
-        elif sheet_name == "table-7_monitoring":  # Monitoring table
-            widths = [Inches(2.0), Inches(2.0), Inches(2.0)]
-        elif sheet_name == "table-A2_hazards":  # Hazards table
-            widths = [Inches(1.5), Inches(0.8), Inches(0.8), Inches(0.8), Inches(0.8), Inches(0.8)]
-        elif sheet_name == "table_A5_monitoring":  # Monitoring matrix
-            widths = [Inches(1.8), Inches(0.7), Inches(0.9), Inches(0.9), Inches(0.9), Inches(0.8)]
-        # ADD CADD TABLE WIDTHS
-        elif sheet_name == "cadd-1_current":  # CADD current capabilities
-            widths = [Inches(3.0), Inches(3.0)]
-        elif sheet_name == "cadd-2_add":  # CADD additional capabilities
-            widths = [Inches(3.0), Inches(3.0)]
-        elif sheet_name == "rapa-1":  # RAPA table 1
-            widths = [Inches(3.0), Inches(3.0)]
-        elif sheet_name == "rapa-2":  # RAPA table 2
-            widths = [Inches(3.0), Inches(3.0)]
-        else:
-            # Default even distribution
-            total_width = Inches(6.0)
-            col_width = total_width / len(table.columns)
-            widths = [col_width] * len(table.columns)
-
-        # Apply widths
-        for i, col in enumerate(table.columns):
-            if i < len(widths):
-                col.width = widths[i]
-
-        # EXACT PDF CELL FORMATTING
-        for row_idx, row in enumerate(table.rows):
-            for cell_idx, cell in enumerate(row.cells):
-                if cell.paragraphs:
-                    paragraph = cell.paragraphs[0]
-
-                    # Clear existing content but keep paragraph
-                    for run in paragraph.runs:
-                        run.text = ""
-
-                    # Get cell text
-                    cell_text = cell.text.strip()
-
-                    # Create new run with EXACT PDF styling
-                    run = paragraph.add_run(cell_text)
-
-                    # EXACT PDF FONT - Calibri, specific sizes
-                    run.font.name = "Calibri"
-
-                    # HEADER ROW - EXACT PDF styling
-                    if row_idx == 0:
-                        run.bold = True
-                        run.font.size = Pt(12)
-                        # EXACT PDF HEADER BACKGROUND
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        shading = parse_xml(
-                            r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#ffffff" w:val="clear"/>')
-                        tcPr.append(shading)
-                    else:
-                        # DATA ROW - EXACT PDF styling
-                        run.font.size = Pt(12)
-                        run.bold = False
-
-                    # EXACT PDF ALIGNMENT
-                    # Special handling for 2-column tables like CADD
-                    if len(row.cells) == 2:  # 2-column tables (CADD, RAPA)
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    elif len(row.cells) >= 3:  # Multi-column tables
-                        if cell_idx == len(row.cells) - 1 or cell_idx == len(row.cells) - 2:  # Last 2 columns
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        else:
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    else:
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                    # EXACT PDF CELL PADDING - minimal padding like PDF
-                    tcPr = cell._tc.get_or_add_tcPr()
-                    tcMar = parse_xml(
-                        r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                        r'<w:top w:w="40" w:type="dxa"/>'
-                        r'<w:left w:w="40" w:type="dxa"/>'
-                        r'<w:bottom w:w="40" w:type="dxa"/>'
-                        r'<w:right w:w="40" w:type="dxa"/>'
-                        r'</w:tcMar>')
-                    tcPr.append(tcMar)
-
-                    # EXACT PDF NO SPACING BETWEEN CELLS
-                    tcPr = cell._tc.get_or_add_tcPr()
-                    tcCellSpacing = parse_xml(
-                        r'<w:tblCellSpacing xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:w="0" w:type="dxa"/>')
-                    tcPr.append(tcCellSpacing)
+EXACT_PDF_TABLE_WIDTHS = {
+    "table-3_a": [Inches(2.0), Inches(2.5), Inches(0.8), Inches(0.7)],  # Main action table
+    "table-1_identified-impacts": [Inches(1.5), Inches(4.5)],  # Impacts table
+    "table-5_development_actions": [Inches(2.5), Inches(1.2), Inches(1.3), Inches(0.8)],  # Capacity actions
+    "table-4_current_strengths": [Inches(6.0)],  # Single column table
+    "table-7_monitoring": [Inches(2.0), Inches(2.0), Inches(2.0)],  # Monitoring table
+    "table-A2_hazards": [Inches(1.5), Inches(0.8), Inches(0.8), Inches(0.8), Inches(0.8), Inches(0.8)],  # Hazards
+    "table_A5_monitoring": [Inches(1.8), Inches(0.7), Inches(0.9), Inches(0.9), Inches(0.9), Inches(0.8)],  # Matrix
+    "cadd-1_current": [Inches(3.0), Inches(3.0)],  # CADD current capabilities
+    "cadd-2_add": [Inches(3.0), Inches(3.0)],  # CADD additional capabilities
+    "rapa-1": [Inches(3.0), Inches(3.0)],  # RAPA table 1
+    "rapa-2": [Inches(3.0), Inches(3.0)],  # RAPA table 2
+}
+
+
+def exact_pdf_table_style(sheet_name, num_cols):
+    """TableStyle for a sheet table EXACTLY like the PDF tables"""
+    # Known sheets get their PDF widths; extra columns share the default 6" evenly
+    widths = EXACT_PDF_TABLE_WIDTHS.get(sheet_name, [])[:num_cols]
+    widths += even_table_widths(num_cols)[len(widths):]
+
+    # Multi-column tables centre their last 2 columns, everything else is left aligned
+    if num_cols >= 3:
+        align = ["left"] * (num_cols - 2) + ["center", "center"]
+    else:
+        align = "left"
 
-    except Exception as e:
-        print(f"⚠️ Error formatting table exact PDF: {e}")
+    return TableStyle("Report PDF Table", widths, border_size=2, margin=40, size=12, header_size=12,
+                      header_fill="ffffff", align=align)
 
 
-def process_table_1_special(doc, excel_file_path):
+def process_table_1_special(doc, workbook):
     """Special processing ONLY for Table 1 to create the exact single column format"""
     try:
-        wb = load_workbook(excel_file_path)
+        workbook = workbook_model(workbook)
 
-        if "table-1_identified-impacts" not in wb.sheetnames:
+        if "table-1_identified-impacts" not in workbook.sheetnames:
             return False  # Table 1 not in this file
 
-        ws = wb["table-1_identified-impacts"]
-
         # Find the Table 1 placeholder specifically
         placeholder = "[[table-1_identified-impacts]]"
         placeholder_paragraph = None
@@ -3956,11 +5248,7 @@ def process_table_1_special(doc, excel_file_path):
             return False
 
         # Get all data from the Table 1 sheet
-        all_data = []
-        for row in ws.iter_rows(values_only=True):
-            row_data = [str(cell) if cell is not None else "" for cell in row]
-            if any(cell.strip() for cell in row_data if cell):
-                all_data.append(row_data)
+        all_data = workbook.text_rows("table-1_identified-impacts")
 
         if not all_data:
             print("⚠️ No data in Table 1 sheet")
@@ -3975,22 +5263,12 @@ def process_table_1_special(doc, excel_file_path):
         # Add the main header
         table_content.append(["Global Warming Level (°C) | Key Climate Change Impacts Requiring Action"])
 
-        # Process the actual content from Excel
-        for row in all_data[1:]:  # Skip the Excel header row
-            for cell_value in row:
-                if cell_value and cell_value.strip():
-                    table_content.append([cell_value.strip()])
-
-        # Create the table
-        table = doc.add_table(rows=len(table_content), cols=1)
+        # Process the actual content from Excel: every non-empty cell becomes its own row
+        for row in workbook.packed_rows("table-1_identified-impacts")[1:]:  # Skip the Excel header row
+            table_content.extend([cell_value] for cell_value in row)
 
-        # Position table
-        title_element = placeholder_paragraph._element
-        table_element = table._element
-        title_element.addnext(table_element)
-
-        # Apply the special Table 1 formatting
-        format_table_1_single_column_exact(table, table_content)
+        # Create the table right after the placeholder with the special Table 1 formatting
+        splice_table(placeholder_paragraph, table_content, TABLE_1_STYLE)
 
         print("✅ Table 1 created as single column exactly like reference")
         return True
@@ -4000,129 +5278,43 @@ def process_table_1_special(doc, excel_file_path):
         return False
 
 
-def format_table_1_single_column_exact(table, table_content):
-    """Format Table 1 as single column exactly like reference image"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        # Set single column width to full page width
-        table.columns[0].width = Inches(6.5)
-
-        # EXACT BORDERS - Full grid with thin black lines
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
-
-        # Apply exact borders
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="4" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # Populate table and apply formatting
-        for row_idx, row_data in enumerate(table_content):
-            cell = table.cell(row_idx, 0)
-            if cell.paragraphs:
-                paragraph = cell.paragraphs[0]
-                paragraph.clear()
+TABLE_1_SECTION_KEYWORDS = [
+    "Impacts occurring with", "Impacts expected with",
+    "Chronic, compounding problems occur", "Catastrophic risks",
+    "Near-irreversible loss", "Existential threats",
+    "The earliest, noticeable impacts have arrived",
+    "Impacts become chronic and more severe"
+]
 
-                cell_text = row_data[0]
 
-                # HEADER ROW - LIGHT GREEN BACKGROUND
-                if row_idx == 0:
-                    run = paragraph.add_run(cell_text)
-                    run.font.name = "Calibri"
-                    run.font.size = Pt(11)
-                    run.bold = True
-                    run.font.color.rgb = RGBColor(255, 255, 255)  # WHITE TEXT
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+def table_1_cell_format(row_idx, col_idx, row):
+    """Table 1 single column: light green section headers, indented bullet points"""
+    cell_text = row[col_idx]
+    if row_idx == 0:
+        return None
+    # SECTION HEADERS - LIGHT GREEN BACKGROUND
+    if any(keyword in cell_text for keyword in TABLE_1_SECTION_KEYWORDS):
+        return {"bold": True, "fill": "#b2e4a0"}
+    # BULLET POINTS
+    if cell_text.startswith("- "):
+        return {"indent": Inches(0.3)}
+    return None
 
-                    # Light green background
-                    tcPr = cell._tc.get_or_add_tcPr()
-                    shading = parse_xml(
-                        r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#397b21" w:val="clear"/>')
-                    tcPr.append(shading)
-
-                # SECTION HEADERS - LIGHT GRAY BACKGROUND
-                elif any(keyword in cell_text for keyword in [
-                    "Impacts occurring with", "Impacts expected with",
-                    "Chronic, compounding problems occur", "Catastrophic risks",
-                    "Near-irreversible loss", "Existential threats",
-                    "The earliest, noticeable impacts have arrived",
-                    "Impacts become chronic and more severe"
-                ]):
-                    run = paragraph.add_run(cell_text)
-                    run.font.name = "Calibri"
-                    run.font.size = Pt(10)
-                    run.bold = True
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                    # Light gray background
-                    tcPr = cell._tc.get_or_add_tcPr()
-                    shading = parse_xml(
-                        r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#b2e4a0" w:val="clear"/>')
-                    tcPr.append(shading)
-
-                # BULLET POINTS
-                elif cell_text.startswith("- "):
-                    run = paragraph.add_run(cell_text)
-                    run.font.name = "Calibri"
-                    run.font.size = Pt(10)
-                    run.bold = False
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    paragraph.paragraph_format.left_indent = Inches(0.3)
-
-                # REGULAR CONTENT
-                else:
-                    run = paragraph.add_run(cell_text)
-                    run.font.name = "Calibri"
-                    run.font.size = Pt(10)
-                    run.bold = False
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                # PROPER CELL PADDING
-                tcPr = cell._tc.get_or_add_tcPr()
-                tcMar = parse_xml(
-                    r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                    r'<w:top w:w="60" w:type="dxa"/>'
-                    r'<w:left w:w="60" w:type="dxa"/>'
-                    r'<w:bottom w:w="60" w:type="dxa"/>'
-                    r'<w:right w:w="60" w:type="dxa"/>'
-                    r'</w:tcMar>')
-                tcPr.append(tcMar)
-
-        # Set table to not break across pages
-        tblPr = table._tbl.tblPr
-        tblLayout = parse_xml(
-            r'<w:tblLayout xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="fixed"/>')
-        tblPr.append(tblLayout)
 
-    except Exception as e:
-        print(f"⚠️ Error formatting Table 1 single column: {e}")
+# Single full-width column, GREEN header with WHITE text
+TABLE_1_STYLE = TableStyle("Report Table 1", [Inches(6.5)], border_size=4, margin=60, size=10, header_size=11,
+                           header_color="FFFFFF", header_fill="#397b21", header_align="center",
+                           cell_format=table_1_cell_format)
 
 
-def process_table_3_special(doc, excel_file_path):
+def process_table_3_special(doc, workbook):
     """Special processing ONLY for Table 3 to create the exact multi-column format"""
     try:
-        wb = load_workbook(excel_file_path)
+        workbook = workbook_model(workbook)
 
-        if "table-3_a" not in wb.sheetnames:
+        if "table-3_a" not in workbook.sheetnames:
             return False  # Table 3 not in this file
 
-        ws = wb["table-3_a"]
-
         # Find the Table 3 placeholder specifically
         placeholder = "[[table-3_a]]"
         placeholder_paragraph = None
@@ -4137,11 +5329,7 @@ def process_table_3_special(doc, excel_file_path):
             return False
 
         # Get all data from the Table 3 sheet
-        all_data = []
-        for row in ws.iter_rows(values_only=True):
-            row_data = [str(cell) if cell is not None else "" for cell in row]
-            if any(cell.strip() for cell in row_data if cell):
-                all_data.append(row_data)
+        all_data = workbook.text_rows("table-3_a")
 
         if not all_data:
             print("⚠️ No data in Table 3 sheet")
@@ -4150,45 +5338,18 @@ def process_table_3_special(doc, excel_file_path):
         # Clear placeholder
         placeholder_paragraph.clear()
 
-        # Create table with exact column structure
-        table_content = []
-
-        # Add header row
-        if all_data:
-            header_row = all_data[0]
-            # Clean up header row - ensure we have exactly 4 columns
-            cleaned_header = [cell.strip() for cell in header_row if cell.strip()]
-            # Make sure we have exactly 4 columns for the table structure
-            while len(cleaned_header) < 4:
-                cleaned_header.append("")
-            table_content.append(cleaned_header[:4])  # Take only first 4 columns
-
-        # Add data rows
-        for row in all_data[1:]:
-            cleaned_row = [cell.strip() for cell in row if cell.strip()]
-            # Ensure each row has exactly 4 columns
-            while len(cleaned_row) < 4:
-                cleaned_row.append("")
-            if any(cleaned_row):  # Only add non-empty rows
-                table_content.append(cleaned_row[:4])  # Take only first 4 columns
+        # Header and data rows: non-empty cells only, exactly 4 columns each
+        table_content = workbook.packed_rows("table-3_a", width=4)
 
         # Create the table
         num_rows = len(table_content)
-        num_cols = 4  # Fixed 4 columns for Table 3
 
         if num_rows == 0:
             print("⚠️ No valid data in Table 3 after cleaning")
             return False
 
-        table = doc.add_table(rows=num_rows, cols=num_cols)
-
-        # Position table
-        title_element = placeholder_paragraph._element
-        table_element = table._element
-        title_element.addnext(table_element)
-
-        # Apply the special Table 3 formatting
-        format_table_3_exact_reference(table, table_content)
+        # Create the table right after the placeholder with the special Table 3 formatting
+        splice_table(placeholder_paragraph, table_content, TABLE_3_STYLE)
 
         print("✅ Table 3 created with exact reference formatting")
         return True
@@ -4198,196 +5359,45 @@ def process_table_3_special(doc, excel_file_path):
         return False
 
 
-def format_table_3_exact_reference(table, table_content):
-    """Format Table 3 exactly like the reference image"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        # Set specific column widths matching the reference EXACTLY
-        table.columns[0].width = Inches(1.5)  # Hazards column
-        table.columns[1].width = Inches(3.0)  # Adaptation Actions column - widest
-        table.columns[2].width = Inches(1.2)  # Decision Triggers column
-        table.columns[3].width = Inches(1.3)  # Comments column
-
-        # EXACT BORDERS - Full grid with thin black lines
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
-
-        # Apply exact borders - thin black lines all around
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # Track section header rows for merging
-        section_header_rows = []
-
-        # First pass: identify section header rows
-        for row_idx, row_data in enumerate(table_content):
-            if row_idx == 0:  # Skip header row
-                continue
-            if row_data[0] and "activities between" in row_data[0].lower():
-                section_header_rows.append(row_idx)
+TABLE_3_ACTION_TITLES = ["soil improvement", "shelterbelt", "pollution audit", "expand/strengthen"]
 
-        # Second pass: apply formatting and handle merging
-        for row_idx, row_data in enumerate(table_content):
-            for col_idx, cell_text in enumerate(row_data):
-                if col_idx < len(table.columns):
-                    cell = table.cell(row_idx, col_idx)
-
-                    # Clear existing content
-                    if cell.paragraphs:
-                        for paragraph in cell.paragraphs:
-                            paragraph.clear()
 
-                    # Handle section header rows (merge across all columns)
-                    if row_idx in section_header_rows:
-                        if col_idx == 0:  # First column - this will be the merged cell
-                            # Set the text for the merged cell
-                            paragraph = cell.paragraphs[0]
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(10)
-                            run.bold = True
-                            run.font.color.rgb = RGBColor(62, 77, 57)
-                            # CENTER ALIGN the section header
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-                            # Light blue background for section headers
-                            tcPr = cell._tc.get_or_add_tcPr()
-                            shading = parse_xml(
-                                r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#b2e4a0" w:val="clear"/>')
-                            tcPr.append(shading)
-
-                            # Merge this cell across all 4 columns
-                            if col_idx == 0:
-                                cell._tc.set('gridSpan', '4')
-                                # Clear content from other cells in this row
-                                for merge_col in range(1, 4):
-                                    if merge_col < len(table.row_cells(row_idx)):
-                                        other_cell = table.cell(row_idx, merge_col)
-                                        if other_cell.paragraphs:
-                                            for p in other_cell.paragraphs:
-                                                p.clear()
-                        continue  # Skip other columns for section headers
-
-                    # HEADER ROW - EXACT REFERENCE STYLING
-                    elif row_idx == 0:
-                        paragraph = cell.paragraphs[0]
-                        run = paragraph.add_run(cell_text)
-                        run.font.name = "Calibri"
-                        run.font.size = Pt(11)
-                        run.bold = True
-                        run.font.color.rgb = RGBColor(255, 255, 255)  # WHITE TEXT
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                        # background for header
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        shading = parse_xml(
-                            r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#397b21" w:val="clear"/>')
-                        tcPr.append(shading)
+def table_3_cell_format(row_idx, col_idx, row):
+    """Table 3: merged section header rows, bulleted Adaptation Actions, white odd rows"""
+    cell_text = row[col_idx]
+    if row_idx == 0:
+        return None
 
-                    # DATA ROWS - EXACT REFERENCE STYLING
-                    else:
-                        paragraph = cell.paragraphs[0]
-
-                        # Handle bullet points in Adaptation Actions column
-                        if col_idx == 1 and "•" in cell_text:
-                            # Split by bullet points and format each as a separate paragraph
-                            bullet_points = [point.strip() for point in cell_text.split('•') if point.strip()]
-
-                            if bullet_points:
-                                # First part (before first bullet) - this is the action title
-                                first_part = bullet_points[0]
-                                if first_part:
-                                    run = paragraph.add_run(first_part)
-                                    run.font.name = "Calibri"
-                                    run.font.size = Pt(10)
-                                    run.bold = True
+    # Section header rows ("Activities between ...") are one centred cell across all 4 columns
+    if row[0] and "activities between" in row[0].lower():
+        return {"span": 4, "bold": True, "color": "3E4D39", "align": "center", "fill": "#b2e4a0"}
 
-                                # Add bullet points as separate paragraphs in the same cell
-                                for bullet_point in bullet_points[1:]:
-                                    if bullet_point:
-                                        # Add line break
-                                        paragraph.add_run().add_break()
-                                        # Add bullet character and text
-                                        bullet_run = paragraph.add_run("• " + bullet_point)
-                                        bullet_run.font.name = "Calibri"
-                                        bullet_run.font.size = Pt(10)
-                                        bullet_run.bold = False
-                        else:
-                            # Regular cell content
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(10)
-
-                            # Bold for action titles in Adaptation Actions column
-                            if col_idx == 1 and any(keyword in cell_text.lower() for keyword in
-                                                    ["soil improvement", "shelterbelt", "pollution audit",
-                                                     "expand/strengthen"]):
-                                run.bold = True
-                            else:
-                                run.bold = False
-
-                        # Alignment based on column
-                        if col_idx in [2, 3]:  # Decision Triggers and Comments - center aligned
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        else:  # Hazards and Adaptation Actions - left aligned
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    style = {"fill": "#ffffff"} if row_idx % 2 == 1 else {}
+    if col_idx == 1 and "•" in cell_text:
+        # Action title (before the first bullet) in bold, then one line per bullet point
+        bullet_points = [point.strip() for point in cell_text.split("•") if point.strip()] or [""]
+        style["lines"] = [(bullet_points[0], True)] + [("• " + point, False) for point in bullet_points[1:]]
+    elif col_idx == 1 and any(keyword in cell_text.lower() for keyword in TABLE_3_ACTION_TITLES):
+        # Bold for action titles in Adaptation Actions column
+        style["bold"] = True
+    return style
 
-                        # Alternate row coloring for better readability
-                        if row_idx % 2 == 1 and row_idx not in section_header_rows:  # Odd rows (after header)
-                            tcPr = cell._tc.get_or_add_tcPr()
-                            shading = parse_xml(
-                                r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#ffffff" w:val="clear"/>')
-                            tcPr.append(shading)
-
-                    # PROPER CELL PADDING - minimal padding like reference
-                    tcPr = cell._tc.get_or_add_tcPr()
-                    tcMar = parse_xml(
-                        r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                        r'<w:top w:w="40" w:type="dxa"/>'
-                        r'<w:left w:w="40" w:type="dxa"/>'
-                        r'<w:bottom w:w="40" w:type="dxa"/>'
-                        r'<w:right w:w="40" w:type="dxa"/>'
-                        r'</w:tcMar>')
-                    tcPr.append(tcMar)
-
-        # Set table to not break across pages
-        tblPr = table._tbl.tblPr
-        tblLayout = parse_xml(
-            r'<w:tblLayout xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="fixed"/>')
-        tblPr.append(tblLayout)
 
-    except Exception as e:
-        print(f"⚠️ Error formatting Table 3 exact reference: {e}")
-        import traceback
-        print(traceback.format_exc())
+# Hazards | Adaptation Actions (widest) | Decision Triggers | Comments, GREEN header with WHITE text
+TABLE_3_STYLE = TableStyle("Report Table 3", [Inches(1.5), Inches(3.0), Inches(1.2), Inches(1.3)],
+                           border_size=2, margin=40, size=10, header_size=11, header_color="FFFFFF", header_fill="#397b21",
+                           header_align="left", align=["left", "left", "center", "center"],
+                           cell_format=table_3_cell_format)
 
 
-def process_table_4_special(doc, excel_file_path):
+def process_table_4_special(doc, workbook):
     """Special processing ONLY for Table 4 to create the exact formatting with green header and white text"""
     try:
-        wb = load_workbook(excel_file_path)
+        workbook = workbook_model(workbook)
 
-        if "table-4_current_strengths" not in wb.sheetnames:
+        if "table-4_current_strengths" not in workbook.sheetnames:
             return False  # Table 4 not in this file
 
-        ws = wb["table-4_current_strengths"]
-
         # Find the Table 4 placeholder specifically
         placeholder = "[[table-4_current_strengths]]"
         placeholder_paragraph = None
@@ -4402,11 +5412,7 @@ def process_table_4_special(doc, excel_file_path):
             return False
 
         # Get all data from the Table 4 sheet
-        all_data = []
-        for row in ws.iter_rows(values_only=True):
-            row_data = [str(cell) if cell is not None else "" for cell in row]
-            if any(cell.strip() for cell in row_data if cell):
-                all_data.append(row_data)
+        all_data = workbook.text_rows("table-4_current_strengths")
 
         if not all_data:
             print("⚠️ No data in Table 4 sheet")
@@ -4415,21 +5421,8 @@ def process_table_4_special(doc, excel_file_path):
         # Clear placeholder
         placeholder_paragraph.clear()
 
-        # Create table with content
-        table_content = []
-
-        # Add header row
-        if all_data:
-            header_row = all_data[0]
-            # Clean up header row
-            cleaned_header = [cell.strip() for cell in header_row if cell.strip()]
-            table_content.append(cleaned_header)
-
-        # Add data rows
-        for row in all_data[1:]:
-            cleaned_row = [cell.strip() for cell in row if cell.strip()]
-            if any(cleaned_row):  # Only add non-empty rows
-                table_content.append(cleaned_row)
+        # Header and data rows: non-empty cells only
+        table_content = workbook.packed_rows("table-4_current_strengths")
 
         # Create the table
         num_rows = len(table_content)
@@ -4439,15 +5432,8 @@ def process_table_4_special(doc, excel_file_path):
             print("⚠️ No valid data in Table 4 after cleaning")
             return False
 
-        table = doc.add_table(rows=num_rows, cols=num_cols)
-
-        # Position table
-        title_element = placeholder_paragraph._element
-        table_element = table._element
-        title_element.addnext(table_element)
-
-        # Apply the special Table 4 formatting
-        format_table_4_green_header_white_text(table, table_content)
+        # Create the table right after the placeholder with the special Table 4 formatting
+        splice_table(placeholder_paragraph, table_content, table_4_style(num_cols))
 
         print("✅ Table 4 created with green header and white text")
         return True
@@ -4457,107 +5443,20 @@ def process_table_4_special(doc, excel_file_path):
         return False
 
 
-def format_table_4_green_header_white_text(table, table_content):
-    """Format Table 4 with green header background and white text"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        # Set column width to full page width for single column tables
-        if len(table.columns) == 1:
-            table.columns[0].width = Inches(6.0)
-        else:
-            # For multi-column tables, distribute evenly
-            total_width = Inches(6.0)
-            col_width = total_width / len(table.columns)
-            for col in table.columns:
-                col.width = col_width
-
-        # EXACT BORDERS - Full grid with thin black lines
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
-
-        # Apply exact borders
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # Populate table and apply formatting
-        for row_idx, row_data in enumerate(table_content):
-            for col_idx, cell_text in enumerate(row_data):
-                if col_idx < len(table.columns):
-                    cell = table.cell(row_idx, col_idx)
-                    if cell.paragraphs:
-                        paragraph = cell.paragraphs[0]
-                        paragraph.clear()
-
-                        # HEADER ROW - GREEN BACKGROUND WITH WHITE TEXT
-                        if row_idx == 0:
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(12)
-                            run.bold = True
-                            run.font.color.rgb = RGBColor(255, 255, 255)  # WHITE TEXT
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                            # Green background #397b21
-                            tcPr = cell._tc.get_or_add_tcPr()
-                            shading = parse_xml(
-                                r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#397b21" w:val="clear"/>')
-                            tcPr.append(shading)
-
-                        # DATA ROWS - REGULAR FORMATTING
-                        else:
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(12)
-                            run.bold = False
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                        # PROPER CELL PADDING
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        tcMar = parse_xml(
-                            r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                            r'<w:top w:w="40" w:type="dxa"/>'
-                            r'<w:left w:w="40" w:type="dxa"/>'
-                            r'<w:bottom w:w="40" w:type="dxa"/>'
-                            r'<w:right w:w="40" w:type="dxa"/>'
-                            r'</w:tcMar>')
-                        tcPr.append(tcMar)
-
-        # Set table to not break across pages
-        tblPr = table._tbl.tblPr
-        tblLayout = parse_xml(
-            r'<w:tblLayout xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="fixed"/>')
-        tblPr.append(tblLayout)
+def table_4_style(num_cols):
+    """Table 4 at full page width with green header background and white text"""
+    return TableStyle("Report Table 4", even_table_widths(num_cols), border_size=2, margin=40, size=12,
+                      header_color="FFFFFF", header_fill="#397b21")
 
-    except Exception as e:
-        print(f"⚠️ Error formatting Table 4 with green header: {e}")
 
-
-def process_table_5_special(doc, excel_file_path):
+def process_table_5_special(doc, workbook):
     """Special processing ONLY for Table 5 to create the EXACT format from the image"""
     try:
-        wb = load_workbook(excel_file_path)
+        workbook = workbook_model(workbook)
 
-        if "table-5_development_actions" not in wb.sheetnames:
+        if "table-5_development_actions" not in workbook.sheetnames:
             return False  # Table 5 not in this file
 
-        ws = wb["table-5_development_actions"]
-
         # Find the Table 5 placeholder specifically
         placeholder = "[[table-5_development_actions]]"
         placeholder_paragraph = None
@@ -4593,16 +5492,8 @@ def process_table_5_special(doc, excel_file_path):
              "", ""]
         ]
 
-        # Create the table with exact number of rows
-        table = doc.add_table(rows=len(table_content), cols=4)
-
-        # Position table
-        title_element = placeholder_paragraph._element
-        table_element = table._element
-        title_element.addnext(table_element)
-
-        # Apply the EXACT Table 5 formatting from image
-        format_table_5_exact_image_format(table, table_content)
+        # Create the table right after the placeholder with the EXACT Table 5 formatting from image
+        splice_table(placeholder_paragraph, table_content, TABLE_5_STYLE)
 
         print("✅ Table 5 created with EXACT image formatting")
         return True
@@ -4614,152 +5505,31 @@ def process_table_5_special(doc, excel_file_path):
         return False
 
 
-def format_table_5_exact_image_format(table, table_content):
-    """Format Table 5 EXACTLY like the reference image with precise styling and colors"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        # Set EXACT column widths from image
-        table.columns[0].width = Inches(2.8)  # Capacity Development Action
-        table.columns[1].width = Inches(1.8)  # Decision Trigger
-        table.columns[2].width = Inches(1.4)  # Type & Lead
-        table.columns[3].width = Inches(0.8)  # Timing
-
-        # EXACT BORDERS - Thin black lines all around
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
-
-        # Apply exact borders
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # Apply formatting row by row
-        for row_idx, row_data in enumerate(table_content):
-            for col_idx, cell_text in enumerate(row_data):
-                if col_idx < len(table.columns):
-                    cell = table.cell(row_idx, col_idx)
-
-                    # Clear existing content
-                    if cell.paragraphs:
-                        for paragraph in cell.paragraphs:
-                            paragraph.clear()
-
-                    paragraph = cell.paragraphs[0]
-
-                    # HEADER ROW - DARK GREEN BACKGROUND WITH WHITE TEXT (EXACTLY like your image)
-                    if row_idx == 0:
-                        run = paragraph.add_run(cell_text)
-                        run.font.name = "Calibri"
-                        run.font.size = Pt(11)
-                        run.bold = True
-                        run.font.color.rgb = RGBColor(255, 255, 255)  # WHITE TEXT
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                        # DARK GREEN background - exactly like your image #2E5A1C
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        shading = parse_xml(
-                            r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#186a23" w:val="clear"/>')
-                        tcPr.append(shading)
-
-                    # SECTION HEADER ROW - "Short term" with MEDIUM GREEN BACKGROUND
-                    elif row_idx == 1:  # "Short term" row
-                        run = paragraph.add_run(cell_text)
-                        run.font.name = "Calibri"
-                        run.font.size = Pt(10)
-                        run.bold = True
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                        # MEDIUM GREEN background for section header #4A7C2A
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        shading = parse_xml(
-                            r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#8dd772" w:val="clear"/>')
-                        tcPr.append(shading)
-
-                    # SUB-SECTION ROW - "Senior leadership..." with LIGHT GREEN BACKGROUND
-                    elif row_idx == 2:  # ONLY "Senior leadership..." row has color
-                        run = paragraph.add_run(cell_text)
-                        run.font.name = "Calibri"
-                        run.font.size = Pt(9)
-                        run.bold = True  # Bold text for sub-section header
-                        run.font.color.rgb = RGBColor(0, 0, 0)  # BLACK TEXT
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                        # LIGHT GREEN background for sub-section header #E6F4D7
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        shading = parse_xml(
-                            r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#c0efc6" w:val="clear"/>')
-                        tcPr.append(shading)
-
-                    # DATA ROWS - Regular formatting (rows 3, 4, 5, 6) - NO COLOR
-                    else:
-                        run = paragraph.add_run(cell_text)
-                        run.font.name = "Calibri"
-                        run.font.size = Pt(9)
-                        run.bold = False
-                        run.font.color.rgb = RGBColor(0, 0, 0)  # BLACK TEXT
-
-                        # Alignment based on column
-                        if col_idx in [2, 3]:  # Type & Lead and Timing columns - center aligned
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        else:  # Capacity Development Action and Decision Trigger - left aligned
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+def table_5_cell_format(row_idx, col_idx, row):
+    """Table 5: only the "Short term" and "Senior leadership..." rows below the header have colors"""
+    if row_idx == 1:  # SECTION HEADER ROW - "Short term" with MEDIUM GREEN BACKGROUND
+        return {"size": 10, "bold": True, "color": None, "align": "left", "fill": "#8dd772"}
+    if row_idx == 2:  # SUB-SECTION ROW - "Senior leadership..." with LIGHT GREEN BACKGROUND
+        return {"bold": True, "align": "left", "fill": "#c0efc6"}
+    if row_idx > 2 and row_idx % 2 == 0:  # Even data rows - white background
+        return {"fill": "#FFFFFF"}
+    return None
 
-                        # Very subtle alternate row coloring for data rows (optional)
-                        if row_idx % 2 == 0:  # Even data rows
-                            tcPr = cell._tc.get_or_add_tcPr()
-                            shading = parse_xml(
-                                r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#FFFFFF" w:val="clear"/>')  # White background
-                            tcPr.append(shading)
-
-                    # PROPER CELL PADDING
-                    tcPr = cell._tc.get_or_add_tcPr()
-                    tcMar = parse_xml(
-                        r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                        r'<w:top w:w="50" w:type="dxa"/>'
-                        r'<w:left w:w="50" w:type="dxa"/>'
-                        r'<w:bottom w:w="50" w:type="dxa"/>'
-                        r'<w:right w:w="50" w:type="dxa"/>'
-                        r'</w:tcMar>')
-                    tcPr.append(tcMar)
-
-        # Set table to not break across pages
-        tblPr = table._tbl.tblPr
-        tblLayout = parse_xml(
-            r'<w:tblLayout xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="fixed"/>')
-        tblPr.append(tblLayout)
-
-        print("✅ Table 5 formatted EXACTLY like reference image - only first 3 rows have colors")
 
-    except Exception as e:
-        print(f"⚠️ Error formatting Table 5 exact image format: {e}")
-        import traceback
-        print(traceback.format_exc())
+# Capacity Development Action | Decision Trigger | Type & Lead | Timing, DARK GREEN header with WHITE text
+TABLE_5_STYLE = TableStyle("Report Table 5", [Inches(2.8), Inches(1.8), Inches(1.4), Inches(0.8)],
+                           border_size=2, margin=50, size=9, color="000000", align=["left", "left", "center", "center"],
+                           header_size=11, header_color="FFFFFF", header_fill="#186a23", header_align="left",
+                           cell_format=table_5_cell_format)
 
-def process_table_7_special(doc, excel_file_path):
+def process_table_7_special(doc, workbook):
     """Special processing ONLY for Table 7 to create the exact monitoring table format"""
     try:
-        wb = load_workbook(excel_file_path)
+        workbook = workbook_model(workbook)
 
-        if "table-7_monitoring" not in wb.sheetnames:
+        if "table-7_monitoring" not in workbook.sheetnames:
             return False  # Table 7 not in this file
 
-        ws = wb["table-7_monitoring"]
-
         # Find the Table 7 placeholder specifically
         placeholder = "[[table-7_monitoring]]"
         placeholder_paragraph = None
@@ -4774,11 +5544,7 @@ def process_table_7_special(doc, excel_file_path):
             return False
 
         # Get all data from the Table 7 sheet
-        all_data = []
-        for row in ws.iter_rows(values_only=True):
-            row_data = [str(cell) if cell is not None else "" for cell in row]
-            if any(cell.strip() for cell in row_data if cell):
-                all_data.append(row_data)
+        all_data = workbook.text_rows("table-7_monitoring")
 
         if not all_data:
             print("⚠️ No data in Table 7 sheet")
@@ -4787,45 +5553,18 @@ def process_table_7_special(doc, excel_file_path):
         # Clear placeholder
         placeholder_paragraph.clear()
 
-        # Create table content with proper structure
-        table_content = []
-
-        # Add header row
-        if all_data:
-            header_row = all_data[0]
-            # Clean up header row - ensure we have exactly 3 columns
-            cleaned_header = [cell.strip() for cell in header_row if cell.strip()]
-            # Make sure we have exactly 3 columns for the table structure
-            while len(cleaned_header) < 3:
-                cleaned_header.append("")
-            table_content.append(cleaned_header[:3])  # Take only first 3 columns
-
-        # Add data rows
-        for row in all_data[1:]:
-            cleaned_row = [cell.strip() for cell in row if cell.strip()]
-            # Ensure each row has exactly 3 columns
-            while len(cleaned_row) < 3:
-                cleaned_row.append("")
-            if any(cleaned_row):  # Only add non-empty rows
-                table_content.append(cleaned_row[:3])  # Take only first 3 columns
+        # Header and data rows: non-empty cells only, exactly 3 columns each
+        table_content = workbook.packed_rows("table-7_monitoring", width=3)
 
         # Create the table
         num_rows = len(table_content)
-        num_cols = 3  # Fixed 3 columns for Table 7
 
         if num_rows == 0:
             print("⚠️ No valid data in Table 7 after cleaning")
             return False
 
-        table = doc.add_table(rows=num_rows, cols=num_cols)
-
-        # Position table
-        title_element = placeholder_paragraph._element
-        table_element = table._element
-        title_element.addnext(table_element)
-
-        # Apply the special Table 7 formatting
-        format_table_7_monitoring_exact(table, table_content)
+        # Create the table right after the placeholder with the special Table 7 formatting
+        splice_table(placeholder_paragraph, table_content, TABLE_7_STYLE)
 
         print("✅ Table 7 created with exact monitoring table formatting")
         return True
@@ -4837,119 +5576,33 @@ def process_table_7_special(doc, excel_file_path):
         return False
 
 
-def format_table_7_monitoring_exact(table, table_content):
-    """Format Table 7 exactly like the reference monitoring table"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        # Set EXACT column widths from reference image
-        table.columns[0].width = Inches(2.0)  # Process column
-        table.columns[1].width = Inches(2.0)  # Frequency column
-        table.columns[2].width = Inches(2.0)  # Responsible Party column
-
-        # EXACT BORDERS - Thin black lines all around
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
-
-        # Apply exact borders - thin black lines all around
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # Populate table and apply formatting
-        for row_idx, row_data in enumerate(table_content):
-            for col_idx, cell_text in enumerate(row_data):
-                if col_idx < len(table.columns):
-                    cell = table.cell(row_idx, col_idx)
-                    if cell.paragraphs:
-                        paragraph = cell.paragraphs[0]
-                        paragraph.clear()
-
-                        # HEADER ROW - DARK GREEN BACKGROUND WITH WHITE TEXT
-                        if row_idx == 0:
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(11)
-                            run.bold = True
-                            run.font.color.rgb = RGBColor(255, 255, 255)  # WHITE TEXT
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                            # Dark green background - exactly like reference #397b21
-                            tcPr = cell._tc.get_or_add_tcPr()
-                            shading = parse_xml(
-                                r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#0B4B6C" w:val="clear"/>')
-                            tcPr.append(shading)
-
-                        # DATA ROWS - REGULAR FORMATTING
-                        else:
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(10)
-                            run.bold = False
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+def table_7_cell_format(row_idx, col_idx, row):
+    """Table 7: alternate row coloring for better readability"""
+    if row_idx % 2 == 1:  # Odd rows (after header)
+        return {"fill": "#f9f9f9"}
+    return None
 
-                            # Alternate row coloring for better readability
-                            if row_idx % 2 == 1:  # Odd rows (after header)
-                                tcPr = cell._tc.get_or_add_tcPr()
-                                shading = parse_xml(
-                                    r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#f9f9f9" w:val="clear"/>')
-                                tcPr.append(shading)
-
-                        # PROPER CELL PADDING - minimal padding like reference
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        tcMar = parse_xml(
-                            r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                            r'<w:top w:w="50" w:type="dxa"/>'
-                            r'<w:left w:w="50" w:type="dxa"/>'
-                            r'<w:bottom w:w="50" w:type="dxa"/>'
-                            r'<w:right w:w="50" w:type="dxa"/>'
-                            r'</w:tcMar>')
-                        tcPr.append(tcMar)
-
-        # Set table to not break across pages
-        tblPr = table._tbl.tblPr
-        tblLayout = parse_xml(
-            r'<w:tblLayout xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="fixed"/>')
-        tblPr.append(tblLayout)
-
-        print("✅ Table 7 formatted exactly like reference monitoring table")
 
-    except Exception as e:
-        print(f"⚠️ Error formatting Table 7 monitoring exact: {e}")
-        import traceback
-        print(traceback.format_exc())
+# Process | Frequency | Responsible Party, DARK BLUE header with WHITE text
+TABLE_7_STYLE = TableStyle("Report Table 7", [Inches(2.0), Inches(2.0), Inches(2.0)], border_size=2, margin=50, size=10,
+                           header_size=11, header_color="FFFFFF", header_fill="#0B4B6C",
+                           cell_format=table_7_cell_format)
 
 
-def process_table_A2_special(doc, excel_file_path):
+def process_table_A2_special(doc, workbook):
     """Special processing ONLY for Table A2 to create the exact hazards table format"""
     try:
-        print(f"🚀 STARTING Table A2 processing for: {os.path.basename(excel_file_path)}")
-
-        wb = load_workbook(excel_file_path)
+        workbook = workbook_model(workbook)
+        print(f"🚀 STARTING Table A2 processing for: {workbook.name}")
 
         # Debug: Print all available sheets
-        print(f"📊 Available sheets: {wb.sheetnames}")
+        print(f"📊 Available sheets: {workbook.sheetnames}")
 
         # Use the exact sheet name
-        if "table-A2_hazards" not in wb.sheetnames:
-            print(f"❌ Sheet 'table-A2_hazards' not found. Available: {wb.sheetnames}")
+        if "table-A2_hazards" not in workbook.sheetnames:
+            print(f"❌ Sheet 'table-A2_hazards' not found. Available: {workbook.sheetnames}")
             return False
 
-        ws = wb["table-A2_hazards"]
         print(f"✅ Found sheet: table-A2_hazards")
 
         # Find the Table A2 placeholder
@@ -4962,11 +5615,7 @@ def process_table_A2_special(doc, excel_file_path):
                 placeholder_found = True
 
                 # Get all data from the sheet
-                all_data = []
-                for row in ws.iter_rows(values_only=True):
-                    row_data = [str(cell) if cell is not None else "" for cell in row]
-                    if any(cell.strip() for cell in row_data if cell):
-                        all_data.append(row_data)
+                all_data = workbook.text_rows("table-A2_hazards")
 
                 if not all_data:
                     print("⚠️ No data in Table A2 sheet")
@@ -4977,40 +5626,23 @@ def process_table_A2_special(doc, excel_file_path):
                 # Clear placeholder and create table
                 paragraph.clear()
 
-                # Create table with headers exactly like reference
-                table_content = [
-                    ["Environment Agency", "EA/Gov.UK", "Met Office", "MunichRe", "Bespoke enquiry"]
-                ]
-
-                # Add data rows
-                for row in all_data[1:]:  # Skip header row
-                    cleaned_row = []
-                    for cell_value in row:
-                        if cell_value and cell_value.strip():
-                            cleaned_value = cell_value.strip()
-                            if cleaned_value.lower() in ["yes", "y", "true", "1"]:
-                                cleaned_value = "Yes"
-                            elif cleaned_value.lower() in ["na", "n/a", "not applicable"]:
-                                cleaned_value = "NA"
-                            cleaned_row.append(cleaned_value)
-                        else:
-                            cleaned_row.append("")
-
-                    while len(cleaned_row) < 5:
-                        cleaned_row.append("")
-
-                    if any(cleaned_row):
-                        table_content.append(cleaned_row[:5])
-
-                print(f"📋 Final table: {len(table_content)} rows")
-
-                # Create and format table
-                table = doc.add_table(rows=len(table_content), cols=5)
-                title_element = paragraph._element
-                table_element = table._element
-                title_element.addnext(table_element)
-
-                format_table_A2_exact_hazards(table, table_content)
+                # Header exactly like reference, then the cleaned data rows streamed into the table
+                header = ["Environment Agency", "EA/Gov.UK", "Met Office", "MunichRe", "Bespoke enquiry"]
+                counts = {"rows": 1, "highlighted": 0}
+
+                def data_rows():
+                    for row in all_data[1:]:  # Skip header row
+                        cleaned_row = table_A2_row(row)
+                        if cleaned_row:
+                            counts["rows"] += 1
+                            counts["highlighted"] += sum("Yes" in cell for cell in cleaned_row)
+                            yield cleaned_row
+
+                # Create and format table; very long hazard registers continue in a new table
+                tables = stream_table(paragraph, chain([header], data_rows()), TABLE_A2_STYLE,
+                                      split_rows=SHEET_TABLE_SPLIT_ROWS)
+                print(f"📋 Final table: {counts['rows']} rows in {len(tables)} table(s)")
+                print(f"🎨 Applied YELLOW background to {counts['highlighted']} cells")
                 print("✅ Table A2 successfully created!")
                 return True
 
@@ -5025,125 +5657,38 @@ def process_table_A2_special(doc, excel_file_path):
         return False
 
 
-def format_table_A2_exact_hazards(table, table_content):
-    """Format Table A2 exactly like the reference hazards table with yellow highlights"""
-    try:
-        # Remove any existing table style
-        table.style = None
-        table.autofit = False
-
-        # Set EXACT column widths from your reference image
-        table.columns[0].width = Inches(2.8)  # Environment Agency (hazard names) - widest
-        table.columns[1].width = Inches(0.7)  # EA/Gov.UK
-        table.columns[2].width = Inches(0.7)  # Met Office
-        table.columns[3].width = Inches(0.7)  # MunichRe
-        table.columns[4].width = Inches(0.7)  # Bespoke enquiry
-
-        # EXACT BORDERS - Thin black lines all around
-        tbl = table._tbl
-        tblPr = tbl.tblPr
-
-        # Remove any existing borders
-        for elem in tblPr:
-            if 'tblBorders' in elem.tag:
-                tblPr.remove(elem)
-                break
+def table_A2_row(row):
+    """One Table A2 data row: 5 stripped cells with yes / NA answers normalised, or None if empty"""
+    cleaned_row = []
+    for cell_value in row:
+        if cell_value and cell_value.strip():
+            cleaned_value = cell_value.strip()
+            if cleaned_value.lower() in ["yes", "y", "true", "1"]:
+                cleaned_value = "Yes"
+            elif cleaned_value.lower() in ["na", "n/a", "not applicable"]:
+                cleaned_value = "NA"
+            cleaned_row.append(cleaned_value)
+        else:
+            cleaned_row.append("")
 
-        # Apply exact borders - thin black lines all around
-        tblBorders = parse_xml(r'<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                               r'<w:top w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:left w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:bottom w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:right w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideH w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'<w:insideV w:val="single" w:sz="2" w:space="0" w:color="000000"/>'
-                               r'</w:tblBorders>')
-        tblPr.append(tblBorders)
-
-        # Populate table and apply EXACT formatting like your reference
-        for row_idx, row_data in enumerate(table_content):
-            for col_idx, cell_text in enumerate(row_data):
-                if col_idx < len(table.columns):
-                    cell = table.cell(row_idx, col_idx)
-                    if cell.paragraphs:
-                        paragraph = cell.paragraphs[0]
-                        paragraph.clear()
-
-                        # HEADER ROW - LIGHT GREY BACKGROUND WITH BLACK TEXT (EXACTLY like reference)
-                        if row_idx == 0:
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(11)
-                            run.bold = True
-                            run.font.color.rgb = RGBColor(0, 0, 0)  # BLACK TEXT
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-                            # LIGHT GREY background - EXACTLY like your reference #F0F0F0
-                            tcPr = cell._tc.get_or_add_tcPr()
-                            shading = parse_xml(
-                                r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#F0F0F0" w:val="clear"/>')
-                            tcPr.append(shading)
-                            print(f"🎨 Applied LIGHT GREY header background to cell [{row_idx},{col_idx}]")
-
-                        # DATA ROWS - EXACT formatting like reference with YELLOW backgrounds
-                        else:
-                            run = paragraph.add_run(cell_text)
-                            run.font.name = "Calibri"
-                            run.font.size = Pt(10)
-                            run.bold = False
-
-                            # Center align all data cells EXCEPT first column
-                            if col_idx == 0:  # First column - hazard names (LEFT aligned)
-                                paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                            else:  # All other columns - CENTER aligned
-                                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-                            # ✅ YELLOW BACKGROUND for cells with "Yes" OR "Yes - Heat" (like your reference image)
-                            if cell_text == "Yes" or "Yes" in cell_text:
-                                tcPr = cell._tc.get_or_add_tcPr()
-                                shading = parse_xml(
-                                    r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#FFFF00" w:val="clear"/>')
-                                tcPr.append(shading)
-                                print(f"🎨 Applied YELLOW background to cell [{row_idx},{col_idx}]: '{cell_text}'")
-
-                            # ✅ LIGHT GRAY BACKGROUND for "NA" cells
-                            elif cell_text == "NA":
-                                tcPr = cell._tc.get_or_add_tcPr()
-                                shading = parse_xml(
-                                    r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#FFFFFF" w:val="clear"/>')
-                                tcPr.append(shading)
-                                print(f"🎨 Applied GRAY background to cell [{row_idx},{col_idx}]: '{cell_text}'")
-
-                            # ✅ WHITE BACKGROUND for empty cells and regular text
-                            else:
-                                tcPr = cell._tc.get_or_add_tcPr()
-                                shading = parse_xml(
-                                    r'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="#FFFFFF" w:val="clear"/>')
-                                tcPr.append(shading)
-
-                        # PROPER CELL PADDING
-                        tcPr = cell._tc.get_or_add_tcPr()
-                        tcMar = parse_xml(
-                            r'<w:tcMar xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
-                            r'<w:top w:w="40" w:type="dxa"/>'
-                            r'<w:left w:w="40" w:type="dxa"/>'
-                            r'<w:bottom w:w="40" w:type="dxa"/>'
-                            r'<w:right w:w="40" w:type="dxa"/>'
-                            r'</w:tcMar>')
-                        tcPr.append(tcMar)
-
-        # Set table to not break across pages
-        tblPr = table._tbl.tblPr
-        tblLayout = parse_xml(
-            r'<w:tblLayout xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:type="fixed"/>')
-        tblPr.append(tblLayout)
-
-        print("✅ Table A2 formatted EXACTLY like reference hazards table with LIGHT GREY header and YELLOW highlights")
+    while len(cleaned_row) < 5:
+        cleaned_row.append("")
 
-    except Exception as e:
-        print(f"⚠️ Error formatting Table A2 exact hazards: {e}")
-        import traceback
-        print(traceback.format_exc())
+    return cleaned_row[:5] if any(cleaned_row) else None
+
+
+def table_A2_cell_format(row_idx, col_idx, row):
+    """Table A2: YELLOW background for "Yes" / "Yes - Heat" cells, WHITE for everything else"""
+    if row_idx == 0:
+        return None
+    return {"fill": "#FFFF00" if "Yes" in row[col_idx] else "#FFFFFF"}
+
+
+# Hazard names (widest, left aligned) then 4 centred source columns, LIGHT GREY header with BLACK text
+TABLE_A2_STYLE = TableStyle("Report Table A2", [Inches(2.8), Inches(0.7), Inches(0.7), Inches(0.7), Inches(0.7)],
+                            border_size=2, margin=40, size=10, align=["left", "center", "center", "center", "center"],
+                            header_size=11, header_color="000000", header_fill="#F0F0F0", header_align="center",
+                            cell_format=table_A2_cell_format)
 
 def create_pdf_table_title(doc, title_text):
     """Create table titles that match EXACT PDF style"""
@@ -5180,15 +5725,15 @@ def debug_excel_sheet(ws, sheet_name):
     return all_data
 
 
-def insert_excel_table_data(doc, excel_file_path):
-    """Insert all Excel sheet tables with EXACT PDF formatting"""
-    if not excel_file_path or not os.path.exists(excel_file_path):
-        print("⚠️ Excel file not found")
-        return False
+def insert_excel_table_data(doc, workbook):
+    """Insert all Excel sheet tables with EXACT PDF formatting (workbook: WorkbookModel or file path)"""
+    if not isinstance(workbook, WorkbookModel):
+        workbook = load_workbook_model(workbook)
+        if workbook is None:
+            return False
 
     try:
-        wb = load_workbook(excel_file_path)
-        print(f"📊 Found {len(wb.sheetnames)} sheets: {wb.sheetnames}")
+        print(f"📊 Found {len(workbook.sheetnames)} sheets: {workbook.sheetnames}")
 
         # EXACT placeholder mapping from your document
         sheet_to_placeholder_map = {
@@ -5207,7 +5752,7 @@ def insert_excel_table_data(doc, excel_file_path):
 
         processed_sheets = set()
 
-        for sheet_name in wb.sheetnames:
+        for sheet_name in workbook.sheetnames:
             if sheet_name not in sheet_to_placeholder_map:
                 continue
 
@@ -5230,67 +5775,11 @@ def insert_excel_table_data(doc, excel_file_path):
                 print(f"⚠️ Placeholder not found: {placeholder}")
                 continue
 
-            # Process sheet data with IMPROVED cleaning
-            ws = wb[sheet_name]
-            all_data = []
-
-            # Get all data with BETTER empty cell handling
-            for row in ws.iter_rows(values_only=True):
-                row_data = []
-                has_data = False
-                for cell in row:
-                    if cell is None:
-                        cell_value = ""
-                    else:
-                        cell_value = str(cell).strip()
-                        if cell_value:  # Only mark as data if not empty after strip
-                            has_data = True
-                    row_data.append(cell_value)
-
-                # Only add row if it has actual data (not just empty strings)
-                if has_data:
-                    all_data.append(row_data)
-
-            if not all_data:
-                print(f"ℹ️ No data in: {sheet_name}")
-                continue
-
-            # IMPROVED: Clean data - remove empty columns from BOTH ends
-            if all_data:
-                # Find first and last non-empty columns
-                first_non_empty_col = None
-                last_non_empty_col = 0
-
-                for row in all_data:
-                    for col_idx, val in enumerate(row):
-                        if val and val.strip():  # Cell has content
-                            if first_non_empty_col is None or col_idx < first_non_empty_col:
-                                first_non_empty_col = col_idx
-                            if col_idx > last_non_empty_col:
-                                last_non_empty_col = col_idx
-
-                # If no non-empty columns found, skip this sheet
-                if first_non_empty_col is None:
-                    print(f"⚠️ No data content found in: {sheet_name}")
-                    continue
-
-                # Trim columns from both sides
-                cleaned_data = []
-                for row in all_data:
-                    # Only include columns from first_non_empty_col to last_non_empty_col
-                    trimmed_row = row[first_non_empty_col:last_non_empty_col + 1]
-                    cleaned_data.append(trimmed_row)
-            else:
-                cleaned_data = all_data
-
-            # Final cleanup: remove any rows that are completely empty after column trimming
-            final_data = []
-            for row in cleaned_data:
-                if any(cell.strip() for cell in row if cell):
-                    final_data.append(row)
+            # Sheet data with IMPROVED cleaning: stripped, data rows only, empty columns trimmed from BOTH ends
+            final_data = workbook.trimmed_rows(sheet_name)
 
             if not final_data:
-                print(f"⚠️ No valid data after cleaning in: {sheet_name}")
+                print(f"ℹ️ No data in: {sheet_name}")
                 continue
 
             actual_rows = len(final_data)
@@ -5304,39 +5793,11 @@ def insert_excel_table_data(doc, excel_file_path):
                 # Clear placeholder completely
                 placeholder_paragraph.clear()
 
-                # Create table with EXACT PDF dimensions
-                table = doc.add_table(rows=actual_rows, cols=actual_cols)
-
-                # Position immediately after the cleared placeholder
-                title_element = placeholder_paragraph._element
-                table_element = table._element
-                title_element.addnext(table_element)
-
-                # Apply EXACT PDF formatting
-                format_table_exact_pdf(table, sheet_name)
-
-                # Populate table with EXACT PDF data formatting
-                for row_idx, row_data in enumerate(final_data):
-                    for col_idx in range(actual_cols):
-                        cell_value = row_data[col_idx] if col_idx < len(row_data) else ""
-                        if cell_value == "None":
-                            cell_value = ""
-
-                        cell = table.cell(row_idx, col_idx)
-                        if cell.paragraphs:
-                            paragraph = cell.paragraphs[0]
-                            paragraph.clear()
-
-                            run = paragraph.add_run(cell_value)
-                            run.font.name = "Calibri"
-
-                            # EXACT PDF header vs data formatting
-                            if row_idx == 0:
-                                run.bold = True
-                                run.font.size = Pt(12)
-                            else:
-                                run.font.size = Pt(12)
-                                run.bold = False
+                # Stream the rows into a table right after the cleared placeholder; very long
+                # sheets (e.g. the A5 monitoring matrix) continue in new tables with the header repeated
+                rows = (["" if value == "None" else value for value in row_data] for row_data in final_data)
+                stream_table(placeholder_paragraph, rows, exact_pdf_table_style(sheet_name, actual_cols),
+                             split_rows=SHEET_TABLE_SPLIT_ROWS)
 
                 processed_sheets.add(sheet_name)
                 print(f"✅ Inserted EXACT PDF table: {sheet_name}")
@@ -5353,18 +5814,18 @@ def insert_excel_table_data(doc, excel_file_path):
         return False
 
 
-def process_cadd_sheets_specifically(doc, excel_file_path):
-    """Special processing for CADD sheets to handle their specific structure"""
-    if not excel_file_path or not os.path.exists(excel_file_path):
-        return False
+def process_cadd_sheets_specifically(doc, workbook):
+    """Special processing for CADD sheets to handle their specific structure (workbook: WorkbookModel or file path)"""
+    if not isinstance(workbook, WorkbookModel):
+        workbook = load_workbook_model(workbook)
+        if workbook is None:
+            return False
 
     try:
-        wb = load_workbook(excel_file_path)
-
         cadd_sheets = ["cadd-1_current", "cadd-2_add"]
 
         for sheet_name in cadd_sheets:
-            if sheet_name not in wb.sheetnames:
+            if sheet_name not in workbook.sheetnames:
                 continue
 
             print(f"🔍 Processing CADD sheet: {sheet_name}")
@@ -5384,57 +5845,12 @@ def process_cadd_sheets_specifically(doc, excel_file_path):
                 print(f"⚠️ CADD placeholder not found: {placeholder}")
                 continue
 
-            # Process CADD sheet with specialized logic
-            ws = wb[sheet_name]
-            all_data = []
-
-            # Use the actual data range from Excel
-            for row in ws.iter_rows(values_only=True):
-                row_data = []
-                has_real_data = False
-                for cell in row:
-                    if cell is None:
-                        cell_value = ""
-                    else:
-                        cell_value = str(cell).strip()
-                        # Consider it real data if it's not empty and not just whitespace
-                        if cell_value and cell_value not in ["", "None", "nan"]:
-                            has_real_data = True
-                    row_data.append(cell_value)
-
-                if has_real_data:
-                    all_data.append(row_data)
-
-            if not all_data:
-                print(f"⚠️ No data in CADD sheet: {sheet_name}")
-                continue
-
-            # SPECIALIZED CLEANING FOR CADD TABLES
-            # Remove completely empty columns
-            non_empty_cols = set()
-            for row in all_data:
-                for col_idx, val in enumerate(row):
-                    if val and val.strip():
-                        non_empty_cols.add(col_idx)
-
-            if not non_empty_cols:
-                print(f"⚠️ No non-empty columns in CADD sheet: {sheet_name}")
-                continue
-
-            # Get min and max column indices
-            min_col = min(non_empty_cols)
-            max_col = max(non_empty_cols)
-
-            # Trim data to only non-empty columns
-            cleaned_data = []
-            for row in all_data:
-                trimmed_row = row[min_col:max_col + 1]
-                # Only add if the trimmed row has any content
-                if any(cell.strip() for cell in trimmed_row if cell):
-                    cleaned_data.append(trimmed_row)
+            # SPECIALIZED CLEANING FOR CADD TABLES: "None"/"nan" left by formulas is not real data,
+            # rows without real data are dropped and empty columns trimmed from both ends
+            cleaned_data = clean_table_rows(workbook.text_rows(sheet_name), blank=("None", "nan"))
 
             if not cleaned_data:
-                print(f"⚠️ No data after CADD cleaning: {sheet_name}")
+                print(f"⚠️ No data in CADD sheet: {sheet_name}")
                 continue
 
             actual_rows = len(cleaned_data)
@@ -5445,32 +5861,7 @@ def process_cadd_sheets_specifically(doc, excel_file_path):
             # Replace placeholder with table
             if placeholder_paragraph:
                 placeholder_paragraph.clear()
-                table = doc.add_table(rows=actual_rows, cols=actual_cols)
-
-                # Position table
-                title_element = placeholder_paragraph._element
-                table_element = table._element
-                title_element.addnext(table_element)
-
-                # Apply CADD-specific formatting
-                format_table_exact_pdf(table, sheet_name)
-
-                # Populate table
-                for row_idx, row_data in enumerate(cleaned_data):
-                    for col_idx in range(actual_cols):
-                        cell_value = row_data[col_idx] if col_idx < len(row_data) else ""
-                        cell = table.cell(row_idx, col_idx)
-                        if cell.paragraphs:
-                            paragraph = cell.paragraphs[0]
-                            paragraph.clear()
-                            run = paragraph.add_run(cell_value)
-                            run.font.name = "Calibri"
-                            if row_idx == 0:
-                                run.bold = True
-                                run.font.size = Pt(12)
-                            else:
-                                run.font.size = Pt(12)
-                                run.bold = False
+                splice_table(placeholder_paragraph, cleaned_data, exact_pdf_table_style(sheet_name, actual_cols))
 
                 print(f"✅ Successfully processed CADD sheet: {sheet_name}")
 
@@ -5640,6 +6031,7 @@ def add_excel_tables_at_end(doc, wb, excel_file_path):
 
 def insert_image_at_placeholder(doc, image_paths):
     """Insert multiple images at their appropriate locations based on figure references"""
+    paragraphs = get_document_index(doc)
     if not image_paths:
         return False
 
@@ -5670,7 +6062,7 @@ def insert_image_at_placeholder(doc, image_paths):
 
         # Search through all paragraphs to find where to insert the image
         insertion_index = None
-        for i, paragraph in enumerate(doc.paragraphs):
+        for i, paragraph in enumerate(paragraphs):
             if target_text in paragraph.text:
                 insertion_index = i
                 print(f"✅ Found position for {target_text} at paragraph {i}")
@@ -5679,7 +6071,7 @@ def insert_image_at_placeholder(doc, image_paths):
         if insertion_index is not None:
             try:
                 # Insert the image before the figure caption
-                image_para = doc.paragraphs[insertion_index].insert_paragraph_before()
+                image_para = paragraphs.insert_paragraph_before(insertion_index)
                 image_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
                 # Add image
@@ -5687,7 +6079,7 @@ def insert_image_at_placeholder(doc, image_paths):
                 run.add_picture(image_path, width=Inches(6.0))
 
                 # Add some spacing
-                doc.paragraphs[insertion_index].insert_paragraph_before()
+                paragraphs.insert_paragraph_before(insertion_index)
 
                 print(f"✅ Image inserted as {target_text}")
                 images_placed += 1
@@ -5695,7 +6087,7 @@ def insert_image_at_placeholder(doc, image_paths):
             except Exception as img_error:
                 print(f"⚠️ Error adding image {image_filename}: {img_error}")
                 # Add placeholder text if image can't be inserted
-                placeholder_para = doc.paragraphs[insertion_index].insert_paragraph_before()
+                placeholder_para = paragraphs.insert_paragraph_before(insertion_index)
                 placeholder_para.add_run(f"[Image: {image_filename}]")
                 images_placed += 1
         else:
@@ -5703,12 +6095,12 @@ def insert_image_at_placeholder(doc, image_paths):
 
             # Fallback: Add image at the end of the document with caption
             try:
-                doc.add_paragraph().add_run(f"Figure {figure_number}:").bold = True
-                image_para = doc.add_paragraph()
+                paragraphs.add_paragraph().add_run(f"Figure {figure_number}:").bold = True
+                image_para = paragraphs.add_paragraph()
                 image_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 run = image_para.add_run()
                 run.add_picture(image_path, width=Inches(6.0))
-                caption_para = doc.add_paragraph()
+                caption_para = paragraphs.add_paragraph()
                 caption_para.add_run(f"Figure {figure_number}: {image_filename}").italic = True
                 caption_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 images_placed += 1
@@ -6491,13 +6883,9 @@ def replace_logo_with_text(doc, placeholder, text, alignment):
 
 def generate_missing_content_with_gemini(missing_field, context_data):
     """Generate missing content using Gemini AI"""
-    if not GEMINI_API_KEY or not AVAILABLE_GEMINI_MODEL:
+    if not gemini_client.is_configured():
         return f"Content for {missing_field} would be generated here."
 
-    model_name = AVAILABLE_GEMINI_MODEL['name']
-    api_version = AVAILABLE_GEMINI_MODEL['version']
-    api_url = f"https://generativelanguage.googleapis.com/{api_version}/{model_name}:generateContent?key={GEMINI_API_KEY}"
-
     prompt = f"""
     Generate professional content for a climate change adaptation plan report.
 
@@ -6508,64 +6896,27 @@ def generate_missing_content_with_gemini(missing_field, context_data):
     Location: {context_data.get('client_location', 'Unknown')}
     Industry: {context_data.get('Industry-1', 'Unknown')} and {context_data.get('Industry-2', 'Unknown')}
 
-    Please generate appropriate, professional content that would fit in a climate adaptation report for this field.
-    Keep it concise and relevant to the context.
-    """
-
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.7,
-            "maxOutputTokens": 500,
-        }
-    }
-
-    try:
-        resp = requests.post(api_url, json=payload, timeout=60)
-        if resp.status_code == 200:
-            result = resp.json()
-            if 'candidates' in result and result['candidates']:
-                text_response = result['candidates'][0]['content']['parts'][0]['text']
-                return text_response.strip()
-        return f"AI-generated content for {missing_field}."
-    except Exception as e:
-        print(f"⚠️ Gemini generation failed: {e}")
-        return f"Content for {missing_field}."
-
-
-def generate_content_with_gemini_with_retry(prompt, max_retries=3, base_delay=2):
-    """Generate content with retry logic for rate limits"""
-    for attempt in range(max_retries):
-        try:
-            # Apply rate limiting before each attempt
-            if 'gemini_rate_limiter' in globals():
-                gemini_rate_limiter.wait_if_needed()
-
-            print(f"🤖 Gemini attempt {attempt + 1}/{max_retries}...")
-            result = generate_content_with_gemini_proper_bullets(prompt)
-
-            if result and len(result.strip()) > 50:
-                return result
-
-            # If we got here, either Gemini failed or returned short content
-            if attempt < max_retries - 1:  # Don't sleep on last attempt
-                delay = base_delay * (2 ** attempt)  # Exponential backoff
-                print(f"⚠️ Gemini attempt {attempt + 1} failed, retrying in {delay} seconds...")
-                time.sleep(delay)
+    Please generate appropriate, professional content that would fit in a climate adaptation report for this field.
+    Keep it concise and relevant to the context.
+    """
 
-        except Exception as e:
-            if attempt < max_retries - 1:
-                delay = base_delay * (2 ** attempt)
-                print(f"⚠️ Gemini error on attempt {attempt + 1}: {e}, retrying in {delay} seconds...")
-                time.sleep(delay)
-            else:
-                print(f"❌ Gemini failed after {max_retries} attempts: {e}")
+    try:
+        text_response = gemini_client.generate(prompt, temperature=0.7, max_output_tokens=500,
+                                               label=f"missing:{missing_field}")
+        return text_response.strip()
+    except GeminiError as e:
+        print(f"⚠️ Gemini generation failed ({e.kind}): {e}")
+        return f"AI-generated content for {missing_field}."
 
-    return None
 
+def generate_narrative_with_tiered_fallbacks(narrative_key, prompt, context_data, max_retries=5, budget=None):
+    """Try multiple sources before giving up
 
-def generate_narrative_with_tiered_fallbacks(narrative_key, prompt, context_data, max_retries=5):
-    """Try multiple sources before giving up"""
+    Gemini attempts stop as soon as the budget (default: a fresh NARRATIVE_REPORT_BUDGET) is
+    spent or the shared circuit breaker is open.
+    """
+    if budget is None:
+        budget = GenerationBudget()
     print(f"🎯 Tiered generation for: {narrative_key}")
 
     # --- TIER 1: Check Cache First (Fastest) ---
@@ -6577,11 +6928,13 @@ def generate_narrative_with_tiered_fallbacks(narrative_key, prompt, context_data
     # --- TIER 2: Gemini AI (Primary) with aggressive retry ---
     print(f"   🔄 Trying Gemini AI...")
     for attempt in range(max_retries):
-        # Apply rate limiting between retries
-        if 'gemini_rate_limiter' in globals() and attempt > 0:
-            gemini_rate_limiter.wait_if_needed()
+        if budget.expired() or gemini_client.breaker.is_open():
+            print(f"   ⏭️ Skipping Gemini for {narrative_key} (budget spent or circuit open)")
+            break
 
-        content = generate_content_with_gemini_with_retry(prompt, max_retries=3)
+        # Rate limiting happens per request inside gemini_client;
+        # taking a bucket token here as well would burn quota without making a call
+        content = generate_content_with_gemini_with_retry(prompt, max_retries=3, budget=budget)
         if content and len(content.strip()) > 100:
             cache_result(narrative_key, prompt, content, source="gemini")
             print(f"   ✅ Gemini succeeded on attempt {attempt + 1}")
@@ -6591,7 +6944,7 @@ def generate_narrative_with_tiered_fallbacks(narrative_key, prompt, context_data
         if attempt < max_retries - 1:
             wait_time = 5 * (attempt + 1)  # 5, 10, 15, 20 seconds
             print(f"   ⏳ Waiting {wait_time} seconds before retry...")
-            time.sleep(wait_time)
+            budget.sleep(wait_time)
 
     # --- TIER 3: Template-based generation ---
     print(f"   📝 Using template generation...")
@@ -6823,8 +7176,18 @@ def get_guaranteed_fallback(narrative_key, context_data):
 
     return fallbacks.get(narrative_key, f"Content for {narrative_key.replace('_', ' ')}")
 
-def generate_ai_narratives_with_prompts(json_data, prompt_context=None):
-    """Generate all AI narratives using EXACT prompts from Prompts_v3.docx with 100% reliability"""
+def generate_ai_narratives_with_prompts(json_data, prompt_context=None, concurrent=None, batched=None,
+                                        progress_callback=None, budget=None):
+    """Generate all AI narratives using EXACT prompts from Prompts_v3.docx with 100% reliability
+
+    When batched is True (default: NARRATIVE_BATCHING_ENABLED) uncached narratives are first requested
+    several at a time as one JSON object keyed by narrative_key; only keys that fail validation go
+    through the per-key tiers. When concurrent is True (default: NARRATIVE_CONCURRENCY_ENABLED) work is
+    dispatched to a bounded worker pool that shares gemini_rate_limiter; results are collected in key order.
+    progress_callback(done, total, message) receives per-narrative progress (see NarrativeProgress).
+    budget (default: a fresh NARRATIVE_REPORT_BUDGET) bounds all Gemini time for the report; once it
+    is spent, or gemini_client.breaker opens, remaining narratives go straight to template/fallback.
+    """
     print("🤖 Generating AI narratives with JSON v4 data...")
 
     # If no prompt_context provided, use basic context
@@ -7150,8 +7513,6 @@ Return 2 paragraphs with proper bullet formatting if needed."""
         }
     }
 
-    generated_content = {}
-    narrative_count = 0
     total_narratives = len(exact_prompts)
 
     # Prepare context data for all narratives
@@ -7168,132 +7529,441 @@ Return 2 paragraphs with proper bullet formatting if needed."""
     # Track narrative keys for ordering
     narrative_keys = list(exact_prompts.keys())
 
-    # Generate each narrative using tiered fallback system
-    for i, narrative_key in enumerate(narrative_keys):
-        prompt_info = exact_prompts[narrative_key]
+    if concurrent is None:
+        concurrent = NARRATIVE_CONCURRENCY_ENABLED
+    if batched is None:
+        batched = NARRATIVE_BATCHING_ENABLED
 
-        try:
-            print(f"\n📝 Generating {i + 1}/{total_narratives}: {narrative_key}")
+    generated_content = {}
+    progress = NarrativeProgress(narrative_keys, progress_callback)
+    progress.report()
+    if budget is None:
+        budget = GenerationBudget()
 
-            # Build complete prompt
-            complete_prompt = f"{prompt_info['system_prompt']}\n\n{prompt_info['user_prompt']}"
+    # The background cache refresher stays off while any report is generating
+    cache_refresher.job_started()
+    try:
+        # Batched tier: a few structured-output requests instead of one request per narrative
+        if batched and gemini_client.is_configured():
+            complete_prompts = {key: build_complete_narrative_prompt(exact_prompts[key]) for key in narrative_keys}
+            generated_content.update(generate_narratives_batched(complete_prompts, concurrent, progress, budget))
+
+        # Per-key tiers for anything the batches did not deliver
+        remaining_keys = [key for key in narrative_keys if key not in generated_content]
+        total_remaining = len(remaining_keys)
+
+        if concurrent and total_remaining > 1:
+            # All narratives are dispatched at once; the shared rate limiter is the only throttle
+            max_workers = min(NARRATIVE_MAX_WORKERS, total_remaining)
+            print(f"⚡ Generating {total_remaining} narratives concurrently with {max_workers} workers...")
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="narrative") as executor:
+                futures = {
+                    narrative_key: executor.submit(bind_job_metrics(generate_single_narrative_with_tiers), narrative_key,
+                                                   exact_prompts[narrative_key], context_data, i + 1, total_remaining,
+                                                   progress, budget)
+                    for i, narrative_key in enumerate(remaining_keys)
+                }
 
-            # DEBUG: Print first 100 chars of prompt
-            print(f"   Prompt: {complete_prompt[:100]}...")
+                for narrative_key in remaining_keys:
+                    generated_content[narrative_key] = futures[narrative_key].result()
+        else:
+            for i, narrative_key in enumerate(remaining_keys):
+                # Add delay between calls to prevent API overload (except first)
+                if i > 0 and not budget.expired() and not gemini_client.breaker.is_open():
+                    delay_seconds = 4  # 4 seconds between calls
+                    print(f"⏳ Waiting {delay_seconds} seconds between narratives...")
+                    time.sleep(delay_seconds)
+
+                generated_content[narrative_key] = generate_single_narrative_with_tiers(
+                    narrative_key, exact_prompts[narrative_key], context_data, i + 1, total_remaining, progress, budget)
+    finally:
+        cache_refresher.job_finished()
+
+    # Collect in key order so the document mapping stays deterministic
+    generated_content = {key: generated_content[key] for key in narrative_keys}
+    narrative_count = len(generated_content)
 
-            # Add delay between calls to prevent API overload (except first)
-            if i > 0:
-                delay_seconds = 4  # 4 seconds between calls
-                print(f"⏳ Waiting {delay_seconds} seconds between narratives...")
-                time.sleep(delay_seconds)
-
-            # ===== TIERED FALLBACK GENERATION =====
-            # 1. Check cache first (instant)
-            cached_content = get_cached_similar_content(narrative_key, complete_prompt)
-            if cached_content:
-                print(f"   ✅ Using cached content for {narrative_key}")
-                generated_content[narrative_key] = cached_content
-                narrative_count += 1
-                continue
+    print(f"\n📊 TIERED GENERATION COMPLETE: {narrative_count}/{total_narratives} narratives generated")
+    print(f"   Success rate: 100% (guaranteed by fallback system)")
+    gemini_stats = gemini_client.get_stats()
+    print(f"   Gemini (process total): {gemini_stats['calls']} calls, {gemini_stats['total_tokens']} tokens, "
+          f"avg latency {gemini_stats['avg_latency']}s, errors {gemini_stats['errors']}")
+    print(f"   Time budget: {budget.seconds - budget.remaining():.0f}/{budget.seconds}s used, "
+          f"circuit {gemini_stats['breaker']['state']}")
 
-            # 2. Try Gemini AI with retry
-            print(f"   🔄 Trying Gemini AI...")
-            gemini_success = False
-            gemini_content = None
+    return generated_content
 
-            if GEMINI_API_KEY and AVAILABLE_GEMINI_MODEL:
-                for attempt in range(3):  # 3 attempts max
-                    try:
-                        # Apply rate limiting
-                        if 'gemini_rate_limiter' in globals():
-                            gemini_rate_limiter.wait_if_needed()
-
-                        print(f"   🤖 Gemini attempt {attempt + 1}/3...")
-                        gemini_content = generate_content_with_gemini_proper_bullets(complete_prompt)
-
-                        if gemini_content and len(gemini_content.strip()) > 100:
-                            # Cache successful result
-                            cache_result(narrative_key, complete_prompt, gemini_content, source="gemini")
-                            generated_content[narrative_key] = gemini_content
-                            narrative_count += 1
-                            gemini_success = True
-                            print(f"   ✅ Gemini succeeded")
-                            break
-                        else:
-                            print(f"   ⚠️ Gemini returned insufficient content")
 
-                    except Exception as gemini_error:
-                        print(f"   ⚠️ Gemini error: {str(gemini_error)[:100]}")
+class NarrativeProgress:
+    """Per-narrative progress for the AI phase ("7/14 narratives, 3 streaming")
 
-                    # Wait before retry
-                    if attempt < 2:
-                        wait_time = 5 * (attempt + 1)  # 5, 10 seconds
-                        print(f"   ⏳ Waiting {wait_time} seconds before retry...")
-                        time.sleep(wait_time)
+    callback(done, total, message) is called whenever a narrative finishes or starts streaming,
+    not on every chunk. Safe to use from worker threads.
+    """
 
-            if gemini_success:
-                continue
+    def __init__(self, narrative_keys, callback=None):
+        self.total = len(narrative_keys)
+        self.callback = callback
+        self.lock = Lock()
+        self.done = set()
+        self.streaming = set()
+
+    def chunk_callback(self, keys):
+        """on_chunk hook for a Gemini call that produces the given narrative keys"""
+        def on_chunk(received):
+            with self.lock:
+                new_keys = [key for key in keys if key not in self.streaming and key not in self.done]
+                self.streaming.update(new_keys)
+            if new_keys:
+                self.report()
+        return on_chunk
+
+    def stop_streaming(self, keys):
+        with self.lock:
+            self.streaming.difference_update(keys)
+
+    def finish(self, keys):
+        with self.lock:
+            self.done.update(keys)
+            self.streaming.difference_update(keys)
+        self.report()
+
+    def message(self):
+        with self.lock:
+            done, streaming = len(self.done), len(self.streaming)
+        message = f"Generating AI narratives: {done}/{self.total} narratives"
+        if streaming:
+            message += f", {streaming} streaming"
+        return done, message
+
+    def report(self):
+        if self.callback:
+            done, message = self.message()
+            self.callback(done, self.total, message)
+
+
+def build_complete_narrative_prompt(prompt_info):
+    """System + user prompt for one exact_prompts entry (also the cache key prompt)"""
+    return f"{prompt_info['system_prompt']}\n\n{prompt_info['user_prompt']}"
+
+
+def generate_narratives_batched(complete_prompts, concurrent=True, progress=None, budget=None):
+    """Cache lookup, then batched Gemini requests for the misses, re-issuing only failed keys
+
+    Returns {narrative_key: content} for every key served from cache or a validated batch
+    response; keys missing from the result still need the per-key tiers. Keys another report
+    is already generating (narrative_flights) are not requested again; their result is awaited.
+    """
+    results = {}
+    pending = []
+    flights = {}
+    waiting = {}
+
+    for narrative_key, complete_prompt in complete_prompts.items():
+        cached_content = get_cached_similar_content(narrative_key, complete_prompt)
+        if cached_content:
+            print(f"   ✅ Using cached content for {narrative_key}")
+            results[narrative_key] = cached_content
+            if progress:
+                progress.finish([narrative_key])
+            continue
 
-            # 3. Use template-based generation
-            print(f"   📝 Using template generation...")
-            # Use V4 template if we have V4 data, otherwise use original
-            if 'v4_data' in context_data and context_data['v4_data']:
-                template_content = generate_from_template_v4(narrative_key, context_data, context_data['v4_data'])
-            else:
-                template_content = generate_from_template(narrative_key, context_data)
-
-            if template_content and len(template_content.strip()) > 50:
-                # Cache template result
-                cache_result(narrative_key, complete_prompt, template_content, source="template")
-                generated_content[narrative_key] = template_content
-                narrative_count += 1
-                print(f"   ✅ Template generation succeeded")
-                continue
+        flight_key = get_cache_key(narrative_key, complete_prompt)
+        future, leader = narrative_flights.claim(flight_key)
+        if leader:
+            flights[narrative_key] = (flight_key, future)
+            pending.append(narrative_key)
+        else:
+            waiting[narrative_key] = future
+
+    try:
+        batches = chunk_narrative_keys(pending)
+        for round_number in range(NARRATIVE_BATCH_RETRIES + 1):
+            if not batches:
+                break
+            if budget and budget.expired():
+                print("⏱️ Gemini time budget spent, skipping batch requests")
+                break
 
-            # 4. Ultimate fallback (guaranteed)
-            print(f"   🛡️ Using guaranteed fallback...")
-            # Use V4 fallback if we have V4 data
-            if 'v4_data' in context_data and context_data['v4_data']:
-                fallback_content = get_guaranteed_fallback_v4(narrative_key, context_data, context_data['v4_data'])
+            label = "📦 Batch" if round_number == 0 else "🔁 Re-issuing"
+            print(f"{label}: {len(pending)} narratives in {len(batches)} request(s)")
+
+            batch_prompts = [{key: complete_prompts[key] for key in batch} for batch in batches]
+            on_chunks = [progress.chunk_callback(batch) if progress else None for batch in batches]
+            timeout = budget.call_timeout(NARRATIVE_BATCH_TIMEOUT) if budget else NARRATIVE_BATCH_TIMEOUT
+            timeouts = [timeout] * len(batches)
+            if concurrent and len(batches) > 1:
+                with ThreadPoolExecutor(max_workers=min(NARRATIVE_MAX_WORKERS, len(batches)),
+                                        thread_name_prefix="narrative-batch") as executor:
+                    batch_results = list(executor.map(bind_job_metrics(generate_narrative_batch),
+                                                     batch_prompts, on_chunks, timeouts))
             else:
-                fallback_content = get_guaranteed_fallback(narrative_key, context_data)
+                batch_results = [generate_narrative_batch(prompts, on_chunk, timeout)
+                                 for prompts, on_chunk in zip(batch_prompts, on_chunks)]
 
-            cache_result(narrative_key, complete_prompt, fallback_content, source="fallback")
-            generated_content[narrative_key] = fallback_content
-            narrative_count += 1
-            print(f"   ✅ Fallback content provided")
+            for batch_result in batch_results:
+                for narrative_key, content in (batch_result or {}).items():
+                    cache_result(narrative_key, complete_prompts[narrative_key], content, source="gemini")
+                    results[narrative_key] = content
 
-        except Exception as e:
-            print(f"❌ Critical error generating {narrative_key}: {e}")
-            import traceback
-            traceback.print_exc()
+            pending = [key for key in pending if key not in results]
+            if progress:
+                progress.finish([key for batch in batches for key in batch if key in results])
+                progress.stop_streaming(pending)
+            batches = next_narrative_batches(batches, batch_results, results)
+    finally:
+        # Release followers in other reports; None sends them to their own per-key tiers
+        for narrative_key, (flight_key, future) in flights.items():
+            narrative_flights.resolve(flight_key, future, results.get(narrative_key))
 
-            # Emergency fallback
-            emergency_content = f"Climate adaptation content for {client_name}. This section addresses {narrative_key.replace('_', ' ')}."
-            generated_content[narrative_key] = emergency_content
-            narrative_count += 1
-            print(f"   🚨 Emergency fallback used")
+    if pending:
+        print(f"⚠️ {len(pending)} narratives failed batch validation: {pending}")
 
-    print(f"\n📊 TIERED GENERATION COMPLETE: {narrative_count}/{total_narratives} narratives generated")
-    print(f"   Success rate: 100% (guaranteed by fallback system)")
+    for narrative_key, future in waiting.items():
+        print(f"🔗 Waiting on in-flight request for {narrative_key}")
+        content = narrative_flights.wait(future, budget.remaining() if budget else None)
+        if content:
+            results[narrative_key] = content
+            if progress:
+                progress.finish([narrative_key])
 
-    return generated_content
+    return results
+
+
+def chunk_narrative_keys(keys, size=NARRATIVE_BATCH_SIZE):
+    """keys in batches of at most size"""
+    return [keys[i:i + size] for i in range(0, len(keys), size)]
+
+
+def next_narrative_batches(batches, batch_results, results):
+    """Batches for the next re-issue round: only keys still missing from results
+
+    A batch whose response could not be parsed (batch_result None - usually JSON cut off at the
+    output token limit) is split in half, so resending it cannot overflow the same way again.
+    Keys that only failed validation are re-batched together at the normal size.
+    """
+    next_batches = []
+    retry = []
+    for batch, batch_result in zip(batches, batch_results):
+        failed = [key for key in batch if key not in results]
+        if batch_result is None and len(failed) > 1:
+            half = (len(failed) + 1) // 2
+            next_batches.extend([failed[:half], failed[half:]])
+        else:
+            retry.extend(failed)
+    return next_batches + chunk_narrative_keys(retry)
+
+
+def generate_narrative_batch(batch_prompts, on_chunk=None, timeout=None):
+    """One structured-output Gemini request for several narratives
+
+    The response must be a JSON object keyed by narrative_key. Each value is cleaned and
+    validated independently; only keys that pass are returned. Returns None when the response
+    is not a parseable JSON object, {} when the request itself failed.
+    """
+    keys = list(batch_prompts.keys())
+    sections = "\n\n".join(
+        f"=== SECTION \"{key}\" ===\n{prompt}" for key, prompt in batch_prompts.items()
+    )
+    batch_prompt = f"""You are generating {len(keys)} independent sections of a climate adaptation plan in a single response.
+
+Return ONE JSON object with exactly these keys: {", ".join(keys)}.
+Each value is the complete plain-text content for that section, written according to that section's own instructions below.
+Separate paragraphs with a blank line. Do not refer to the other sections.
+
+{GEMINI_BULLET_FORMATTING_INSTRUCTIONS}
+
+{sections}"""
+
+    response_schema = {
+        "type": "OBJECT",
+        "properties": {key: {"type": "STRING"} for key in keys},
+        "required": keys,
+    }
+
+    try:
+        raw = gemini_client.generate(
+            batch_prompt,
+            temperature=0.3,
+            max_output_tokens=NARRATIVE_BATCH_MAX_OUTPUT_TOKENS,
+            timeout=timeout or NARRATIVE_BATCH_TIMEOUT,
+            label=f"batch[{len(keys)}]",
+            stream=GEMINI_STREAMING_ENABLED,
+            on_chunk=on_chunk,
+            responseMimeType="application/json",
+            responseSchema=response_schema
+        )
+    except GeminiError as e:
+        print(f"⚠️ Narrative batch failed ({e.kind}): {str(e)[:150]}")
+        return {}
 
+    return split_narrative_batch_response(raw, keys)
 
-def generate_content_with_gemini_proper_bullets(prompt):
-    """Gemini content generation with proper bullet formatting"""
-    if not GEMINI_API_KEY or not AVAILABLE_GEMINI_MODEL:
+
+def split_narrative_batch_response(raw, keys):
+    """Parse a batch response and keep only keys whose content passes the per-narrative checks
+
+    None if raw is not a JSON object at all (e.g. truncated output)
+    """
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = re.sub(r'^```(?:json)?\s*|\s*```$', '', raw)
+
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Narrative batch returned invalid JSON: {e}")
+        return None
+
+    if not isinstance(data, dict):
+        print("⚠️ Narrative batch did not return a JSON object")
         return None
 
+    validated = {}
+    for narrative_key in keys:
+        content = data.get(narrative_key)
+        if not isinstance(content, str):
+            print(f"   ⚠️ Batch missing {narrative_key}")
+            continue
+
+        content = clean_ai_generated_bullets(content).strip()
+        if len(content) > 100 and "[[" not in content:
+            validated[narrative_key] = content
+            print(f"   ✅ Batch delivered {narrative_key} ({len(content)} chars)")
+        else:
+            print(f"   ⚠️ Batch content for {narrative_key} failed validation")
+
+    return validated
+
+
+def generate_single_narrative_with_tiers(narrative_key, prompt_info, context_data, position, total_narratives,
+                                         progress=None, budget=None):
+    """Generate one narrative via cache -> Gemini -> template -> fallback (safe to run in a worker thread)"""
     try:
-        model_name = AVAILABLE_GEMINI_MODEL['name']
-        api_version = AVAILABLE_GEMINI_MODEL['version']
-        api_url = f"https://generativelanguage.googleapis.com/{api_version}/{model_name}:generateContent?key={GEMINI_API_KEY}"
+        return generate_narrative_tiers(narrative_key, prompt_info, context_data, position, total_narratives,
+                                        progress, budget)
+    finally:
+        if progress:
+            progress.finish([narrative_key])
 
-        # Enhance prompt to ensure proper bullet formatting
-        enhanced_prompt = f"""{prompt}
 
-CRITICAL FORMATTING INSTRUCTIONS FOR WORD DOCUMENT:
+def generate_narrative_with_gemini(narrative_key, complete_prompt, budget, progress=None):
+    """Gemini tier for one narrative: up to 3 attempts within the budget; caches and returns content or None"""
+    on_chunk = progress.chunk_callback([narrative_key]) if progress else None
+
+    for attempt in range(3):  # 3 attempts max
+        if budget.expired() or gemini_client.breaker.is_open():
+            print(f"   ⏭️ Skipping Gemini for {narrative_key} (budget spent or circuit open)")
+            break
+
+        wait_time = 5 * (attempt + 1)  # 5, 10 seconds
+        try:
+            # Rate limiting is applied inside gemini_client
+            print(f"   🤖 Gemini attempt {attempt + 1}/3 for {narrative_key}...")
+            gemini_content = generate_content_with_gemini_proper_bullets(
+                complete_prompt, raise_errors=True, label=narrative_key, on_chunk=on_chunk,
+                timeout=budget.call_timeout())
+
+            if gemini_content and len(gemini_content.strip()) > 100:
+                # Cache successful result
+                cache_result(narrative_key, complete_prompt, gemini_content, source="gemini")
+                print(f"   ✅ Gemini succeeded for {narrative_key}")
+                return gemini_content
+            else:
+                print(f"   ⚠️ Gemini returned insufficient content for {narrative_key}")
+
+        except GeminiError as gemini_error:
+            if not gemini_error.retryable:
+                print(f"   ⚠️ Gemini {gemini_error.kind} error for {narrative_key}, not retrying")
+                break
+            if gemini_error.kind == "rate_limit":
+                wait_time = max(wait_time, gemini_client.retry_delay(gemini_error, attempt))
+
+        except Exception as gemini_error:
+            print(f"   ⚠️ Gemini error for {narrative_key}: {str(gemini_error)[:100]}")
+
+        # Wait before retry
+        if progress:
+            progress.stop_streaming([narrative_key])
+        if attempt < 2:
+            print(f"   ⏳ Waiting {wait_time} seconds before retrying {narrative_key}...")
+            budget.sleep(wait_time)
+
+    return None
+
+
+def generate_narrative_tiers(narrative_key, prompt_info, context_data, position, total_narratives, progress=None,
+                             budget=None):
+    """Tier body for generate_single_narrative_with_tiers"""
+    client_name = context_data["client_name"]
+    if budget is None:
+        budget = GenerationBudget()
+
+    try:
+        print(f"\n📝 Generating {position}/{total_narratives}: {narrative_key}")
+
+        # Build complete prompt
+        complete_prompt = build_complete_narrative_prompt(prompt_info)
+
+        # DEBUG: Print first 100 chars of prompt
+        print(f"   Prompt: {complete_prompt[:100]}...")
+
+        # ===== TIERED FALLBACK GENERATION =====
+        # 1. Check cache first (instant)
+        cached_content = get_cached_similar_content(narrative_key, complete_prompt)
+        if cached_content:
+            print(f"   ✅ Using cached content for {narrative_key}")
+            return cached_content
+
+        # 2. Try Gemini AI with retry
+        print(f"   🔄 Trying Gemini AI for {narrative_key}...")
+
+        if GEMINI_API_KEY and AVAILABLE_GEMINI_MODEL:
+            # Concurrent reports asking for the same prompt share one leader's Gemini calls
+            gemini_content = narrative_flights.do(
+                get_cache_key(narrative_key, complete_prompt),
+                lambda: generate_narrative_with_gemini(narrative_key, complete_prompt, budget, progress),
+                timeout=budget.remaining())
+            if gemini_content:
+                return gemini_content
+
+        # 3. Use template-based generation
+        print(f"   📝 Using template generation for {narrative_key}...")
+        # Use V4 template if we have V4 data, otherwise use original
+        if 'v4_data' in context_data and context_data['v4_data']:
+            template_content = generate_from_template_v4(narrative_key, context_data, context_data['v4_data'])
+        else:
+            template_content = generate_from_template(narrative_key, context_data)
+
+        if template_content and len(template_content.strip()) > 50:
+            # Cache template result
+            cache_result(narrative_key, complete_prompt, template_content, source="template")
+            print(f"   ✅ Template generation succeeded for {narrative_key}")
+            return template_content
+
+        # 4. Ultimate fallback (guaranteed)
+        print(f"   🛡️ Using guaranteed fallback for {narrative_key}...")
+        # Use V4 fallback if we have V4 data
+        if 'v4_data' in context_data and context_data['v4_data']:
+            fallback_content = get_guaranteed_fallback_v4(narrative_key, context_data, context_data['v4_data'])
+        else:
+            fallback_content = get_guaranteed_fallback(narrative_key, context_data)
+
+        cache_result(narrative_key, complete_prompt, fallback_content, source="fallback")
+        print(f"   ✅ Fallback content provided for {narrative_key}")
+        return fallback_content
+
+    except Exception as e:
+        print(f"❌ Critical error generating {narrative_key}: {e}")
+        traceback.print_exc()
+
+        # Emergency fallback
+        print(f"   🚨 Emergency fallback used for {narrative_key}")
+        return f"Climate adaptation content for {client_name}. This section addresses {narrative_key.replace('_', ' ')}."
+
+
+GEMINI_BULLET_FORMATTING_INSTRUCTIONS = """CRITICAL FORMATTING INSTRUCTIONS FOR WORD DOCUMENT:
 1. For bullet points, ALWAYS use: • (proper bullet character)
 2. NEVER use: * (asterisk) or - (dash) for bullets
 3. NEVER use markdown formatting like **bold** or *italic*
@@ -7302,70 +7972,92 @@ CRITICAL FORMATTING INSTRUCTIONS FOR WORD DOCUMENT:
 • Second item
 • Third item
 5. Use plain text only, no special formatting codes
-6. Each bullet should be on its own line starting with •
-"""
+6. Each bullet should be on its own line starting with •"""
 
-        payload = {
-            "contents": [{"parts": [{"text": enhanced_prompt}]}],
-            "generationConfig": {
-                "temperature": 0.3,
-                "maxOutputTokens": 2000,
-                "stopSequences": ["*", "**", "- "]  # Prevent asterisk and dash usage
-            }
-        }
 
-        response = requests.post(api_url, json=payload, timeout=60)
+def generate_content_with_gemini_proper_bullets(prompt, raise_errors=False, label="narrative", on_chunk=None,
+                                                timeout=None, rate_limit=True):
+    """Gemini content generation with proper bullet formatting
 
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and result['candidates']:
-                content = result['candidates'][0]['content']['parts'][0]['text']
+    Streams the response when GEMINI_STREAMING_ENABLED (on_chunk receives progress).
+    Returns None on failure, or re-raises the classified GeminiError when raise_errors is True
+    so retry loops can tell a 429 from a content-filter block.
+    """
+    if not gemini_client.is_configured():
+        return None
 
-                # Post-process to fix any remaining asterisks
-                content = clean_ai_generated_bullets(content)
-                return content.strip()
-            else:
-                print(f"⚠️ No candidates in Gemini response")
-        else:
-            print(f"⚠️ Gemini API returned status {response.status_code}")
-            print(f"   Response: {response.text[:200]}")
+    try:
+        # Enhance prompt to ensure proper bullet formatting
+        enhanced_prompt = f"""{prompt}
 
-        return None
+{GEMINI_BULLET_FORMATTING_INSTRUCTIONS}
+"""
+
+        content = gemini_client.generate(
+            enhanced_prompt,
+            temperature=0.3,
+            max_output_tokens=2000,
+            timeout=timeout,
+            label=label,
+            rate_limit=rate_limit,
+            stream=GEMINI_STREAMING_ENABLED,
+            on_chunk=on_chunk,
+            stopSequences=["*", "**", "- "]  # Prevent asterisk and dash usage
+        )
+
+        # Post-process to fix any remaining asterisks
+        content = clean_ai_generated_bullets(content)
+        return content.strip()
 
-    except requests.exceptions.Timeout:
-        print(f"⚠️ Gemini API timeout for prompt")
+    except GeminiError as e:
+        print(f"⚠️ Gemini API {e.kind} error: {str(e)[:200]}")
+        if raise_errors:
+            raise
         return None
     except Exception as e:
         print(f"⚠️ Gemini API error: {e}")
         return None
 
 
-def generate_content_with_gemini_with_retry(prompt, max_retries=3, base_delay=2):
-    """Generate content with retry logic for rate limits"""
+def generate_content_with_gemini_with_retry(prompt, max_retries=3, base_delay=2, budget=None):
+    """Generate content with retry logic for rate limits
+
+    Rate limiting is applied per request by gemini_client. Non-retryable failures
+    (content filter, bad request, open circuit) stop immediately instead of burning the
+    remaining attempts; with a GenerationBudget, calls and back-off stop when it runs out.
+    """
     for attempt in range(max_retries):
-        try:
-            # Apply rate limiting before each attempt
-            gemini_rate_limiter.wait_if_needed()
+        if budget and budget.expired():
+            print("⏱️ Gemini time budget spent, not retrying")
+            return None
 
+        delay = base_delay * (2 ** attempt)  # Exponential backoff
+        try:
             print(f"🤖 Gemini attempt {attempt + 1}/{max_retries}...")
-            result = generate_content_with_gemini_proper_bullets(prompt)
+            result = generate_content_with_gemini_proper_bullets(
+                prompt, raise_errors=True, timeout=budget.call_timeout() if budget else None)
 
             if result and len(result.strip()) > 50:
                 return result
 
-            # If we got here, either Gemini failed or returned short content
-            if attempt < max_retries - 1:  # Don't sleep on last attempt
-                delay = base_delay * (2 ** attempt)  # Exponential backoff
-                print(f"⚠️ Gemini attempt {attempt + 1} failed, retrying in {delay} seconds...")
-                time.sleep(delay)
+        except GeminiError as e:
+            if not e.retryable:
+                print(f"❌ Gemini {e.kind} error is not retryable: {str(e)[:100]}")
+                return None
+            delay = gemini_client.retry_delay(e, attempt, base_delay)
 
         except Exception as e:
-            if attempt < max_retries - 1:
-                delay = base_delay * (2 ** attempt)
-                print(f"⚠️ Gemini error on attempt {attempt + 1}: {e}, retrying in {delay} seconds...")
-                time.sleep(delay)
+            print(f"⚠️ Gemini error on attempt {attempt + 1}: {e}")
+
+        # If we got here, either Gemini failed or returned short content
+        if attempt < max_retries - 1:  # Don't sleep on last attempt
+            print(f"⚠️ Gemini attempt {attempt + 1} failed, retrying in {delay} seconds...")
+            if budget:
+                budget.sleep(delay)
             else:
-                print(f"❌ Gemini failed after {max_retries} attempts: {e}")
+                time.sleep(delay)
+        else:
+            print(f"❌ Gemini failed after {max_retries} attempts")
 
     return None
 
@@ -7422,35 +8114,11 @@ def clean_ai_generated_bullets(content):
 # ===== ADD THIS HELPER FUNCTION =====
 def generate_content_with_gemini_simple(prompt):
     """Simple Gemini content generation without complex formatting rules"""
-    if not GEMINI_API_KEY or not AVAILABLE_GEMINI_MODEL:
-        return None
-
-    try:
-        model_name = AVAILABLE_GEMINI_MODEL['name']
-        api_version = AVAILABLE_GEMINI_MODEL['version']
-        api_url = f"https://generativelanguage.googleapis.com/{api_version}/{model_name}:generateContent?key={GEMINI_API_KEY}"
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "temperature": 0.3,
-                "maxOutputTokens": 2000,
-            }
-        }
-
-        response = requests.post(api_url, json=payload, timeout=60)
-
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and result['candidates']:
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                return content.strip()
-
+    if not gemini_client.is_configured():
         return None
 
-    except Exception as e:
-        print(f"⚠️ Gemini API error: {e}")
-        return None
+    content = gemini_client.generate_text(prompt, temperature=0.3, max_output_tokens=2000, label="simple")
+    return content.strip() if content else None
 
 
 # ===== ADD THIS FALLBACK FUNCTION =====
@@ -7476,12 +8144,13 @@ def get_fallback_narrative_exact(narrative_key, client_name, client_location, in
 
 
 # ===== MODIFY THE integrate_bespoke_content_with_prompts FUNCTION =====
-def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None):
+def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None, progress_callback=None):
     """Main integration function with EXACT prompt support"""
     print("🔍 Starting content integration with EXACT prompts...")
 
     # Generate AI narratives using EXACT prompts
-    ai_narratives = generate_ai_narratives_with_prompts(json_data, form_prompts)
+    ai_narratives = generate_ai_narratives_with_prompts(json_data, form_prompts,
+                                                        progress_callback=progress_callback)
 
     # Update json_data with generated narratives
     for key, value in ai_narratives.items():
@@ -7498,9 +8167,6 @@ def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None):
     # Clean up any remaining placeholders
     remove_specific_placeholders(doc)
 
-    # Clean up bullet formatting
-    clean_up_bullet_formatting(doc)
-
     print("✅ Content integration completed with EXACT prompts")
     return True
 
@@ -7559,65 +8225,12 @@ def replace_all_narrative_placeholders(doc, content_mapping):
     """Replace ALL narrative placeholders in the document"""
     print(f"🔄 Replacing {len(content_mapping)} narrative placeholders...")
 
-    replaced_count = 0
-
-    # Replace in paragraphs
-    for paragraph in doc.paragraphs:
-        original_text = paragraph.text
-        if original_text:
-            new_text = original_text
-            for placeholder, content in content_mapping.items():
-                if placeholder in original_text and content:
-                    new_text = new_text.replace(placeholder, content)
-                    replaced_count += 1
-                    print(f"✅ Replaced '{placeholder}' in paragraph")
-
-            if new_text != original_text:
-                paragraph.text = new_text
-
-    # Replace in tables
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    original_text = paragraph.text
-                    if original_text:
-                        new_text = original_text
-                        for placeholder, content in content_mapping.items():
-                            if placeholder in original_text and content:
-                                new_text = new_text.replace(placeholder, content)
-                                replaced_count += 1
-
-                        if new_text != original_text:
-                            paragraph.text = new_text
-
-    # Replace in headers and footers
-    for section in doc.sections:
-        if section.header:
-            for paragraph in section.header.paragraphs:
-                original_text = paragraph.text
-                if original_text:
-                    new_text = original_text
-                    for placeholder, content in content_mapping.items():
-                        if placeholder in original_text and content:
-                            new_text = new_text.replace(placeholder, content)
-
-                    if new_text != original_text:
-                        paragraph.text = new_text
-
-        if section.footer:
-            for paragraph in section.footer.paragraphs:
-                original_text = paragraph.text
-                if original_text:
-                    new_text = original_text
-                    for placeholder, content in content_mapping.items():
-                        if placeholder in original_text and content:
-                            new_text = new_text.replace(placeholder, content)
+    matcher = replace_placeholders_in_document(doc, content_mapping, skip_empty=True)
+    for placeholder in matcher.hits:
+        print(f"✅ Replaced '{placeholder}' in document")
 
-                    if new_text != original_text:
-                        paragraph.text = new_text
-
-    print(f"✅ Replaced {replaced_count} narrative placeholders")
+    print(f"✅ Replaced {sum(matcher.hits.values())} narrative placeholders")
+    return matcher.hits
 
 
 def build_enhanced_narrative_prompt(base_prompt, narrative_data, narrative_key, narrative_type, prompt_context,
@@ -8209,7 +8822,7 @@ def get_fallback_narrative_with_context(narrative_key, json_data, prompt_context
 
 def generate_content_with_gemini_with_context(prompt, narrative_key, prompt_context):
     """Generate content using Gemini with enhanced context"""
-    if not GEMINI_API_KEY or not AVAILABLE_GEMINI_MODEL:
+    if not gemini_client.is_configured():
         return None
 
     try:
@@ -8237,45 +8850,35 @@ def generate_content_with_gemini_with_context(prompt, narrative_key, prompt_cont
 
 IMPORTANT: Generate content that is accurate, relevant, and tailored to the specific client context provided above."""
 
-        model_name = AVAILABLE_GEMINI_MODEL['name']
-        api_version = AVAILABLE_GEMINI_MODEL['version']
-        api_url = f"https://generativelanguage.googleapis.com/{api_version}/{model_name}:generateContent?key={GEMINI_API_KEY}"
-
-        payload = {
-            "contents": [{"parts": [{"text": complete_prompt}]}],
-            "generationConfig": {
-                "temperature": 0.3,  # Lower for more accurate, consistent content
-                "maxOutputTokens": 2000,
-                "topP": 0.8,
-                "topK": 40,
-                "stopSequences": ["###", "END", "Conclusion:"]
-            }
-        }
-
-        response = requests.post(api_url, json=payload, timeout=120)
-
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and result['candidates']:
-                content = result['candidates'][0]['content']['parts'][0]['text']
+        content = gemini_client.generate_text(
+            complete_prompt,
+            temperature=0.3,  # Lower for more accurate, consistent content
+            max_output_tokens=2000,
+            timeout=120,
+            label=narrative_key,
+            topP=0.8,
+            topK=40,
+            stopSequences=["###", "END", "Conclusion:"]
+        )
 
-                # Post-process content for consistency
-                content = content.strip()
+        if content:
+            # Post-process content for consistency
+            content = content.strip()
 
-                # Remove any markdown formatting
-                content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)
-                content = re.sub(r'\*(?!\s)(.*?)(?<!\s)\*', r'\1', content)
+            # Remove any markdown formatting
+            content = re.sub(r'\*\*(.*?)\*\*', r'\1', content)
+            content = re.sub(r'\*(?!\s)(.*?)(?<!\s)\*', r'\1', content)
 
-                # Replace markdown bullets with proper bullets
-                content = re.sub(r'^\s*[\*\-]\s+', '• ', content, flags=re.MULTILINE)
+            # Replace markdown bullets with proper bullets
+            content = re.sub(r'^\s*[\*\-]\s+', '• ', content, flags=re.MULTILINE)
 
-                # Fix incomplete bullet points
-                content = fix_incomplete_bullets_with_context(content, narrative_key, prompt_context)
+            # Fix incomplete bullet points
+            content = fix_incomplete_bullets_with_context(content, narrative_key, prompt_context)
 
-                # Ensure proper paragraph spacing
-                content = re.sub(r'\n{3,}', '\n\n', content)
+            # Ensure proper paragraph spacing
+            content = re.sub(r'\n{3,}', '\n\n', content)
 
-                return content
+            return content
 
         return None
 
@@ -8331,8 +8934,11 @@ def expand_bullet_with_context(bullet_line, narrative_key, client_name, client_l
         return bullet_line
 
 
-def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None):
-    """Main integration function with prompt support"""
+def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None, progress_callback=None):
+    """Main integration function with prompt support
+
+    progress_callback(done, total, message) is passed on to generate_ai_narratives_with_prompts.
+    """
     print("🔍 Available JSON keys:", list(json_data.keys()))
 
     # Build prompt context FROM FORM DATA
@@ -8346,7 +8952,8 @@ def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None):
     print(f"🤖 Prompt context built: {len(prompt_context.get('focus_areas', []))} focus areas")
 
     # Generate AI narratives WITH PROMPT CONTEXT
-    ai_narratives = generate_ai_narratives_with_prompts(json_data, prompt_context)
+    ai_narratives = generate_ai_narratives_with_prompts(json_data, prompt_context,
+                                                        progress_callback=progress_callback)
     json_data.update(ai_narratives)
 
     # ... [rest of your existing function] ...
@@ -8384,9 +8991,6 @@ def integrate_bespoke_content_with_prompts(doc, json_data, form_prompts=None):
     # Clean up any remaining placeholders
     remove_specific_placeholders(doc)
 
-    # Clean up bullet formatting
-    clean_up_bullet_formatting(doc)
-
     # FINAL CHECK: Verify all placeholders are gone
     verify_no_placeholders_remain(doc)
 
@@ -8400,31 +9004,15 @@ def verify_no_placeholders_remain(doc):
 
     remaining_placeholders = []
 
-    # Check all paragraphs
-    for i, paragraph in enumerate(doc.paragraphs):
+    # Check paragraphs, tables, headers and footers
+    for location, paragraph in scan_paragraphs(doc, "[["):
         text = paragraph.text
-        if "[[" in text and "]]" in text:
-            # Extract placeholder
-            start = text.find("[[")
-            end = text.find("]]", start)
-            if start != -1 and end != -1:
-                placeholder = text[start:end + 2]
-                remaining_placeholders.append((i, placeholder, text[:100]))
-
-    # Check tables
-    for table_idx, table in enumerate(doc.tables):
-        for row_idx, row in enumerate(table.rows):
-            for cell_idx, cell in enumerate(row.cells):
-                for para_idx, paragraph in enumerate(cell.paragraphs):
-                    text = paragraph.text
-                    if "[[" in text and "]]" in text:
-                        start = text.find("[[")
-                        end = text.find("]]", start)
-                        if start != -1 and end != -1:
-                            placeholder = text[start:end + 2]
-                            remaining_placeholders.append(
-                                (f"Table{table_idx}-R{row_idx}-C{cell_idx}-P{para_idx}", placeholder, text[:100])
-                            )
+        # Extract placeholder
+        start = text.find("[[")
+        end = text.find("]]", start)
+        if end != -1:
+            placeholder = text[start:end + 2]
+            remaining_placeholders.append((location, placeholder, text[:100]))
 
     if remaining_placeholders:
         print(f"❌ Found {len(remaining_placeholders)} remaining placeholders:")
@@ -8550,9 +9138,6 @@ def process_document_placeholders(doc, json_data, prompt_context):
     # Handle industry placeholders
     handle_industry_placeholders(doc, json_data)
 
-    # Clean up formatting
-    clean_up_bullet_formatting(doc)
-
 
 def build_content_mapping(json_data, prompt_context):
     """Build comprehensive content mapping for document replacement"""
@@ -8635,528 +9220,518 @@ def handle_complex_sections(doc, json_data):
                 paragraph.text = correct_site_narrative
                 print(f"✅ Fixed incomplete JSON in site context at paragraph {i}")
             else:
-                paragraph.text = ""  # Clear it entirely
-
-    # Also clean up empty or malformed paragraphs
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
-
-        # Remove empty paragraphs with just brackets or malformed content
-        if text in ["[[", "]]", "[[[", "]]]", "{", "}"] or text.startswith("```"):
-            paragraph.text = ""
-            print(f"🗑️ Cleaned malformed content at paragraph {i}")
-
-
-def clean_up_generated_report(doc, json_data):  # Add json_data parameter here
-    """Clean up specific issues in the generated report"""
-    print("🧹 Cleaning up generated report...")
-
-    # Clean up bullet formatting first
-    bullet_fixes = clean_up_bullet_formatting(doc)
-
-    # PROTECT THE STATIC TEXT - This is CRITICAL
-    protected_count = protect_static_executive_summary_text(doc)
-
-    # Clean up Executive Summary specifically (remove wrong content)
-    exec_cleaned_count = clean_executive_summary_content(doc, json_data)
-
-    # Check Executive Summary structure
-    ensure_executive_summary_structure(doc)
-
-    # Remove any remaining AI analysis sections
-    ai_fixes = remove_ai_analysis_sections(doc)
-
-    # Clean up Executive Summary duplicates and wrong content
-    exec_duplicate_fixes = clean_executive_summary_duplicates(doc, json_data)
-
-    # FIX: Ensure all fixes are integers, not None
-    bullet_fixes = bullet_fixes if bullet_fixes is not None else 0
-    ai_fixes = ai_fixes if ai_fixes is not None else 0
-    exec_duplicate_fixes = exec_duplicate_fixes if exec_duplicate_fixes is not None else 0
-    exec_cleaned_count = exec_cleaned_count if exec_cleaned_count is not None else 0
-
-    cleaned_count = bullet_fixes + protected_count + ai_fixes + exec_duplicate_fixes + exec_cleaned_count
-
-    # Clean up specific problematic content patterns
-    problematic_patterns = [
-        "East Hill maritime development can sustain a viable cattle enterprise",
-        "East Hill Farm can sustain a viable cattle enterprise",
-        "maritime development can sustain a viable cattle",
-        "can sustain a viable cattle enterprise",
-        "Solara Energy, a leading utility provider serving",
-        "```json",
-        "Coastal Haven is a vibrant urban center",
-        "The current hazard landscape is characterized",
-        "The path forward is clearly delineated, focusing on a strategic and phased implementation",
-        "Here is a hazard overview explaining current and future hazard trends"
-    ]
-
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
-
-        for pattern in problematic_patterns:
-            if pattern in text:
-                # Check context to decide what to do
-                if pattern in ["East Hill maritime development can sustain a viable cattle enterprise",
-                               "East Hill Farm can sustain a viable cattle enterprise",
-                               "maritime development can sustain a viable cattle",
-                               "can sustain a viable cattle enterprise"]:
-                    # This is definitely wrong content - remove entire paragraph
-                    paragraph.text = ""
-                    cleaned_count += 1
-                    print(f"🗑️ Removed wrong farm content at paragraph {i}")
-                    break
-                elif pattern in ["Solara Energy, a leading utility provider serving",
-                                 "Coastal Haven is a vibrant urban center"]:
-                    # This is definitely wrong content - remove entire paragraph
-                    paragraph.text = ""
-                    cleaned_count += 1
-                    print(f"🗑️ Removed wrong company content at paragraph {i}")
-                    break
-                elif pattern == "```json":
-                    # Remove JSON code blocks
-                    if "site_description" in text or "existing_impacts" in text:
-                        # This should be replaced with proper narrative
-                        # Find client name from context
-                        client_name = json_data.get("client_name", "Ministry of Rural Development")
-                        proper_narrative = f"""{client_name} operates critical infrastructure assets across Fiji's island regions, including coastal protection systems, rural transport networks, and community facilities. The Ministry's infrastructure portfolio is increasingly exposed to climate hazards such as sea-level rise, intensified tropical cyclones, and more variable rainfall patterns.
-
-Current climate impacts are already observable across Fiji's infrastructure systems, including recurrent flood damage to roads and bridges, cyclone destruction of coastal assets, and drought-related water scarcity affecting rural communities. These challenges are expected to intensify with further global warming, requiring systematic adaptation planning to maintain service continuity and protect development investments.
-
-The Ministry's dependence on reliable infrastructure for rural service delivery, consistent resource availability for remote communities, and optimal operating conditions for critical facilities creates multiple exposure points to climate hazards. Understanding these site-specific vulnerabilities forms the foundation for targeted, effective adaptation measures at {client_name}."""
-
-                        paragraph.text = proper_narrative
-                        cleaned_count += 1
-                        print(f"🔧 Replaced JSON code with proper narrative at paragraph {i}")
-                    break
-                elif pattern == "Here is a hazard overview explaining current and future hazard trends":
-                    # Remove this introductory sentence
-                    if len(text) < 100:  # Short paragraph
-                        paragraph.text = ""
-                        cleaned_count += 1
-                        print(f"🗑️ Removed generic hazard introduction at paragraph {i}")
-                    break
-
-    # Also clean up the introduction section specifically
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
-
-        # Fix the introduction section
-        if text.startswith("Solara Energy") or "leading utility provider" in text:
-            # This is definitely wrong - check if we're in Introduction section
-            is_intro = False
-            for j in range(max(0, i - 5), min(len(doc.paragraphs), i + 5)):
-                if "Introduction" in doc.paragraphs[j].text and doc.paragraphs[j].text.strip() == "Introduction":
-                    is_intro = True
-                    break
-
-            if is_intro:
-                client_name = json_data.get("client_name", "Ministry of Rural Development")
-                client_location = json_data.get("client_location", "Republic of Fiji")
-                proper_intro = f"""{client_name} operates Fiji's critical rural infrastructure systems, facing increasing climate-related challenges that threaten service delivery, community resilience, and development progress. This Adaptation Plan provides a structured framework for addressing these challenges through scientifically-informed, practical adaptation measures.
-
-The plan has been developed in response to regulatory requirements and aligns with international best practice standards including ISO 14090. It represents a proactive approach to climate risk management, moving beyond reactive responses toward strategic, forward-looking resilience building.
-
-By embedding climate adaptation into core business processes and decision-making, {client_name} aims to protect its assets, maintain operational efficiency, and ensure the welfare of rural communities in {client_location} through the climate changes projected for the coming decades."""
-
-                paragraph.text = proper_intro
-                cleaned_count += 1
-                print(f"🔧 Fixed wrong content in Introduction at paragraph {i}")
-
-    print(f"🧹 Cleaned {cleaned_count} problematic content sections")
-    return cleaned_count
-
-
-def clean_executive_summary(doc):
-    """Clean up Executive Summary issues including lonely 'The'"""
-    print("🧹 Cleaning Executive Summary...")
-
-    cleaned_count = 0
-
-    # Look for the specific pattern in Executive Summary
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
-
-        # Check if this is in or near Executive Summary section
-        is_exec_summary = False
-        for j in range(max(0, i - 5), min(len(doc.paragraphs), i + 5)):
-            if "Executive Summary" in doc.paragraphs[j].text:
-                is_exec_summary = True
-                break
-
-        if not is_exec_summary:
-            continue
+                paragraph.text = ""  # Clear it entirely
 
-        # Clean up specific issues
-        original_text = paragraph.text
+    # Also clean up empty or malformed paragraphs
+    for i, paragraph in enumerate(doc.paragraphs):
+        text = paragraph.text.strip()
 
-        # Remove lonely "The" on its own line
-        if text == "The":
+        # Remove empty paragraphs with just brackets or malformed content
+        if text in ["[[", "]]", "[[[", "]]]", "{", "}"] or text.startswith("```"):
             paragraph.text = ""
-            cleaned_count += 1
-            print(f"✅ Removed lonely 'The' at paragraph {i}")
-            continue
-
-        # Fix "The\n" pattern
-        if paragraph.text.startswith("The\n"):
-            paragraph.text = paragraph.text[4:]  # Remove "The\n"
-            cleaned_count += 1
-            print(f"✅ Fixed 'The\\n' pattern at paragraph {i}")
-            continue
-
-        # Fix "\nThe\n" pattern
-        if "\nThe\n" in paragraph.text:
-            paragraph.text = paragraph.text.replace("\nThe\n", "\n")
-            cleaned_count += 1
-            print(f"✅ Fixed '\\nThe\\n' pattern at paragraph {i}")
-            continue
+            print(f"🗑️ Cleaned malformed content at paragraph {i}")
 
-        # Remove "The" at the beginning of a paragraph
-        if text.startswith("The "):
-            # Check if it's just "The " followed by nothing useful
-            if len(text) < 10:
-                paragraph.text = ""
-                cleaned_count += 1
-                print(f"✅ Removed incomplete 'The' at paragraph {i}")
 
-    # Also clean up empty paragraphs in Executive Summary
-    for i, paragraph in enumerate(doc.paragraphs):
-        if i > 0 and i < len(doc.paragraphs) - 1:
-            # Check if this is an empty paragraph in Executive Summary
-            if paragraph.text.strip() == "":
-                prev_text = doc.paragraphs[i - 1].text.strip()
-                next_text = doc.paragraphs[i + 1].text.strip()
+# ---------------- CLEANUP RULES ----------------
+# The cleanup passes used to rescan doc.paragraphs once per pattern list. Each is now a rule
+# in CLEANUP_RULES, and CleanupVisitor walks the body once applying every requested rule to
+# each paragraph, in the order given. A rule that looks ahead declares how far, and it and
+# every rule after it trail the walk by that many paragraphs. Its window then shows what
+# the earlier rules made of those paragraphs, as the old one-pass-per-function order did.
 
-                # Check if surrounding paragraphs mention Executive Summary
-                if "Executive Summary" in prev_text or "Executive Summary" in next_text:
-                    # Merge with next paragraph if it has content
-                    if next_text:
-                        doc.paragraphs[i + 1].text = paragraph.text + doc.paragraphs[i + 1].text
-                        paragraph.text = ""
-                        cleaned_count += 1
+EXEC_SUMMARY_STATIC_PATTERNS = [
+    "Regulatory alignment: Integrates adaptation",
+    "Actionable pathway: Translates risk insights",
+    "Continuous improvement: Establishes monitoring"
+]
 
-    print(f"✅ Cleaned {cleaned_count} issues in Executive Summary")
-    return cleaned_count
+EXEC_SUMMARY_STATIC_HEADING = "1.1 Why this plan and what it delivers"
 
+EXEC_SUMMARY_AI_INDICATORS = ["AI Analysis", "AI-generated", "• Regulatory alignment", "• Actionable pathway",
+                              "• Continuous improvement"]
 
-def clean_executive_summary_duplicates(doc, json_data=None):  # Add optional json_data parameter
-    """Clean up duplicate static text and wrong content in Executive Summary"""
-    print("🧹 Cleaning Executive Summary duplicates and wrong content...")
+EXEC_SUMMARY_KEY_MESSAGE_KEYWORDS = ["value", "urgency", "action", "strategic", "implementation"]
 
-    cleaned_count = 0
-    in_exec_summary = False
-    exec_summary_start = None
+WRONG_FARM_CONTENT_PATTERNS = [
+    "East Hill maritime development can sustain a viable cattle enterprise",
+    "East Hill Farm can sustain a viable cattle enterprise",
+    "maritime development can sustain a viable cattle",
+    "can sustain a viable cattle enterprise"
+]
 
-    # First, find the Executive Summary section
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
+AI_ANALYSIS_SECTION_PATTERNS = [
+    "AI-Powered Analysis",
+    "Based on the provided files, here's an analysis",
+    "eastern country/firm",
+    "Main Climate Risks and Vulnerabilities to Eastern",
+    "AI Analysis of",
+    "**AI Analysis of**"
+]
 
-        if "Executive Summary" in text and not in_exec_summary:
-            in_exec_summary = True
-            exec_summary_start = i
-            print(f"✅ Found Executive Summary at paragraph {i}")
-            break
+DEFAULT_UNWANTED_AI_PATTERNS = [
+    "AI-Powered Analysis",
+    "Based on the provided file names",
+    "Climate Risk Assessment: Eastern",
+    "Eastern Country/Firm",
+    "Main Climate Risks and Vulnerabilities:"
+]
 
-    if not exec_summary_start:
-        print("⚠️ Could not find Executive Summary section")
-        return 0
+MINISTRY_EXECUTIVE_SUMMARY = """The Ministry of Rural Development can maintain resilient infrastructure operations through approximately 3°C global warming by implementing prioritized adaptation actions and developing required capabilities. Beyond that, transformational options should be developed in parallel. The plan embeds the disciplines—governance, triggers, monitoring and integration—needed to make adaptation routine, auditable and proportionate. Immediate next step: Endorse this executive summary and instruct preparation of the detailed Implementation Plan with budget, triggers and responsibilities, followed by the first six-monthly review cycle."""
 
-    # Look for duplicate static text and wrong content within Executive Summary
-    static_text_patterns = [
-        "Regulatory alignment: Integrates adaptation",
-        "Actionable pathway: Translates risk insights",
-        "Continuous improvement: Establishes monitoring"
-    ]
 
-    wrong_content_patterns = [
-        "East Hill maritime development can sustain a viable cattle enterprise",
-        "East Hill Farm can sustain a viable cattle enterprise",
-        "maritime development can sustain a viable cattle",
-        "can sustain a viable cattle enterprise"
-    ]
+class CleanupRule:
+    """One cleanup check: apply(visit, i, text) runs for body paragraphs containing a trigger.
 
-    duplicate_found = False
-    lines_seen = []
+    triggers=None runs the rule on every paragraph. lookahead is how many following
+    paragraphs apply() reads. finish(visit), if given, runs once after the walk (for table
+    cells or summary output).
+    """
 
-    for i in range(exec_summary_start, min(exec_summary_start + 30, len(doc.paragraphs))):
-        paragraph = doc.paragraphs[i]
-        text = paragraph.text.strip()
+    def __init__(self, name, apply, triggers=None, lookahead=0, finish=None):
+        self.name = name
+        self.apply = apply
+        self.triggers = tuple(triggers) if triggers is not None else None
+        self.lookahead = lookahead
+        self.finish = finish
+
+
+class CleanupVisitor:
+    """Single walk over the body paragraphs applying a list of CleanupRules"""
+
+    def __init__(self, doc, rule_names, json_data=None):
+        self.doc = doc
+        self.json_data = json_data
+        self.rules = [CLEANUP_RULES[name] for name in rule_names]
+        self.paragraphs = list(get_document_index(doc))
+        self.texts = [paragraph.text for paragraph in self.paragraphs]
+        self.counts = Counter()
+        self.state = {}
+        # Fixed at the start of the walk, like the passes that located it before editing
+        self.exec_start = next((i for i, text in enumerate(self.texts) if "Executive Summary" in text), None)
+        triggers = {trigger for rule in self.rules if rule.triggers for trigger in rule.triggers}
+        self.trigger_pattern = re.compile("|".join(map(re.escape, triggers))) if triggers else None
+
+    def set_text(self, i, text, rule):
+        self.paragraphs[i].text = text
+        self.texts[i] = text
+        self.counts[rule] += 1
+
+    def clear(self, i, rule):
+        self.paragraphs[i].clear()
+        self.texts[i] = ""
+        self.counts[rule] += 1
+
+    def near(self, i, before, after, needle):
+        """True if needle is in any paragraph from i - before up to (not including) i + after"""
+        return any(needle in text for text in self.texts[max(0, i - before):i + after])
+
+    def walk(self):
+        print(f"🧹 Cleanup walk over {len(self.paragraphs)} paragraphs: {', '.join(r.name for r in self.rules)}")
+        lags, lag = [], 0
+        for rule in self.rules:
+            lag = max(lag, rule.lookahead)
+            lags.append(lag)
+
+        count = len(self.paragraphs)
+        gate = [None] * count  # (text, any trigger present) per paragraph
+        for step in range(count + lag):
+            for rule, rule_lag in zip(self.rules, lags):
+                i = step - rule_lag
+                if not 0 <= i < count:
+                    continue
+                text = self.texts[i]
+                if rule.triggers is None:
+                    rule.apply(self, i, text)
+                    continue
+                if gate[i] is None or gate[i][0] is not text:
+                    gate[i] = (text, self.trigger_pattern.search(text) is not None)
+                if gate[i][1] and any(trigger in text for trigger in rule.triggers):
+                    rule.apply(self, i, text)
+
+        for rule in self.rules:
+            if rule.finish:
+                rule.finish(self)
+
+        if self.counts:
+            print("✅ Cleanup: " + ", ".join(f"{name} {count}" for name, count in self.counts.items()))
+        return self
+
+
+def run_cleanup(doc, rule_names, json_data=None):
+    """Apply rule_names in one body walk; returns the per-rule change counts"""
+    return CleanupVisitor(doc, rule_names, json_data).walk().counts
+
+
+def rule_exec_lonely_the(visit, i, text):
+    """Lonely or truncated 'The' left by generation near the Executive Summary"""
+    if not visit.near(i, 5, 5, "Executive Summary"):
+        return
+    stripped = text.strip()
+    if stripped == "The":
+        visit.set_text(i, "", "exec_lonely_the")
+    elif text.startswith("The\n"):
+        visit.set_text(i, text[4:], "exec_lonely_the")
+    elif "\nThe\n" in text:
+        visit.set_text(i, text.replace("\nThe\n", "\n"), "exec_lonely_the")
+    elif stripped.startswith("The ") and len(stripped) < 10:
+        visit.set_text(i, "", "exec_lonely_the")
+
+
+def rule_exec_empty_merge(visit, i, text):
+    """Fold an empty paragraph next to Executive Summary into the paragraph after it"""
+    if i == 0 or i >= len(visit.texts) - 1 or text.strip() != "":
+        return
+    next_text = visit.texts[i + 1]
+    if "Executive Summary" in visit.texts[i - 1] or "Executive Summary" in next_text:
+        if next_text.strip():
+            visit.set_text(i + 1, text + next_text, "exec_empty_merge")
+            visit.paragraphs[i].text = ""
+            visit.texts[i] = ""
+
+
+def rule_exec_duplicates(visit, i, text):
+    """Wrong farm content and near-duplicate static bullets in the 30 paragraphs after Executive Summary"""
+    start = visit.exec_start
+    if not start or not start <= i < start + 30:
+        return
+    stripped = text.strip()
+
+    for wrong_pattern in WRONG_FARM_CONTENT_PATTERNS:
+        if wrong_pattern in stripped:
+            if visit.json_data:
+                client_name = visit.json_data.get("client_name", "Ministry of Rural Development")
+                client_location = visit.json_data.get("client_location", "Republic of Fiji")
+                visit.set_text(i, f"{client_name} can maintain resilient operations in {client_location} through climate adaptation by implementing prioritized actions and developing required capabilities.", "exec_duplicates")
+            else:
+                visit.set_text(i, "", "exec_duplicates")
+            print(f"🗑️ Removed wrong farm content: '{wrong_pattern[:50]}...'")
+            break
 
-        # Remove wrong farm content
-        for wrong_pattern in wrong_content_patterns:
-            if wrong_pattern in text:
-                if json_data:
-                    # Replace with correct client name
-                    client_name = json_data.get("client_name", "Ministry of Rural Development")
-                    client_location = json_data.get("client_location", "Republic of Fiji")
-                    correct_text = f"{client_name} can maintain resilient operations in {client_location} through climate adaptation by implementing prioritized actions and developing required capabilities."
-                    paragraph.text = correct_text
-                else:
-                    paragraph.text = ""
-                cleaned_count += 1
-                print(f"🗑️ Removed wrong farm content: '{wrong_pattern[:50]}...'")
+    if any(pattern in stripped for pattern in EXEC_SUMMARY_STATIC_PATTERNS):
+        lines_seen = visit.state.setdefault("exec_lines_seen", [])
+        words = set(stripped.split())
+        for seen_line in lines_seen:
+            similarity = len(words & set(seen_line.split())) / max(len(stripped.split()), len(seen_line.split()))
+            if similarity > 0.8:  # 80% similar
+                visit.set_text(i, "", "exec_duplicates")
+                print(f"🗑️ Removed duplicate static text: '{stripped[:50]}...'")
                 break
 
-        # Check for duplicate static text
-        if any(pattern in text for pattern in static_text_patterns):
-            # Check if we've seen this line before
-            for seen_line in lines_seen:
-                similarity = len(set(text.split()) & set(seen_line.split())) / max(len(text.split()),
-                                                                                   len(seen_line.split()))
-                if similarity > 0.8:  # 80% similar
-                    # This is a duplicate
-                    paragraph.text = ""
-                    duplicate_found = True
-                    cleaned_count += 1
-                    print(f"🗑️ Removed duplicate static text: '{text[:50]}...'")
-                    break
-
-            if text and not any(wrong_pattern in text for wrong_pattern in wrong_content_patterns):
-                lines_seen.append(text)
+        if stripped and not any(wrong_pattern in stripped for wrong_pattern in WRONG_FARM_CONTENT_PATTERNS):
+            lines_seen.append(stripped)
+
+
+def rule_key_messages_split(visit, i, text):
+    """Split 'Key messages (value, urgency, actions): ...' so the heading ends at the colon"""
+    if not visit.exec_start:
+        return
+    stripped = text.strip()
+    if "value, urgency, actions" in stripped and ":" in stripped and not stripped.endswith(":"):
+        parts = stripped.split(":")
+        visit.set_text(i, f"{parts[0].strip()}:", "key_messages_split")
+        rest_text = ":".join(parts[1:]).strip()
+        if rest_text:
+            new_para = visit.paragraphs[i].insert_paragraph_before(rest_text)
+            new_para.style = "Normal"
+
+
+def rule_wrong_farm_content(visit, i, text):
+    if "East Hill maritime development can sustain a viable cattle enterprise" in text:
+        visit.set_text(i, MINISTRY_EXECUTIVE_SUMMARY, "wrong_farm_content")
+        print("✅ Fixed wrong farm content in Executive Summary")
+
+
+def rule_regulatory_duplicates(visit, i, text):
+    """Drop an identical '• Regulatory alignment:' bullet repeated within two paragraphs"""
+    count = sum(1 for other in visit.texts[max(0, i - 3):i + 3] if "• Regulatory alignment:" in other)
+    if count > 1:
+        for j in range(max(0, i - 2), min(len(visit.texts), i + 2)):
+            if j != i and visit.texts[j].strip() == text:
+                visit.set_text(i, "", "regulatory_duplicates")
+                print("✅ Removed duplicate static text")
+                break
 
-    # Also clean up the "Key messages" section to ensure proper formatting
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
 
-        if "Key messages" in text and "value, urgency, actions" in text:
-            # Make sure it's properly formatted
-            if ":" in text and not text.endswith(":"):
-                # Fix the formatting
-                parts = text.split(":")
-                if len(parts) >= 2:
-                    paragraph.text = f"{parts[0].strip()}:"
-                    # Add the rest as a new paragraph if needed
-                    rest_text = ":".join(parts[1:]).strip()
-                    if rest_text:
-                        new_para = doc.paragraphs[i].insert_paragraph_before(rest_text)
-                        new_para.style = "Normal"
+def rule_east_hill_reference(visit, i, text):
+    if "Farm" not in text and "maritime" not in text:
+        visit.set_text(i, text.replace("East Hill", "Ministry of Rural Development"), "east_hill_reference")
 
-    print(f"✅ Cleaned {cleaned_count} issues in Executive Summary")
-    return cleaned_count
 
+def rule_ai_analysis_sections(visit, i, text):
+    stripped = text.strip()
+    if any(section_text in stripped for section_text in AI_ANALYSIS_SECTION_PATTERNS):
+        visit.clear(i, "ai_analysis_sections")
+        print(f"🗑️ Removed AI analysis section at paragraph {i}: '{stripped[:50]}...'")
 
-def protect_static_executive_summary_text(doc):
-    """Remove any AI-generated content that duplicates the static '1.1 Why this plan...' text"""
-    print("🛡️ Protecting static Executive Summary text...")
+    # Also paragraphs that start with numbers like "12 AI-Powered Analysis"
+    if stripped and stripped[0].isdigit() and any(x in stripped for x in ["AI", "Analysis", "eastern"]):
+        visit.clear(i, "ai_analysis_sections")
+        print(f"🗑️ Removed numbered AI analysis at paragraph {i}")
 
-    static_text_phrases = [
-        "Regulatory alignment: Integrates adaptation",
-        "Actionable pathway: Translates risk insights",
-        "Continuous improvement: Establishes monitoring",
-        "1.1 Why this plan and what it delivers"
-    ]
 
-    removed_count = 0
-    ai_content_indicators = ["AI Analysis", "AI-generated", "• Regulatory alignment", "• Actionable pathway",
-                             "• Continuous improvement"]
+def rule_problematic_content(visit, i, text):
+    """Content from other clients or raw model output that must not reach the report"""
+    stripped = text.strip()
+    if any(pattern in stripped for pattern in WRONG_FARM_CONTENT_PATTERNS):
+        visit.set_text(i, "", "problematic_content")
+        print(f"🗑️ Removed wrong farm content at paragraph {i}")
+    elif "Solara Energy, a leading utility provider serving" in stripped:
+        visit.set_text(i, "", "problematic_content")
+        print(f"🗑️ Removed wrong company content at paragraph {i}")
+    elif "```json" in stripped:
+        if "site_description" in stripped or "existing_impacts" in stripped:
+            client_name = visit.json_data.get("client_name", "Ministry of Rural Development")
+            proper_narrative = f"""{client_name} operates critical infrastructure assets across Fiji's island regions, including coastal protection systems, rural transport networks, and community facilities. The Ministry's infrastructure portfolio is increasingly exposed to climate hazards such as sea-level rise, intensified tropical cyclones, and more variable rainfall patterns.
 
-    # First pass: Remove any AI analysis sections
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
+Current climate impacts are already observable across Fiji's infrastructure systems, including recurrent flood damage to roads and bridges, cyclone destruction of coastal assets, and drought-related water scarcity affecting rural communities. These challenges are expected to intensify with further global warming, requiring systematic adaptation planning to maintain service continuity and protect development investments.
 
-        # Remove AI analysis headings
-        if any(indicator in text for indicator in ai_content_indicators):
-            # Check if this is in Executive Summary section
-            is_in_exec_summary = False
-            # Look backwards to see if we're in Executive Summary
-            for j in range(max(0, i - 10), i):
-                if "Executive Summary" in doc.paragraphs[j].text:
-                    is_in_exec_summary = True
-                    break
+The Ministry's dependence on reliable infrastructure for rural service delivery, consistent resource availability for remote communities, and optimal operating conditions for critical facilities creates multiple exposure points to climate hazards. Understanding these site-specific vulnerabilities forms the foundation for targeted, effective adaptation measures at {client_name}."""
+            visit.set_text(i, proper_narrative, "problematic_content")
+            print(f"🔧 Replaced JSON code with proper narrative at paragraph {i}")
+    elif "Coastal Haven is a vibrant urban center" in stripped:
+        visit.set_text(i, "", "problematic_content")
+        print(f"🗑️ Removed wrong company content at paragraph {i}")
+    elif "Here is a hazard overview explaining current and future hazard trends" in stripped:
+        if len(stripped) < 100:  # Short paragraph
+            visit.set_text(i, "", "problematic_content")
+            print(f"🗑️ Removed generic hazard introduction at paragraph {i}")
+
+
+def rule_introduction_content(visit, i, text):
+    """Replace another client's introduction when it sits under the Introduction heading"""
+    stripped = text.strip()
+    if not (stripped.startswith("Solara Energy") or "leading utility provider" in stripped):
+        return
+    if any(other.strip() == "Introduction" for other in visit.texts[max(0, i - 5):i + 5]):
+        client_name = visit.json_data.get("client_name", "Ministry of Rural Development")
+        client_location = visit.json_data.get("client_location", "Republic of Fiji")
+        proper_intro = f"""{client_name} operates Fiji's critical rural infrastructure systems, facing increasing climate-related challenges that threaten service delivery, community resilience, and development progress. This Adaptation Plan provides a structured framework for addressing these challenges through scientifically-informed, practical adaptation measures.
 
-            if is_in_exec_summary:
-                paragraph.clear()
-                removed_count += 1
-                print(f"🗑️ Removed AI analysis heading at paragraph {i}")
+The plan has been developed in response to regulatory requirements and aligns with international best practice standards including ISO 14090. It represents a proactive approach to climate risk management, moving beyond reactive responses toward strategic, forward-looking resilience building.
 
-    # Second pass: Find and protect the static text section
-    static_section_found = False
-    static_section_index = -1
+By embedding climate adaptation into core business processes and decision-making, {client_name} aims to protect its assets, maintain operational efficiency, and ensure the welfare of rural communities in {client_location} through the climate changes projected for the coming decades."""
+        visit.set_text(i, proper_intro, "introduction_content")
+        print(f"🔧 Fixed wrong content in Introduction at paragraph {i}")
+
+
+def unwanted_ai_patterns():
+    if REPORT_SETTINGS and REPORT_SETTINGS.get("unwanted_ai_patterns"):
+        return REPORT_SETTINGS["unwanted_ai_patterns"]
+    return DEFAULT_UNWANTED_AI_PATTERNS
+
+
+def rule_unwanted_ai_analysis(visit, i, text):
+    """Clear pattern paragraphs within ten paragraphs of an 'AI-Powered Analysis' heading"""
+    patterns = visit.state.setdefault("unwanted_ai_patterns", unwanted_ai_patterns())
+    if not any(pattern in text for pattern in patterns):
+        return
+    section_start = visit.state.get("ai_section_start")
+    in_section = section_start is not None and i < section_start + 10
+    if not in_section and "AI-Powered Analysis" in text:
+        visit.state["ai_section_start"] = i
+        in_section = True
+    if in_section:
+        visit.clear(i, "unwanted_ai_analysis")
+        print(f"✅ Cleared paragraph {i} containing AI analysis")
+
+
+def finish_unwanted_ai_analysis(visit):
+    patterns = visit.state.get("unwanted_ai_patterns") or unwanted_ai_patterns()
+    for table in visit.doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for paragraph in cell.paragraphs:
+                    text = paragraph.text
+                    for pattern in patterns:
+                        if pattern in text:
+                            paragraph.clear()
+                            visit.counts["unwanted_ai_analysis"] += 1
+                            print("✅ Cleared AI analysis from table cell")
 
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
 
-        # Find the static text section
-        if "1.1 Why this plan and what it delivers" in text:
-            static_section_found = True
-            static_section_index = i
-            print(f"✅ Found static text section at paragraph {i}")
-
-            # Check next few paragraphs for the bullet points
-            for j in range(i, min(i + 10, len(doc.paragraphs))):
-                next_text = doc.paragraphs[j].text.strip()
-                # If this paragraph looks like it might be AI-duplicated content after the static section
-                if j > i + 3 and any(phrase in next_text for phrase in static_text_phrases[1:]):
-                    # Clear AI-duplicated content
-                    doc.paragraphs[j].clear()
-                    removed_count += 1
-                    print(f"🗑️ Cleared AI-duplicated static text at paragraph {j}")
-
-    # Third pass: Clean up any orphaned content
-    if static_section_found and static_section_index > 0:
-        # Check paragraphs immediately before the static text for AI duplicates
-        for i in range(max(0, static_section_index - 3), static_section_index):
-            text = doc.paragraphs[i].text.strip()
-            if any(phrase in text for phrase in static_text_phrases):
-                # This is likely AI content trying to duplicate static text
-                doc.paragraphs[i].clear()
-                removed_count += 1
-                print(f"🗑️ Cleared pre-static AI duplicate at paragraph {i}")
+def standalone_placeholder_rule(name, placeholders):
+    """Rule clearing paragraphs that are nothing but one of placeholders"""
+    placeholders = set(placeholders)
 
-    print(f"🛡️ Protected static text: removed {removed_count} AI duplicates")
-    return removed_count
+    def apply(visit, i, text):
+        if text.strip() in placeholders:
+            print(f"✅ Removed figure placeholder: {text.strip()}")
+            visit.set_text(i, "", name)
 
+    return CleanupRule(name, apply, triggers=placeholders)
 
-def ensure_executive_summary_structure(doc):
-    """Ensure Executive Summary has proper structure with AI content in right place"""
-    print("🔧 Checking Executive Summary structure...")
 
-    # Find the Executive Summary heading
-    exec_heading_index = -1
-    static_text_index = -1
+def rule_toc_bounds(visit, i, text):
+    """Locate the TOC (read-only; reported by finish_toc_bounds)"""
+    stripped = text.strip()
+    if "toc_start" not in visit.state:
+        if "Table of Contents" in stripped:
+            visit.state["toc_start"] = i
+            print(f"✅ Found TOC start at paragraph {i}")
+    elif "toc_end" not in visit.state and ("List of Figures" in stripped or "List of Tables" in stripped):
+        visit.state["toc_end"] = i
+        print(f"✅ Found end of TOC at paragraph {i}")
 
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
 
-        if "Executive Summary" in text and exec_heading_index == -1:
-            exec_heading_index = i
-            print(f"✅ Found 'Executive Summary' heading at paragraph {i}")
+def finish_toc_bounds(visit):
+    if "toc_start" not in visit.state:
+        print("⚠️ TOC not found in document")
 
-        if "1.1 Why this plan and what it delivers" in text and static_text_index == -1:
-            static_text_index = i
-            print(f"✅ Found static text section at paragraph {i}")
-            break  # Only find the first occurrence
 
-    if exec_heading_index == -1:
+def rule_exec_static_text(visit, i, text):
+    """AI copies of the static '1.1 Why this plan...' text and AI headings in the Executive Summary"""
+    if "static_text_indexes" not in visit.state:
+        # Copies of the heading 4-9 paragraphs after a kept one are cleared as duplicates below
+        kept = []
+        for k, t in enumerate(visit.texts):
+            if EXEC_SUMMARY_STATIC_HEADING in t and not any(q + 4 <= k <= q + 9 for q in kept):
+                kept.append(k)
+        visit.state["static_text_indexes"] = kept
+    kept = visit.state["static_text_indexes"]
+    static_index = kept[-1] if kept else -1
+
+    if any(indicator in text for indicator in EXEC_SUMMARY_AI_INDICATORS) and visit.near(i, 10, 0, "Executive Summary"):
+        visit.clear(i, "exec_static_text")
+        print(f"🗑️ Removed AI analysis heading at paragraph {i}")
+    elif (any(phrase in text for phrase in EXEC_SUMMARY_STATIC_PATTERNS[1:] + [EXEC_SUMMARY_STATIC_HEADING])
+          and any(q + 4 <= i <= q + 9 for q in kept)):
+        visit.clear(i, "exec_static_text")
+        print(f"🗑️ Cleared AI-duplicated static text at paragraph {i}")
+    elif (0 < static_index and static_index - 3 <= i < static_index
+          and any(phrase in text for phrase in EXEC_SUMMARY_STATIC_PATTERNS + [EXEC_SUMMARY_STATIC_HEADING])):
+        visit.clear(i, "exec_static_text")
+        print(f"🗑️ Cleared pre-static AI duplicate at paragraph {i}")
+
+
+def rule_exec_summary_content(visit, i, text):
+    """Other clients' farm content, and markdown or colon-less key-message bullets in the Executive Summary"""
+    if any(pattern in text for pattern in WRONG_FARM_CONTENT_PATTERNS):
+        client_name = visit.json_data.get("client_name", "Ministry of Rural Development")
+        client_location = visit.json_data.get("client_location", "Republic of Fiji")
+        text = f"{client_name} can maintain resilient operations in {client_location} through comprehensive climate adaptation by implementing prioritized actions and developing required capabilities."
+        visit.set_text(i, text, "exec_summary_content")
+        print(f"✅ Fixed wrong farm content in Executive Summary at paragraph {i}")
+
+    # Bullets within 20 paragraphs of an Executive Summary heading
+    if not visit.near(i, 19, 1, "Executive Summary"):
+        return
+    if text.startswith("* ") or text.startswith("- "):
+        text = "• " + text[2:]
+        visit.set_text(i, text, "exec_summary_content")
+    if "•" in text and ":" not in text and any(keyword in text.lower() for keyword in EXEC_SUMMARY_KEY_MESSAGE_KEYWORDS):
+        parts = text.split("• ", 1)
+        words = parts[1].split() if len(parts) > 1 else []
+        if len(words) > 1:
+            visit.set_text(i, f"• {words[0].rstrip(':')}: {' '.join(words[1:])}", "exec_summary_content")
+
+
+def rule_exec_structure(visit, i, text):
+    """Locate the static '1.1 Why this plan...' text (read-only; reported by finish_exec_structure)"""
+    if "static_text_start" not in visit.state:
+        visit.state["static_text_start"] = i
+        print(f"✅ Found static text section at paragraph {i}")
+
+
+def finish_exec_structure(visit):
+    static_start = visit.state.get("static_text_start")
+    if visit.exec_start is None:
         print("⚠️ Could not find Executive Summary heading")
-        return False
-
-    # Check structure
-    if static_text_index == -1:
+    elif static_start is None:
         print("⚠️ Could not find static text section - template might be missing it")
-    elif static_text_index <= exec_heading_index + 2:
+    elif static_start <= visit.exec_start + 2:
         print("⚠️ Static text appears too close to heading - may be missing AI content")
-        return False
-
-    print("✅ Executive Summary structure looks good")
-    return True
+    else:
+        print("✅ Executive Summary structure looks good")
+
+
+CLEANUP_RULES = {rule.name: rule for rule in [
+    CleanupRule("exec_lonely_the", rule_exec_lonely_the, triggers=("The",)),
+    CleanupRule("exec_empty_merge", rule_exec_empty_merge),
+    CleanupRule("exec_duplicates", rule_exec_duplicates),
+    CleanupRule("key_messages_split", rule_key_messages_split, triggers=("Key messages",)),
+    CleanupRule("wrong_farm_content", rule_wrong_farm_content,
+                triggers=("East Hill maritime development can sustain a viable cattle enterprise",)),
+    CleanupRule("regulatory_duplicates", rule_regulatory_duplicates, triggers=("• Regulatory alignment:",),
+                lookahead=2),
+    CleanupRule("east_hill_reference", rule_east_hill_reference, triggers=("East Hill",)),
+    CleanupRule("ai_analysis_sections", rule_ai_analysis_sections),
+    CleanupRule("problematic_content", rule_problematic_content,
+                triggers=WRONG_FARM_CONTENT_PATTERNS + [
+                    "Solara Energy, a leading utility provider serving", "```json",
+                    "Coastal Haven is a vibrant urban center",
+                    "Here is a hazard overview explaining current and future hazard trends"]),
+    CleanupRule("introduction_content", rule_introduction_content,
+                triggers=("Solara Energy", "leading utility provider")),
+    CleanupRule("unwanted_ai_analysis", rule_unwanted_ai_analysis, finish=finish_unwanted_ai_analysis),
+    standalone_placeholder_rule("missed_figure_placeholders", MISSED_FIGURE_PLACEHOLDERS),
+    standalone_placeholder_rule("unused_figure_placeholders", UNUSED_FIGURE_PLACEHOLDERS),
+    CleanupRule("toc_bounds", rule_toc_bounds, triggers=("Table of Contents", "List of Figures", "List of Tables"),
+                finish=finish_toc_bounds),
+    CleanupRule("exec_static_text", rule_exec_static_text,
+                triggers=EXEC_SUMMARY_AI_INDICATORS + EXEC_SUMMARY_STATIC_PATTERNS + [EXEC_SUMMARY_STATIC_HEADING]),
+    CleanupRule("exec_summary_content", rule_exec_summary_content,
+                triggers=WRONG_FARM_CONTENT_PATTERNS + ["* ", "- ", "•"]),
+    CleanupRule("exec_structure", rule_exec_structure, triggers=(EXEC_SUMMARY_STATIC_HEADING,),
+                finish=finish_exec_structure),
+]}
+
+# Rule groups for the three points in the pipeline where cleanup passes ran back to back
+NARRATIVE_CLEANUP_RULES = ["exec_lonely_the", "exec_empty_merge", "exec_duplicates", "key_messages_split",
+                           "wrong_farm_content", "regulatory_duplicates", "east_hill_reference"]
+GENERATED_REPORT_CLEANUP_RULES = ["ai_analysis_sections", "exec_static_text", "exec_summary_content",
+                                  "exec_structure", "exec_duplicates", "key_messages_split",
+                                  "problematic_content", "introduction_content"]
+FINAL_CLEANUP_RULES = ["unwanted_ai_analysis", "missed_figure_placeholders", "unused_figure_placeholders",
+                       "toc_bounds"]
+
+
+def clean_up_after_narratives(doc):
+    """Executive Summary clean-up after narrative integration, in one walk"""
+    return sum(run_cleanup(doc, NARRATIVE_CLEANUP_RULES).values())
+
+
+def final_cleanup(doc):
+    """AI-analysis leftovers, unused figure placeholders and TOC check, in one walk"""
+    return sum(run_cleanup(doc, FINAL_CLEANUP_RULES).values())
 
 
-def clean_executive_summary_content(doc, json_data):
-    """Simple cleanup for Executive Summary - remove wrong content and ensure proper structure"""
-    print("🧹 Cleaning Executive Summary content...")
+def clean_up_generated_report(doc, json_data):  # Add json_data parameter here
+    """Clean up specific issues in the generated report"""
+    print("🧹 Cleaning up generated report...")
 
-    wrong_content_patterns = [
-        "East Hill maritime development can sustain a viable cattle enterprise",
-        "East Hill Farm can sustain a viable cattle enterprise",
-        "maritime development can sustain a viable cattle",
-        "can sustain a viable cattle enterprise",
-        "Solara Energy, a leading utility provider serving"
-    ]
+    # AI analysis sections, duplicated static text, wrong Executive Summary content and
+    # problematic content patterns in one walk
+    cleaned_count = sum(run_cleanup(doc, GENERATED_REPORT_CLEANUP_RULES, json_data).values())
 
-    cleaned_count = 0
+    print(f"🧹 Cleaned {cleaned_count} problematic content sections")
+    return cleaned_count
 
-    # First, fix wrong content
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text
 
-        for wrong_pattern in wrong_content_patterns:
-            if wrong_pattern in text:
-                # Replace with correct content based on client
-                client_name = json_data.get("client_name", "Ministry of Rural Development")
-                client_location = json_data.get("client_location", "Republic of Fiji")
-
-                if "maritime development" in wrong_pattern or "cattle enterprise" in wrong_pattern:
-                    correct_text = f"{client_name} can maintain resilient operations in {client_location} through comprehensive climate adaptation by implementing prioritized actions and developing required capabilities."
-                    paragraph.text = correct_text
-                    cleaned_count += 1
-                    print(f"✅ Fixed wrong farm content in Executive Summary at paragraph {i}")
-                break
+def clean_executive_summary(doc):
+    """Clean up Executive Summary issues including lonely 'The'"""
+    print("🧹 Cleaning Executive Summary...")
+    cleaned_count = sum(run_cleanup(doc, ["exec_lonely_the", "exec_empty_merge"]).values())
+    print(f"✅ Cleaned {cleaned_count} issues in Executive Summary")
+    return cleaned_count
 
-    # Second, ensure proper bullet formatting
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
 
-        # Fix bullet formatting in Executive Summary
-        if "Executive Summary" in paragraph.text:
-            # Check next 20 paragraphs for bullet issues
-            for j in range(i, min(i + 20, len(doc.paragraphs))):
-                bullet_text = doc.paragraphs[j].text
-
-                # Replace markdown bullets with proper bullets
-                if bullet_text.startswith("* "):
-                    doc.paragraphs[j].text = bullet_text.replace("* ", "• ", 1)
-                elif bullet_text.startswith("- "):
-                    doc.paragraphs[j].text = bullet_text.replace("- ", "• ", 1)
-
-                # Ensure proper formatting for key messages
-                bullet_text = doc.paragraphs[j].text
-                if "•" in bullet_text and ":" not in bullet_text:
-                    # Check if this is a key message that needs colon
-                    lower_text = bullet_text.lower()
-                    if any(keyword in lower_text for keyword in
-                           ["value", "urgency", "action", "strategic", "implementation"]):
-                        parts = bullet_text.split("• ", 1)
-                        if len(parts) > 1:
-                            content = parts[1]
-                            words = content.split()
-                            if len(words) > 1:
-                                first_word = words[0].rstrip(":")
-                                rest = " ".join(words[1:])
-                                doc.paragraphs[j].text = f"• {first_word}: {rest}"
-
-    print(f"✅ Cleaned {cleaned_count} items from Executive Summary")
+def clean_executive_summary_duplicates(doc, json_data=None):  # Add optional json_data parameter
+    """Clean up duplicate static text and wrong content in Executive Summary"""
+    print("🧹 Cleaning Executive Summary duplicates and wrong content...")
+    cleaned_count = sum(run_cleanup(doc, ["exec_duplicates", "key_messages_split"], json_data).values())
+    print(f"✅ Cleaned {cleaned_count} issues in Executive Summary")
     return cleaned_count
 
+
 def quick_fix_executive_summary(doc):
     """Quick fix for the Executive Summary issues"""
     print("🚀 Applying quick fix to Executive Summary...")
-
-    cleaned_count = 0
-
-    # Find and fix the wrong farm content
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text
-
-        # Remove the wrong farm content and replace it
-        if "East Hill maritime development can sustain a viable cattle enterprise" in text:
-            # Replace with correct Ministry content
-            correct_text = """The Ministry of Rural Development can maintain resilient infrastructure operations through approximately 3°C global warming by implementing prioritized adaptation actions and developing required capabilities. Beyond that, transformational options should be developed in parallel. The plan embeds the disciplines—governance, triggers, monitoring and integration—needed to make adaptation routine, auditable and proportionate. Immediate next step: Endorse this executive summary and instruct preparation of the detailed Implementation Plan with budget, triggers and responsibilities, followed by the first six-monthly review cycle."""
-
-            paragraph.text = correct_text
-            cleaned_count += 1
-            print("✅ Fixed wrong farm content in Executive Summary")
-
-        # Fix duplicate static text
-        elif "• Regulatory alignment:" in text:
-            # Count how many times this appears in nearby paragraphs
-            count = 0
-            for j in range(max(0, i - 3), min(len(doc.paragraphs), i + 3)):
-                if "• Regulatory alignment:" in doc.paragraphs[j].text:
-                    count += 1
-
-            if count > 1:
-                # Check if this is a duplicate (look for identical or very similar text nearby)
-                for j in range(max(0, i - 2), min(len(doc.paragraphs), i + 2)):
-                    if j != i and doc.paragraphs[j].text.strip() == text:
-                        # This is a duplicate, remove it
-                        paragraph.text = ""
-                        cleaned_count += 1
-                        print("✅ Removed duplicate static text")
-                        break
-
-    # Also fix any remaining "East Hill" references
-    for i, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text
-        if "East Hill" in text and "Farm" not in text and "maritime" not in text:
-            # Replace with Ministry
-            paragraph.text = text.replace("East Hill", "Ministry of Rural Development")
-            cleaned_count += 1
-            print("✅ Fixed 'East Hill' reference")
-
+    cleaned_count = sum(run_cleanup(
+        doc, ["wrong_farm_content", "regulatory_duplicates", "east_hill_reference"]).values())
     print(f"✅ Quick fix applied: {cleaned_count} changes made")
     return cleaned_count
 
+
 def verify_table_formatting(doc):
     """Verify that table formatting in Word matches expected formatting"""
     print("📊 Verifying table formatting consistency...")
@@ -9169,12 +9744,14 @@ def verify_table_formatting(doc):
             tbl = table._tbl
             tblPr = tbl.tblPr
 
-            # Ensure table has borders
+            # Ensure table has borders (directly or through its table style)
             has_borders = False
             for elem in tblPr:
                 if 'tblBorders' in elem.tag:
                     has_borders = True
                     break
+            if not has_borders and table.style is not None:
+                has_borders = table.style.element.find(f"{qn('w:tblPr')}/{qn('w:tblBorders')}") is not None
 
             if not has_borders:
                 print(f"⚠️ Table {table_idx} has no borders, applying basic formatting")
@@ -9453,18 +10030,493 @@ def create_excel_from_json(data, path):
     wb.save(path)
 
 
+# ---------------- GEMINI CLIENT ----------------
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com"
+GEMINI_CONNECT_TIMEOUT = 10  # seconds to establish the TLS connection
+GEMINI_READ_TIMEOUT = 60  # default seconds to wait for a response
+GEMINI_POOL_SIZE = 8  # keep-alive connections (>= NARRATIVE_MAX_WORKERS)
+GEMINI_CONTENT_FILTER_REASONS = {"SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"}
+GEMINI_STREAMING_ENABLED = True  # narrative calls use streamGenerateContent (SSE)
+GEMINI_STREAM_STALL_TIMEOUT = 20  # seconds without a byte (incl. first chunk) before a stream is abandoned
+GEMINI_BREAKER_FAILURE_THRESHOLD = 4  # consecutive service failures before the circuit opens
+GEMINI_BREAKER_COOLDOWN = 60  # seconds open before a single half-open probe is allowed
+
+
+class GeminiError(Exception):
+    """Classified Gemini failure.
+
+    kind is one of: rate_limit (429), server (5xx), timeout, network, content_filter,
+    client (other 4xx), empty (200 with no text), deadline (the caller's own time limit ran
+    out), not_configured, circuit_open.
+    """
+
+    RETRYABLE_KINDS = {"rate_limit", "server", "timeout", "network", "empty"}
+
+    def __init__(self, kind, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.kind in self.RETRYABLE_KINDS
+
+
+class GeminiCircuitBreaker:
+    """Shared closed -> open -> half-open breaker for Gemini.
+
+    Only service-side failures (429, 5xx, timeouts, network, empty responses) count; a
+    content-filter block or a caller's deadline running out says nothing about Gemini's health. While open every call fails
+    fast with GeminiError("circuit_open"); after the cooldown one probe call is let through
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=GEMINI_BREAKER_FAILURE_THRESHOLD, cooldown=GEMINI_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self.probe_in_flight = False
+                print("🔌 Gemini circuit half-open: sending probe request")
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        with self.lock:
+            return self.state == "open" and time.time() - self.opened_at < self.cooldown
+
+    def record_success(self):
+        with self.lock:
+            if self.state != "closed":
+                print("🔌 Gemini circuit closed: probe succeeded")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def release_probe(self):
+        """A call ended without a verdict on Gemini (e.g. its deadline ran out); let the next probe through"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_failure(self, error):
+        with self.lock:
+            if not error.retryable:
+                # Prompt-specific failure; a half-open probe that hits one proves nothing either way
+                self.probe_in_flight = False
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"🔌 Gemini circuit open after {self.consecutive_failures} failures "
+                          f"({error.kind}); using templates for {self.cooldown}s")
+                self.state = "open"
+                self.opened_at = time.time()
+                self.probe_in_flight = False
+
+    def snapshot(self):
+        with self.lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures,
+                    "times_opened": self.times_opened}
+
+
+class GeminiClient:
+    """Single entry point for Gemini calls.
+
+    Holds a keep-alive connection pool, applies gemini_rate_limiter, uses one timeout
+    policy, classifies failures into GeminiError kinds and records per-call latency and
+    token usage (from usageMetadata).
+    """
+
+    def __init__(self, pool_size=GEMINI_POOL_SIZE, connect_timeout=GEMINI_CONNECT_TIMEOUT,
+                 read_timeout=GEMINI_READ_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.breaker = GeminiCircuitBreaker()
+        self.stats_lock = Lock()
+        self.recent_calls = deque(maxlen=100)
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "errors": {},
+            "total_latency": 0.0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0,
+        }
+
+    def is_configured(self):
+        return bool(GEMINI_API_KEY and AVAILABLE_GEMINI_MODEL)
+
+    def model_url(self, method="generateContent", model=None):
+        model = model or AVAILABLE_GEMINI_MODEL
+        return f"{GEMINI_API_BASE}/{model['version']}/{model['name']}:{method}"
+
+    def timeout(self, read_timeout=None):
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+    def build_payload(self, prompt, temperature=0.3, max_output_tokens=2000, **generation_config):
+        config = {"temperature": temperature, "maxOutputTokens": max_output_tokens}
+        config.update(generation_config)
+        return {"contents": [{"parts": [{"text": prompt}]}], "generationConfig": config}
+
+    def generate(self, prompt, temperature=0.3, max_output_tokens=2000, timeout=None, label="gemini",
+                 rate_limit=True, stream=False, on_chunk=None, **generation_config):
+        """Call generateContent and return the response text; raises GeminiError on any failure.
+
+        With stream=True the streaming endpoint is used instead (see generate_stream); on_chunk is
+        called with the number of characters received so far after every chunk.
+        Extra keyword arguments go into generationConfig (e.g. topP=0.8, stopSequences=[...]).
+        The whole call, rate-limiter wait included, counts as Gemini wait for the current job.
+        """
+        with gemini_wait_for_job():
+            return self.send(prompt, temperature, max_output_tokens, timeout, label, rate_limit,
+                             stream, on_chunk, **generation_config)
+
+    def send(self, prompt, temperature, max_output_tokens, timeout, label, rate_limit, stream, on_chunk,
+             **generation_config):
+        """Body of generate()"""
+        if not self.is_configured():
+            raise GeminiError("not_configured", "Gemini API not configured")
+
+        if not self.breaker.allow_request():
+            raise GeminiError("circuit_open", "Gemini circuit open; skipping call")
+
+        if rate_limit:
+            gemini_rate_limiter.wait_if_needed(estimate_gemini_tokens(prompt, max_output_tokens))
+
+        payload = self.build_payload(prompt, temperature, max_output_tokens, **generation_config)
+        start = time.time()
+        if stream:
+            return self.generate_stream(payload, start, timeout or self.read_timeout, label, on_chunk)
+
+        try:
+            response = self.session.post(self.model_url(), params={"key": GEMINI_API_KEY}, json=payload,
+                                         timeout=self.timeout(timeout))
+        except requests.exceptions.ReadTimeout as e:
+            if timeout and timeout < self.read_timeout:
+                # The caller's shortened limit, not a Gemini failure
+                raise self.record_failure(label, start, GeminiError("deadline", f"Gemini call exceeded {timeout}s"))
+            raise self.record_failure(label, start, GeminiError("timeout", f"Gemini API timeout: {e}"))
+        except requests.exceptions.Timeout as e:
+            raise self.record_failure(label, start, GeminiError("timeout", f"Gemini API timeout: {e}"))
+        except requests.exceptions.RequestException as e:
+            raise self.record_failure(label, start, GeminiError("network", f"Gemini request failed: {e}"))
+
+        if response.status_code != 200:
+            raise self.record_failure(label, start, self.classify_status(response))
+
+        try:
+            result = response.json()
+        except ValueError:
+            raise self.record_failure(label, start, GeminiError("server", "Gemini returned invalid JSON", 200))
+
+        try:
+            text = self.extract_text(result)
+        except GeminiError as e:
+            raise self.record_failure(label, start, e)
+        self.record_success(label, start, result.get("usageMetadata", {}))
+        return text
+
+    def generate_stream(self, payload, start, deadline, label="gemini", on_chunk=None):
+        """streamGenerateContent over SSE, merged into one response.
+
+        The socket read timeout is GEMINI_STREAM_STALL_TIMEOUT, so a stream that sends no first
+        chunk, or goes quiet mid-way, is abandoned early; deadline caps the whole stream.
+        """
+        try:
+            response = self.session.post(self.model_url("streamGenerateContent"),
+                                         params={"key": GEMINI_API_KEY, "alt": "sse"}, json=payload,
+                                         timeout=self.timeout(GEMINI_STREAM_STALL_TIMEOUT), stream=True)
+        except requests.exceptions.Timeout as e:
+            raise self.record_failure(label, start, GeminiError("timeout", f"Gemini stream sent nothing: {e}"))
+        except requests.exceptions.RequestException as e:
+            raise self.record_failure(label, start, GeminiError("network", f"Gemini request failed: {e}"))
+
+        with closing(response):
+            if response.status_code != 200:
+                raise self.record_failure(label, start, self.classify_status(response))
+
+            merged = {"text": [], "finishReason": None, "usageMetadata": {}, "promptFeedback": {}}
+            received = 0
+            first_chunk = None
+            try:
+                for line in response.iter_lines(chunk_size=None):
+                    if not line.startswith(b"data:"):
+                        continue
+                    try:
+                        chunk = json.loads(line[5:].decode("utf-8"))
+                    except ValueError:
+                        raise GeminiError("server", "Gemini stream sent invalid JSON", 200)
+
+                    if first_chunk is None:
+                        first_chunk = time.time() - start
+                    received += self.merge_stream_chunk(merged, chunk)
+                    if on_chunk:
+                        on_chunk(received)
+
+                    if time.time() - start > deadline:
+                        raise GeminiError("deadline", f"Gemini stream exceeded {deadline}s ({received} chars)")
+            except GeminiError as e:
+                raise self.record_failure(label, start, e)
+            except requests.exceptions.RequestException as e:
+                # urllib3 read timeouts surface here as ConnectionError while iterating
+                raise self.record_failure(label, start, GeminiError(
+                    "timeout", f"Gemini stream stalled after {received} chars: {e}"))
+
+        result = {
+            "candidates": [{"content": {"parts": [{"text": "".join(merged["text"])}]},
+                            "finishReason": merged["finishReason"]}] if first_chunk is not None else [],
+            "promptFeedback": merged["promptFeedback"],
+        }
+        try:
+            text = self.extract_text(result)
+        except GeminiError as e:
+            raise self.record_failure(label, start, e)
+        self.record_success(label, start, merged["usageMetadata"], first_chunk)
+        return text
+
+    def merge_stream_chunk(self, merged, chunk):
+        """Fold one SSE chunk into merged; returns the number of new characters"""
+        if chunk.get("promptFeedback"):
+            merged["promptFeedback"] = chunk["promptFeedback"]
+        if chunk.get("usageMetadata"):
+            merged["usageMetadata"] = chunk["usageMetadata"]
+
+        added = 0
+        for candidate in (chunk.get("candidates") or [])[:1]:
+            for part in candidate.get("content", {}).get("parts", []):
+                text = part.get("text", "")
+                merged["text"].append(text)
+                added += len(text)
+            if candidate.get("finishReason"):
+                merged["finishReason"] = candidate["finishReason"]
+        return added
+
+    def generate_text(self, prompt, **kwargs):
+        """generate() for callers that treat any failure as None"""
+        try:
+            return self.generate(prompt, **kwargs)
+        except GeminiError as e:
+            print(f"⚠️ Gemini {e.kind} error: {str(e)[:200]}")
+            return None
+
+    def classify_status(self, response):
+        status = response.status_code
+        body = response.text[:200]
+        if status == 429:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            return GeminiError("rate_limit", f"Gemini rate limited (429): {body}", status, retry_after)
+        if status >= 500:
+            return GeminiError("server", f"Gemini server error {status}: {body}", status)
+        if status == 400 and "SAFETY" in body.upper():
+            return GeminiError("content_filter", f"Gemini rejected prompt: {body}", status)
+        return GeminiError("client", f"Gemini API returned status {status}: {body}", status)
+
+    def extract_text(self, result):
+        block_reason = result.get("promptFeedback", {}).get("blockReason")
+        if block_reason:
+            raise GeminiError("content_filter", f"Prompt blocked: {block_reason}", 200)
+
+        candidates = result.get("candidates") or []
+        if not candidates:
+            raise GeminiError("empty", "No candidates in Gemini response", 200)
+
+        candidate = candidates[0]
+        parts = candidate.get("content", {}).get("parts", [])
+        text = "".join(part.get("text", "") for part in parts)
+        finish_reason = candidate.get("finishReason")
+
+        if finish_reason in GEMINI_CONTENT_FILTER_REASONS and not text.strip():
+            raise GeminiError("content_filter", f"Response blocked: {finish_reason}", 200)
+        if not text.strip():
+            raise GeminiError("empty", f"Empty Gemini response (finishReason={finish_reason})", 200)
+        return text
+
+    def retry_delay(self, error, attempt, base_delay=2):
+        """Back-off for a retryable error: honour Retry-After on 429, exponential otherwise"""
+        if error.kind == "rate_limit":
+            return error.retry_after or base_delay * (2 ** (attempt + 1))
+        return base_delay * (2 ** attempt)
+
+    def record_success(self, label, start, usage, first_chunk=None):
+        self.breaker.record_success()
+        latency = time.time() - start
+        prompt_tokens = usage.get("promptTokenCount", 0)
+        output_tokens = usage.get("candidatesTokenCount", 0)
+        total_tokens = usage.get("totalTokenCount", prompt_tokens + output_tokens)
+        with self.stats_lock:
+            self.stats["calls"] += 1
+            self.stats["successes"] += 1
+            self.stats["total_latency"] += latency
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["output_tokens"] += output_tokens
+            self.stats["total_tokens"] += total_tokens
+            self.recent_calls.append({"label": label, "status": "ok", "latency": round(latency, 2),
+                                      "first_chunk": round(first_chunk, 2) if first_chunk is not None else None,
+                                      "prompt_tokens": prompt_tokens, "output_tokens": output_tokens})
+        first_chunk_note = f" (first chunk {first_chunk:.1f}s)" if first_chunk is not None else ""
+        print(f"📡 Gemini {label}: {latency:.1f}s{first_chunk_note}, {prompt_tokens}+{output_tokens} tokens")
+
+    def record_failure(self, label, start, error):
+        if error.kind == "deadline":
+            self.breaker.release_probe()  # the call ran out of its own time, not a Gemini failure
+        else:
+            self.breaker.record_failure(error)
+        latency = time.time() - start
+        with self.stats_lock:
+            self.stats["calls"] += 1
+            self.stats["total_latency"] += latency
+            self.stats["errors"][error.kind] = self.stats["errors"].get(error.kind, 0) + 1
+            self.recent_calls.append({"label": label, "status": error.kind, "latency": round(latency, 2)})
+        return error
+
+    def get_stats(self):
+        """Snapshot of cumulative call, error, latency and token counters"""
+        with self.stats_lock:
+            stats = dict(self.stats, errors=dict(self.stats["errors"]))
+            stats["recent_calls"] = list(self.recent_calls)
+        stats["avg_latency"] = round(stats["total_latency"] / stats["calls"], 2) if stats["calls"] else 0.0
+        stats["breaker"] = self.breaker.snapshot()
+        return stats
+
+    def list_models(self, timeout=30):
+        response = self.session.get(f"{GEMINI_API_BASE}/v1beta/models", params={"key": GEMINI_API_KEY},
+                                    timeout=self.timeout(timeout))
+        if response.status_code != 200:
+            raise self.classify_status(response)
+        return response.json().get("models", [])
+
+
+gemini_client = GeminiClient()
+
+
+# ---------------- CACHE REFRESHER ----------------
+class CacheRefresher:
+    """Background upgrade of template/fallback cache entries to Gemini content.
+
+    Runs only while no report is generating narratives in this process, the circuit is
+    closed and the shared rate limiter has spare capacity (CACHE_REFRESH_RESERVE_REQUESTS
+    stay in the bucket), so interactive reports never wait on it. Upgrades are swapped in
+    with ContentCacheStore.replace_if_unchanged.
+    """
+
+    def __init__(self, interval=CACHE_REFRESH_INTERVAL, per_cycle=CACHE_REFRESH_PER_CYCLE,
+                 lock_path=CACHE_REFRESH_LOCK):
+        self.interval = interval
+        self.per_cycle = per_cycle
+        self.lock_path = lock_path
+        self.lock = Lock()
+        self.active_jobs = 0
+        self.thread = None
+        self.host_lock = None
+        self.upgraded = 0
+
+    def job_started(self):
+        with self.lock:
+            self.active_jobs += 1
+
+    def job_finished(self):
+        with self.lock:
+            self.active_jobs -= 1
+
+    def is_idle(self):
+        with self.lock:
+            return self.active_jobs == 0
+
+    def claim_host(self):
+        """Take the host-wide refresher lock (held until exit); False if another process has it"""
+        if fcntl is None:
+            return True
+        try:
+            self.host_lock = open(self.lock_path, 'w')
+            fcntl.flock(self.host_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            if self.host_lock:
+                self.host_lock.close()
+                self.host_lock = None
+            return False
+
+    def start(self):
+        """Start the refresher thread unless it runs already, here or in another process on this host"""
+        if self.thread and self.thread.is_alive():
+            return
+        if not self.host_lock and not self.claim_host():
+            print("♻️ Cache refresher already running in another process on this host")
+            return
+        self.thread = Thread(target=self.run, name="cache-refresher", daemon=True)
+        self.thread.start()
+        print(f"♻️ Cache refresher started (every {self.interval}s)")
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh_once()
+            except Exception as e:
+                print(f"⚠️ Cache refresher error: {e}")
+
+    def refresh_once(self):
+        """One cycle; returns the number of entries upgraded"""
+        if not gemini_client.is_configured() or gemini_client.breaker.is_open() or not self.is_idle():
+            return 0
+
+        upgraded = 0
+        for entry in CONTENT_CACHE.upgrade_candidates(self.per_cycle):
+            if not self.is_idle():
+                break
+            tokens = estimate_gemini_tokens(entry['prompt'])
+            if gemini_rate_limiter.try_acquire(tokens, reserve=CACHE_REFRESH_RESERVE_REQUESTS) > 0:
+                break  # No idle capacity left this cycle
+
+            content = generate_content_with_gemini_proper_bullets(
+                entry['prompt'], label=f"refresh:{entry['narrative_key']}", rate_limit=False)
+            if not content or len(content.strip()) <= 100:
+                continue
+            if CONTENT_CACHE.replace_if_unchanged(entry, content):
+                upgraded += 1
+                print(f"♻️ Upgraded cached {entry['narrative_key']} from {entry['source']} to gemini")
+
+        self.upgraded += upgraded
+        return upgraded
+
+
+cache_refresher = CacheRefresher()
+# Started at import so it also runs under gunicorn; the host lock keeps it to one process
+if CACHE_REFRESH_ENABLED:
+    cache_refresher.start()
+
+
 # ---------------- GEMINI UTILITIES ----------------
 def discover_available_models():
     if not GEMINI_API_KEY:
         return None, "API key not configured"
 
     try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models?key={GEMINI_API_KEY}"
-        response = requests.get(url, timeout=30)
-        if response.status_code == 200:
-            models_data = response.json()
-            models = models_data.get('models', [])
-
+        models = gemini_client.list_models()
+        if models:
             available_models = []
             for model in models:
                 model_name = model['name']
@@ -9510,13 +10562,9 @@ def initialize_gemini():
 
 
 def send_to_gemini(filepaths):
-    if not GEMINI_API_KEY or not AVAILABLE_GEMINI_MODEL:
+    if not gemini_client.is_configured():
         return {"status": "error", "message": "Gemini API not configured."}
 
-    model_name = AVAILABLE_GEMINI_MODEL['name']
-    api_version = AVAILABLE_GEMINI_MODEL['version']
-    api_url = f"https://generativelanguage.googleapis.com/{api_version}/{model_name}:generateContent?key={GEMINI_API_KEY}"
-
     file_list = "\n".join([f"- {os.path.basename(p)}" for p in filepaths])
 
     prompt = f"""
@@ -9532,27 +10580,15 @@ def send_to_gemini(filepaths):
     Keep the response concise and actionable for a technical report.
     """
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.3,
-            "maxOutputTokens": 1024,
-        }
-    }
-
     try:
-        resp = requests.post(api_url, json=payload, timeout=120)
-
-        if resp.status_code == 200:
-            result = resp.json()
-            if 'candidates' in result and result['candidates']:
-                text_response = result['candidates'][0]['content']['parts'][0]['text']
-                return {"status": "success", "analysis": text_response}
+        text_response = gemini_client.generate(prompt, temperature=0.3, max_output_tokens=1024, timeout=120,
+                                               label="file_analysis")
+        return {"status": "success", "analysis": text_response}
+    except GeminiError as e:
+        if e.kind == "empty":
             return {"status": "error", "message": "No response from API"}
-        else:
-            return {"status": "error", "message": f"API Error {resp.status_code}"}
-
-    except Exception as e:
+        if e.status_code and e.status_code != 200:
+            return {"status": "error", "message": f"API Error {e.status_code}"}
         return {"status": "error", "message": f"Request Failed: {str(e)}"}
 
 
@@ -9689,35 +10725,7 @@ def remove_ai_analysis_sections(doc):
     print("🗑️ Removing AI analysis sections...")
 
     try:
-        sections_to_remove = [
-            "AI-Powered Analysis",
-            "Based on the provided files, here's an analysis",
-            "eastern country/firm",
-            "Main Climate Risks and Vulnerabilities to Eastern",
-            "AI Analysis of",
-            "**AI Analysis of**"
-        ]
-
-        removed_count = 0
-
-        for i, paragraph in enumerate(doc.paragraphs):
-            text = paragraph.text.strip()
-
-            # Check if this paragraph contains AI analysis text
-            for section_text in sections_to_remove:
-                if section_text in text:
-                    # Clear the paragraph
-                    paragraph.clear()
-                    removed_count += 1
-                    print(f"🗑️ Removed AI analysis section at paragraph {i}: '{text[:50]}...'")
-                    break
-
-            # Also check for paragraphs that start with numbers like "12 AI-Powered Analysis"
-            if text and text[0].isdigit() and any(x in text for x in ["AI", "Analysis", "eastern"]):
-                paragraph.clear()
-                removed_count += 1
-                print(f"🗑️ Removed numbered AI analysis at paragraph {i}")
-
+        removed_count = run_cleanup(doc, ["ai_analysis_sections"])["ai_analysis_sections"]
         print(f"✅ Removed {removed_count} AI analysis sections")
         return removed_count  # Always returns an integer
 
@@ -9812,12 +10820,13 @@ def find_end_of_section(doc, section_keyword):
 
 def find_section_by_broad_search(doc, section_keyword):
     """Broad search for section when exact match fails"""
+    paragraphs = get_document_index(doc)
     print(f"🔍 Broad search for section containing: {section_keyword}")
 
     # Split keyword for partial matching
     keywords = section_keyword.split()
 
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         text = paragraph.text.strip()
 
         # Check for partial matches
@@ -9827,16 +10836,16 @@ def find_section_by_broad_search(doc, section_keyword):
         if matches_all_keywords:
             print(f"✅ Found partial match for '{section_keyword}' at paragraph {i}")
             # Look ahead for next heading
-            for j in range(i + 1, len(doc.paragraphs)):
-                next_text = doc.paragraphs[j].text.strip()
-                if (doc.paragraphs[j].style.name.startswith('Heading') and
+            for j in range(i + 1, len(paragraphs)):
+                next_text = paragraphs[j].text.strip()
+                if (paragraphs[j].style.name.startswith('Heading') and
                         len(next_text) > 0 and
                         section_keyword not in next_text):
                     print(f"📌 Found next heading at paragraph {j}, inserting at {j}")
                     return j
 
             # If no next heading found, insert near this paragraph
-            return min(i + 3, len(doc.paragraphs) - 1)
+            return min(i + 3, len(paragraphs) - 1)
 
     print(f"❌ Could not find section '{section_keyword}' even with broad search")
     return None
@@ -9960,33 +10969,12 @@ def generate_specific_ai_content(field, context, json_data):
     """
 
     try:
-        # Make direct Gemini API call
-        model_name = AVAILABLE_GEMINI_MODEL['name']
-        api_version = AVAILABLE_GEMINI_MODEL['version']
-        api_url = f"https://generativelanguage.googleapis.com/{api_version}/{model_name}:generateContent?key={GEMINI_API_KEY}"
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "temperature": 0.3,
-                "maxOutputTokens": 800,
-                "topP": 0.8,
-                "topK": 40
-            }
-        }
-
-        response = requests.post(api_url, json=payload, timeout=30)
-
-        if response.status_code == 200:
-            result = response.json()
-            if 'candidates' in result and result['candidates']:
-                content = result['candidates'][0]['content']['parts'][0]['text']
-                return content.strip()
+        content = gemini_client.generate(prompt, temperature=0.3, max_output_tokens=800, timeout=30,
+                                         label=field, topP=0.8, topK=40)
+        return content.strip()
 
+    except GeminiError as e:
         # If API call failed, return None to trigger fallback
-        return None
-
-    except Exception as e:
         print(f"⚠️ Error generating AI content for {field}: {e}")
         return None
 
@@ -10257,12 +11245,13 @@ def add_ai_summary_sections(doc, json_data):
 
 def find_end_of_section_from_heading(doc, heading_index):
     """Find where a section ends starting from a heading"""
-    if heading_index >= len(doc.paragraphs) - 1:
-        return len(doc.paragraphs) - 1
+    paragraphs = get_document_index(doc)
+    if heading_index >= len(paragraphs) - 1:
+        return len(paragraphs) - 1
 
     # Get the heading level if possible
     heading_level = 1
-    heading_paragraph = doc.paragraphs[heading_index]
+    heading_paragraph = paragraphs[heading_index]
     if heading_paragraph.style.name.startswith('Heading'):
         try:
             heading_level = int(heading_paragraph.style.name.replace('Heading ', ''))
@@ -10270,8 +11259,8 @@ def find_end_of_section_from_heading(doc, heading_index):
             heading_level = 1
 
     # Start searching from after the heading
-    for i in range(heading_index + 1, len(doc.paragraphs)):
-        current_para = doc.paragraphs[i]
+    for i in range(heading_index + 1, len(paragraphs)):
+        current_para = paragraphs[i]
         current_text = current_para.text.strip()
 
         # Skip empty paragraphs
@@ -10306,17 +11295,18 @@ def find_end_of_section_from_heading(doc, heading_index):
             return i
 
     # If we reach the end of document
-    return len(doc.paragraphs)
+    return len(paragraphs)
 
 
 # Also update the find_end_of_section function to be more robust
 def find_end_of_section(doc, section_keyword):
     """Find the END of a specific section"""
+    paragraphs = get_document_index(doc)
     print(f"🔍 Finding end of section: {section_keyword}")
 
     # First find the heading
     heading_index = -1
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         text = paragraph.text.strip()
         if section_keyword.lower() in text.lower():
             # Check if it's likely a heading
@@ -10336,8 +11326,9 @@ def find_end_of_section(doc, section_keyword):
 
 def find_insertion_point_after_section(doc, start_index):
     """Find where to insert content after a section ends"""
-    for i in range(start_index + 1, len(doc.paragraphs)):
-        paragraph = doc.paragraphs[i]
+    paragraphs = get_document_index(doc)
+    for i in range(start_index + 1, len(paragraphs)):
+        paragraph = paragraphs[i]
         text = paragraph.text.strip()
 
         # Check if this is another heading (end of current section)
@@ -10352,7 +11343,7 @@ def find_insertion_point_after_section(doc, start_index):
             return i
 
     # If no next heading found, insert near the end
-    return min(start_index + 10, len(doc.paragraphs) - 1)
+    return min(start_index + 10, len(paragraphs) - 1)
 
 
 
@@ -10375,8 +11366,10 @@ def update_progress(task_id, percent, message, status="processing"):
 
 def generate_report_thread(task_id, config):
     """Background worker to generate the report"""
+    metrics = start_job_metrics(task_id)
     try:
         update_progress(task_id, 5, "Initializing report generation...")
+        metrics.begin("setup")
         
         # Extract config
         template_path = config.get('template_path')
@@ -10395,6 +11388,7 @@ def generate_report_thread(task_id, config):
         mural_data = None
         if extract_mural:
             update_progress(task_id, 10, "Extracting Mural data...")
+            metrics.begin("mural_extraction")
             try:
                 # Dynamically import and run the extraction script
                 import importlib.util
@@ -10423,6 +11417,7 @@ def generate_report_thread(task_id, config):
 
         # Update JSON with form data
         update_progress(task_id, 20, "Analyzing data with AI...")
+        metrics.begin("mural_data")
         # (Rest of AI analysis skip...)
         # Fallback: Try to load existing Mural data if not extracted in this run
         if not mural_data and os.path.exists("mural_content_for_report.json"):
@@ -10435,12 +11430,14 @@ def generate_report_thread(task_id, config):
         
         # JSON parsing ensure V4 structure
         update_progress(task_id, 15, "Processing data structure...")
+        metrics.begin("data_structure")
         v4_parsed_data = parse_json_v4_data(json_data)
         json_data.update(v4_parsed_data)
 
         # Gemini Analysis
         if saved_files and AVAILABLE_GEMINI_MODEL:
             update_progress(task_id, 20, "Analyzing files with AI...")
+            metrics.begin("file_analysis")
             try:
                 send_to_gemini(saved_files)
             except Exception as e:
@@ -10448,48 +11445,58 @@ def generate_report_thread(task_id, config):
 
         # Create report - Template
         update_progress(task_id, 25, "Loading template...")
+        metrics.begin("template")
         try:
-            doc = Document(template_path)
-            fix_executive_summary_headings(doc)
+            doc = template_registry.load(template_path)
         except Exception as e:
             doc = Document()
             doc.add_heading("Climate Risk Assessment Report", 0)
             update_progress(task_id, 25, "Using default template (load failed)")
 
+        passes = PassManager(doc, REPORT_PASSES)
+
         # Steps 0-1
         update_progress(task_id, 30, "Structuring document...")
-        update_template_for_v4_structure(doc, json_data)
-        fix_executive_summary_headings(doc)
-        update_toc_section_titles(doc, json_data)
-        ensure_placeholders_in_doc(doc)
-        update_template_for_v4_structure(doc, json_data)
+        metrics.begin("structure")
+        passes.run("update_template_for_v4_structure", json_data)
+        passes.run("fix_executive_summary_headings")
+        passes.run("update_toc_section_titles", json_data)
+        passes.run("ensure_placeholders_in_doc")
+        passes.run("update_template_for_v4_structure", json_data)
 
         # Step 2: Logos
         update_progress(task_id, 35, "Inserting logos...")
-        replace_logo_placeholders(doc, client_logo_path, climate_logo_path)
+        metrics.begin("logos")
+        passes.run("replace_logo_placeholders", client_logo_path, climate_logo_path)
 
         # Step 3: Excel
         if excel_paths:
             update_progress(task_id, 40, "Processing Excel tables...")
-            for i, excel_path in enumerate(excel_paths):
-                process_table_1_special(doc, excel_path)
-                process_table_3_special(doc, excel_path)
-                process_table_4_special(doc, excel_path)
-                process_table_5_special(doc, excel_path)
-                process_table_7_special(doc, excel_path)
-                process_table_A2_special(doc, excel_path)
-                insert_excel_table_data(doc, excel_path)
-
-        # Step 4: Placeholders
-        remove_specific_placeholders(doc)
+            metrics.begin("excel_tables")
+            # Parse every workbook once (in parallel when several need parsing); each table
+            # processor then reads the same model and only the docx splicing happens here
+            for workbook in load_workbook_models(excel_paths):
+                if workbook is None:
+                    continue
+                passes.run("process_table_1_special", workbook)
+                passes.run("process_table_3_special", workbook)
+                passes.run("process_table_4_special", workbook)
+                passes.run("process_table_5_special", workbook)
+                passes.run("process_table_7_special", workbook)
+                passes.run("process_table_A2_special", workbook)
+                passes.run("insert_excel_table_data", workbook)
+
+        # Step 4: Placeholders (already done if the Excel step ran)
+        passes.run("remove_specific_placeholders")
         
         # Step 4b: Specific Figure Replacements (User Request)
-        replace_figure_2_placeholder(doc)
-        replace_figure_1_placeholder(doc)
+        passes.run("replace_figure_2_placeholder")
+        passes.run("replace_figure_1_placeholder")
 
         # Step 5: Images
         if image_paths:
             update_progress(task_id, 50, "Placing images...")
+            metrics.begin("images")
             figure_mapping = map_images_to_figures(image_paths)
             
             # Remove Figure 1 and Figure 2 from generic mapping
@@ -10501,29 +11508,32 @@ def generate_report_thread(task_id, config):
                 if 1 in figure_mapping:
                    del figure_mapping[1]
                 
-                insert_images_by_figure_number_flexible(doc, figure_mapping)
+                passes.run("insert_images_by_figure_number_flexible", figure_mapping)
 
         # Step 6-8: Formatting & AI Content
         update_progress(task_id, 60, "Generating AI narrative...")
-        fix_adaptation_plan_section(doc)
-        integrate_bespoke_content_with_prompts(doc, json_data, form_prompts)
-        clean_executive_summary(doc)
-        clean_executive_summary_duplicates(doc)
-        quick_fix_executive_summary(doc)
+        metrics.begin("narratives")
+        passes.run("fix_adaptation_plan_section")
+        passes.run(
+            "integrate_bespoke_content_with_prompts", json_data, form_prompts,
+            progress_callback=lambda done, total, message: update_progress(
+                task_id, 60 + 9 * done // max(total, 1), message))
+        passes.run("clean_up_after_narratives")
 
         # Step 9-14: Polish
         update_progress(task_id, 70, "Finalizing formatting...")
-        verify_table_formatting(doc)
-        create_proper_toc_sections(doc, json_data)
-        remove_ai_analysis_sections(doc)
-        clean_up_generated_report(doc, json_data)
-        move_executive_summary_to_page_four(doc)
-        fix_title_page_placeholders(doc, json_data)
+        metrics.begin("polish")
+        passes.run("verify_table_formatting")
+        passes.run("create_proper_toc_sections", json_data)
+        passes.run("clean_up_generated_report", json_data)
+        passes.run("move_executive_summary_to_page_four")
+        passes.run("fix_title_page_placeholders", json_data)
 
         # Step 15: Apply User Headings (Dynamic)
         heading_replacements = config.get('heading_replacements', {})
         if heading_replacements:
             update_progress(task_id, 72, "Applying custom headings...")
+            metrics.begin("custom_headings")
             for para in doc.paragraphs:
                 if para.style.name.startswith('Heading'):
                     text = para.text.strip()
@@ -10532,19 +11542,22 @@ def generate_report_thread(task_id, config):
                     if text in heading_replacements:
                         print(f"🔄 Replacing heading: '{text}' -> '{heading_replacements[text]}'")
                         para.text = heading_replacements[text]
+            passes.invalidate("headings", "toc")
 
 
         # Step 15: Mural
         update_progress(task_id, 75, "Inserting Mural workshop data...")
+        metrics.begin("mural_insert")
         if mural_data:
             json_data['mural_data'] = mural_data
-            insert_mural_content_into_document(doc)
+            passes.run("insert_mural_content_into_document")
         else:
-            insert_minimal_fallback_at_placeholders(doc)
+            passes.run("insert_minimal_fallback_at_placeholders")
 
         # Step 15.5: Prompt Images
         if prompt_images:
             update_progress(task_id, 80, "Inserting section images...")
+            metrics.begin("section_images")
             toc_end_index = find_end_of_toc_section(doc)
             if toc_end_index:
                 section_headings = get_section_headings(json_data)
@@ -10557,17 +11570,20 @@ def generate_report_thread(task_id, config):
                                 insert_image_at_section_end(doc, section_index, image_data, json_data)
                                 break
                             except: pass
+                passes.invalidate("text", "images")
             else:
-                 insert_prompt_images_at_sections_skip_toc(doc, prompt_images, json_data)
+                 passes.run("insert_prompt_images_at_sections_skip_toc", prompt_images, json_data)
 
         # Step 16: Custom sections
         if custom_sections:
             update_progress(task_id, 85, "Adding custom sections...")
-            insert_custom_sections(doc, custom_sections, json_data)
+            metrics.begin("custom_sections")
+            passes.run("insert_custom_sections", custom_sections, json_data)
 
         # Step 16b: Insert Hardcoded "11 Conclusion and Next Steps" (User Request)
         # We process this BEFORE the dynamic custom sections so they appear as Section 12+
         update_progress(task_id, 86, "Adding Conclusion section...")
+        metrics.begin("conclusion")
         
         # Find where to insert (before Appendices/References)
         concl_insertion_index = len(doc.paragraphs) - 1
@@ -10631,11 +11647,13 @@ def generate_report_thread(task_id, config):
                     new_p.runs[0].font.color.rgb = RGBColor(0, 51, 102)
             
             target_para.insert_paragraph_before()
+            passes.invalidate("text", "headings")
 
         # Step 16c: Process DYNAMIC Custom Sections (New Feature)
         dynamic_custom_headings = config.get('dynamic_custom_headings', [])
         if dynamic_custom_headings:
             update_progress(task_id, 88, "Generating additional custom sections...")
+            metrics.begin("dynamic_sections")
             
             # Recalculate target para for dynamic sections
             target_para = doc.paragraphs[len(doc.paragraphs)-1]
@@ -10688,33 +11706,37 @@ def generate_report_thread(task_id, config):
                             
                     # SPACING
                     target_para.insert_paragraph_before()
+            passes.invalidate("text", "headings", "images")
 
         # Step 17-19: Cleanup
         update_progress(task_id, 90, "Cleaning up document...")
-        remove_unwanted_ai_analysis(doc)
-        remove_figure_placeholders(doc)
-        remove_figure_placeholders_only_after_processing(doc)
-        clean_up_toc_formatting(doc)
-        debug_document_structure(doc)
+        metrics.begin("cleanup")
+        passes.run("final_cleanup")
+        passes.run("debug_document_structure")
+        passes.report()
 
         # Save
         update_progress(task_id, 95, "Saving and uploading...")
+        metrics.begin("save")
         out_name = f"Climate_Report_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.docx"
         out_path = os.path.join(OUTPUT_FOLDER, out_name)
         doc.save(out_path)
 
         # Dropbox
         if dbx:
+             metrics.begin("dropbox_upload")
              dropbox_path = f"/Apps/FlaskReport/{out_name}"
              upload_to_dropbox(out_path, dropbox_path)
 
         # Complete
         processing_tasks[task_id]["result_file"] = out_name
+        metrics.finish()
         update_progress(task_id, 100, "Done!", status="completed")
         
     except Exception as e:
         print(f"❌ Error in background worker: {e}")
         traceback.print_exc()
+        metrics.finish()
         update_progress(task_id, 0, f"Error: {str(e)}", status="error")
 
 @app.route("/process", methods=["POST"])
@@ -11129,6 +12151,7 @@ def download_report():
 
 def replace_figure_2_placeholder(doc):
     """Specific replacement for Figure 2 placeholder requested by user"""
+    paragraphs = get_document_index(doc)
     print("🖼️ Checking for Figure 2 placeholder...")
     
     placeholder_text = "[[Figure-2_Climate-Records-Nov-2025_Met-Fiji]]"
@@ -11142,7 +12165,7 @@ def replace_figure_2_placeholder(doc):
         return False
         
     found = False
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         if placeholder_text in paragraph.text:
             print(f"✅ Found Figure 2 placeholder at paragraph {i}")
             
@@ -11161,8 +12184,8 @@ def replace_figure_2_placeholder(doc):
             # Add caption
             # Check if the NEXT paragraph is already the caption
             next_para_is_caption = False
-            if i + 1 < len(doc.paragraphs):
-                next_para = doc.paragraphs[i+1]
+            if i + 1 < len(paragraphs):
+                next_para = paragraphs[i+1]
                 if "Figure 2" in next_para.text:
                     print(f"✅ Found existing Figure 2 caption, updating it")
                     caption_para = next_para
@@ -11170,10 +12193,10 @@ def replace_figure_2_placeholder(doc):
                     next_para_is_caption = True
             
             if not next_para_is_caption:
-                if i + 1 < len(doc.paragraphs):
-                    caption_para = doc.paragraphs[i+1].insert_paragraph_before(caption_text)
+                if i + 1 < len(paragraphs):
+                    caption_para = paragraphs.insert_paragraph_before(i+1, caption_text)
                 else:
-                    caption_para = doc.add_paragraph(caption_text)
+                    caption_para = paragraphs.add_paragraph(caption_text)
                 print(f"✅ inserted new Figure 2 caption")
                 
             caption_para.style = "Caption"
@@ -11193,6 +12216,7 @@ def replace_figure_2_placeholder(doc):
 
 def replace_figure_1_placeholder(doc):
     """Specific replacement for Figure 1 placeholder requested by user"""
+    paragraphs = get_document_index(doc)
     print("🖼️ Checking for Figure 1 placeholder...")
     
     # User requested [[Figure-1]]
@@ -11219,7 +12243,7 @@ def replace_figure_1_placeholder(doc):
         return False
         
     found = False
-    for i, paragraph in enumerate(doc.paragraphs):
+    for i, paragraph in enumerate(paragraphs):
         if placeholder_text in paragraph.text:
             print(f"✅ Found Figure 1 placeholder at paragraph {i}")
             
@@ -11238,8 +12262,8 @@ def replace_figure_1_placeholder(doc):
             # Add caption
             # Check if the NEXT paragraph is already the caption
             next_para_is_caption = False
-            if i + 1 < len(doc.paragraphs):
-                next_para = doc.paragraphs[i+1]
+            if i + 1 < len(paragraphs):
+                next_para = paragraphs[i+1]
                 if "Figure 1" in next_para.text:
                     print(f"✅ Found existing Figure 1 caption, updating it")
                     caption_para = next_para
@@ -11247,10 +12271,10 @@ def replace_figure_1_placeholder(doc):
                     next_para_is_caption = True
             
             if not next_para_is_caption:
-                if i + 1 < len(doc.paragraphs):
-                    caption_para = doc.paragraphs[i+1].insert_paragraph_before(caption_text)
+                if i + 1 < len(paragraphs):
+                    caption_para = paragraphs.insert_paragraph_before(i+1, caption_text)
                 else:
-                    caption_para = doc.add_paragraph(caption_text)
+                    caption_para = paragraphs.add_paragraph(caption_text)
                 print(f"✅ inserted new Figure 1 caption")
                 
             caption_para.style = "Caption"
@@ -11268,6 +12292,51 @@ def replace_figure_1_placeholder(doc):
     return found
 
 
+# ---------------- REPORT PASSES ----------------
+# Built last so every pass is registered as its final definition
+REPORT_PASSES = {report_pass.name: report_pass for report_pass in [
+    ReportPass(update_template_for_v4_structure, reads=("text", "placeholders", "headings"),
+               writes=("text", "placeholders", "headings", "toc")),
+    ReportPass(fix_executive_summary_headings, reads=("text", "headings"), writes=("text", "headings")),
+    ReportPass(update_toc_section_titles, reads=("text", "toc"), writes=("text", "headings", "toc")),
+    ReportPass(ensure_placeholders_in_doc, reads=("text", "placeholders"), writes=("text", "placeholders")),
+    ReportPass(replace_logo_placeholders, reads=("placeholders", "tables"),
+               writes=("text", "placeholders", "tables", "images")),
+    ReportPass(process_table_1_special, reads=("placeholders",), writes=("text", "placeholders", "tables")),
+    ReportPass(process_table_3_special, reads=("placeholders",), writes=("text", "placeholders", "tables")),
+    ReportPass(process_table_4_special, reads=("placeholders",), writes=("text", "placeholders", "tables")),
+    ReportPass(process_table_5_special, reads=("placeholders",), writes=("text", "placeholders", "tables")),
+    ReportPass(process_table_7_special, reads=("placeholders",), writes=("text", "placeholders", "tables")),
+    ReportPass(process_table_A2_special, reads=("placeholders",), writes=("text", "placeholders", "tables")),
+    ReportPass(insert_excel_table_data, reads=("placeholders", "tables"), writes=("text", "placeholders", "tables"),
+               settles=("remove_specific_placeholders",)),
+    ReportPass(remove_specific_placeholders, reads=("placeholders", "tables"),
+               writes=("text", "placeholders", "tables")),
+    ReportPass(replace_figure_2_placeholder, reads=("text", "placeholders"), writes=("text", "placeholders", "images")),
+    ReportPass(replace_figure_1_placeholder, reads=("text", "placeholders"), writes=("text", "placeholders", "images")),
+    ReportPass(insert_images_by_figure_number_flexible, reads=("text", "headings"),
+               writes=("text", "placeholders", "images")),
+    ReportPass(fix_adaptation_plan_section, reads=("text", "headings"), writes=("text", "tables")),
+    ReportPass(integrate_bespoke_content_with_prompts, reads=("placeholders",),
+               writes=("text", "placeholders", "headings", "tables"), settles=("remove_specific_placeholders",)),
+    ReportPass(clean_up_after_narratives, reads=("text", "headings"), writes=("text",)),
+    ReportPass(verify_table_formatting, reads=("tables",), writes=("tables",)),
+    ReportPass(create_proper_toc_sections, reads=("text", "headings", "toc", "images"), writes=("text", "toc")),
+    ReportPass(clean_up_generated_report, reads=("text", "headings"), writes=("text", "headings")),
+    ReportPass(move_executive_summary_to_page_four, reads=("text", "headings", "toc"), writes=("text",)),
+    ReportPass(fix_title_page_placeholders, reads=("placeholders",), writes=("text", "placeholders")),
+    ReportPass(insert_mural_content_into_document, reads=("text", "placeholders", "tables"),
+               writes=("text", "placeholders", "tables")),
+    ReportPass(insert_minimal_fallback_at_placeholders, reads=("placeholders",), writes=("text", "placeholders")),
+    ReportPass(insert_prompt_images_at_sections_skip_toc, reads=("text", "headings", "toc"),
+               writes=("text", "images")),
+    ReportPass(insert_custom_sections, reads=("text", "headings"), writes=("text", "headings")),
+    ReportPass(final_cleanup, reads=("text", "placeholders", "toc", "tables"),
+               writes=("text", "headings", "placeholders", "tables")),
+    ReportPass(debug_document_structure, reads=DOCUMENT_ASPECTS),
+]}
+
+
 if __name__ == "__main__":
     print("🚀 Starting Flask Gemini Report Generator...")
     print(f"🔑 Gemini API: {'✅ CONFIGURED' if GEMINI_API_KEY else '❌ NOT CONFIGURED'}")
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Inches, RGBColor
+
+import app
+
+# Child order required by the OOXML schema (CT_Style, then CT_TblStylePr)
+STYLE_CHILD_ORDER = ["name", "aliases", "basedOn", "next", "link", "autoRedefine", "hidden", "uiPriority",
+                     "semiHidden", "unhideWhenUsed", "qFormat", "locked", "personal", "personalCompose",
+                     "personalReply", "rsid", "pPr", "rPr", "tblPr", "trPr", "tcPr", "tblStylePr"]
+TBL_STYLE_PR_CHILD_ORDER = ["pPr", "rPr", "tblPr", "trPr", "tcPr"]
+
+
+def child_names(element):
+    return [child.tag.split("}")[1] for child in element]
+
+
+def assert_in_order(names, order, what):
+    positions = [order.index(name) for name in names]
+    assert positions == sorted(positions), f"{what} children out of order: {names}"
+
+
+def test_table_style_child_order():
+    styles = [app.TABLE_1_STYLE, app.TABLE_3_STYLE, app.table_4_style(3), app.TABLE_5_STYLE,
+              app.TABLE_7_STYLE, app.TABLE_A2_STYLE, app.exact_pdf_table_style("rapa-1", 4),
+              # Body bold, color and fill: the style gets both a body w:rPr and a body w:tcPr
+              app.TableStyle("Style Order Check", [Inches(2), Inches(2)], bold=True, color="333333",
+                             fill="#eeeeee", header_fill="#397b21")]
+
+    doc = Document()
+    for style in styles:
+        paragraph = doc.add_paragraph(style.name)
+        app.splice_table(paragraph, [["Header", "Header"], ["Cell", "Cell"]], style)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "table_styles.docx")
+        doc.save(path)
+        reopened = Document(path)
+
+    registered = {style.get(qn("w:styleId")): style
+                  for style in reopened.styles.element.findall(qn("w:style"))}
+    for style in styles:
+        element = registered[style.style_id]
+        names = child_names(element)
+        assert_in_order(names, STYLE_CHILD_ORDER, style.name)
+        assert "tblPr" in names
+        for conditional in element.findall(qn("w:tblStylePr")):
+            assert_in_order(child_names(conditional), TBL_STYLE_PR_CHILD_ORDER, f"{style.name} firstRow")
+
+    body = registered["StyleOrderCheck"]
+    assert child_names(body)[-4:] == ["rPr", "tblPr", "tcPr", "tblStylePr"]
+    print("✅ Table style children are in schema order")
+
+
+
+def test_header_runs_carry_bold_and_color():
+    # A Normal style with its own color outranks the table style, so the header's white bold
+    # text has to be on the runs themselves
+    doc = Document()
+    doc.styles["Normal"].font.color.rgb = RGBColor(0x33, 0x33, 0x33)
+    table = app.splice_table(doc.add_paragraph("Table 3"), [["Header", "Header"] * 2, ["Cell"] * 4],
+                             app.TABLE_3_STYLE)
+
+    header_runs = table.rows[0]._tr.findall(".//" + qn("w:r"))
+    assert header_runs
+    for run in header_runs:
+        rpr = run.find(qn("w:rPr"))
+        assert rpr.find(qn("w:b")) is not None
+        assert rpr.find(qn("w:color")).get(qn("w:val")).upper() == "FFFFFF"
+    for run in table.rows[1]._tr.findall(".//" + qn("w:r")):
+        assert run.find(qn("w:rPr")).find(qn("w:b")) is None
+    print("✅ Header runs carry their own bold and color")
+
+
+if __name__ == "__main__":
+    test_table_style_child_order()
+    test_header_runs_carry_bold_and_color()
@@ -0,0 +1,36 @@
+# workbook_parsing.py
+# Excel parsing for the workbook parse pool in app.py. Pool workers unpickle their task
+# function from here, so keep this module to openpyxl alone.
+from openpyxl import load_workbook
+
+
+def parse_workbook_sheets(path):
+    """Every sheet of the workbook at path as text rows: strings ("" for empty cells), data rows only.
+
+    Read-only, values only. The stored dimension is often wrong in generated files, so openpyxl
+    scans the rows itself and they are padded to the widest one.
+    """
+    sheets = {}
+    wb = load_workbook(path, read_only=True)
+    try:
+        for ws in wb.worksheets:
+            ws.reset_dimensions()
+            rows = [list(row) for row in ws.iter_rows(values_only=True)]
+            width = max((len(row) for row in rows), default=0)
+            all_data = []
+            for row in rows:
+                row_data = [str(cell) if cell is not None else "" for cell in row] + [""] * (width - len(row))
+                if any(cell.strip() for cell in row_data if cell):
+                    all_data.append(row_data)
+            sheets[ws.title] = all_data
+    finally:
+        wb.close()
+    return sheets
+
+
+def parse_workbook_or_error(path):
+    """Pool worker: the parsed sheets of one workbook, or the exception that stopped it"""
+    try:
+        return parse_workbook_sheets(path)
+    except Exception as e:
+        return e